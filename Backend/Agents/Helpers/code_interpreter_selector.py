@@ -1,16 +1,109 @@
+import os
+import re
+import math
+import time
 import openai
 import logging
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from Backend.Utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.propagate = True
 
+# Picked on the held-out corpus by Backend/Benchmarks/code_interpreter_selector_eval.py
+SELECTOR_CONFIDENCE_THRESHOLD = float(os.getenv("SELECTOR_CONFIDENCE_THRESHOLD", "0.9"))
+SELECTOR_MEMO_SIZE = int(os.getenv("SELECTOR_MEMO_SIZE", "4096"))
+
+def _terms(*phrases: str) -> "re.Pattern[str]":
+    return re.compile(r"\b(?:" + "|".join(phrases) + r")\b")
+
+# Vocabulary of the metrics found in the exported health data CSV
+_METRIC = _terms(
+    r"steps?", r"step count", r"heart ?rate", r"hr", r"hrv", r"heart rate variability", r"resting", r"pulse", r"bpm",
+    r"sleep(?:ing|s)?", r"slept", r"rem", r"deep sleep", r"calories", r"kcal", r"active energy", r"energy burned",
+    r"weight", r"weigh(?:ed|t)?", r"bmi", r"body fat", r"lean (?:body )?mass", r"vo2 ?max", r"blood pressure",
+    r"systolic", r"diastolic", r"glucose", r"blood sugar", r"spo2", r"oxygen saturation", r"blood oxygen",
+    r"respiratory rate", r"breathing rate", r"temperature", r"distance", r"walking", r"running", r"ran", r"walked",
+    r"workouts?", r"exercise minutes", r"exercised?", r"stand hours?", r"flights? climbed", r"floors", r"cycling",
+    r"swimming", r"runs?", r"mindful(?:ness)? minutes", r"water intake", r"hydration", r"menstrual", r"cycle length",
+)
+# "me" is left out: "tell me about", "give me tips" are requests, not references to the user's own data
+_PERSONAL = _terms(r"my", r"i", r"i'?ve", r"i'?m", r"mine", r"did i", r"have i", r"am i")
+_ANALYSIS = _terms(
+    r"average", r"avg", r"mean", r"median", r"trends?", r"trending", r"compare[ds]?", r"comparison", r"correlat\w*",
+    r"how many", r"how much", r"how often", r"total", r"sum", r"max(?:imum)?", r"min(?:imum)?", r"highest", r"lowest",
+    r"most", r"least", r"best", r"worst", r"longest", r"shortest", r"fastest", r"slowest", r"chart", r"plot", r"graph",
+    r"visuali[sz]e", r"statistics?", r"stats",
+    r"analy[sz]e", r"analysis", r"percent(?:age)?", r"increased?", r"decreased?", r"changed?", r"distribution",
+    r"breakdown", r"summary of my", r"per (?:day|week|month)", r"daily", r"weekly", r"monthly", r"streak", r"record",
+)
+_TIME_WINDOW = _terms(
+    r"today", r"yesterday", r"last (?:night|week|month|year|\d+ (?:days|weeks|months))", r"this (?:week|month|year)",
+    r"past (?:week|month|year|\d+ (?:days|weeks|months))", r"since", r"between", r"over time", r"in (?:19|20)\d\d",
+    r"january", r"february", r"march", r"april", r"june", r"july", r"august", r"september", r"october", r"november",
+    r"december", r"weekends?", r"weekdays?", r"mornings?", r"nights?",
+)
+_SMALL_TALK = _terms(r"hi", r"hello", r"hey", r"thanks", r"thank you", r"thx", r"bye", r"goodbye", r"ok(?:ay)?",
+                     r"cool", r"great", r"good morning", r"good night", r"who are you", r"what can you do")
+# "what is my ..." asks for the user's own numbers, so it is not a general question
+_GENERAL_QUESTION = re.compile(r"^(?:what (?:is|are|does)(?! my\b)|what's(?! my\b)|explain|define|why (?:is|are|do|does)|how (?:does|do) "
+                               r"(?!i\b)|is it (?:bad|good|healthy|normal)|can you explain)\b|\btell me about\b")
+_ADVICE = re.compile(r"\b(?:how (?:can|should|do) i|should i|any tips|tips (?:for|on|to)|give me (?:tips|advice)|advice|"
+                     r"what should i|recommend\w*|ways to|how to)\b")
+
+_BIAS = -1.0
+
+# Lowercase, drop punctuation and collapse whitespace so trivially different phrasings share a memo entry
+def normalize_selector_input(text: str) -> str:
+    return " ".join(re.sub(r"[^\w'%\s]", " ", text.lower()).split())
+
+# Cheap lexical router: weighted features over health-metric and data-analysis vocabulary, squashed into
+# P(code interpreter needed). Returns (answer, confidence); callers fall back to the LLM below a threshold.
+def classify_code_interpreter_need(normalized: str) -> Tuple[bool, float]:
+    metric_hits = len(_METRIC.findall(normalized))
+    personal = bool(_PERSONAL.search(normalized))
+    analysis = bool(_ANALYSIS.search(normalized))
+    time_window = bool(_TIME_WINDOW.search(normalized))
+    words = len(normalized.split())
+
+    score = _BIAS
+    if metric_hits:
+        score += 1.5 + 0.5 * min(metric_hits - 1, 2)
+        if personal:
+            score += 1.5  # "my resting heart rate" is about the user's own data
+    if personal:
+        score += 1.0
+    if analysis:
+        score += 1.5
+    if time_window:
+        score += 1.0
+    if not metric_hits and not analysis:
+        score -= 2.0
+    if _SMALL_TALK.search(normalized) and words <= 4:
+        score -= 4.0
+    # Knowledge and advice questions mention metrics and pronouns too ("how do I lower my resting heart rate")
+    if _GENERAL_QUESTION.search(normalized):
+        score -= 2.0
+    if _ADVICE.search(normalized):
+        score -= 3.0
+
+    probability = 1 / (1 + math.exp(-score))
+    return probability >= 0.5, max(probability, 1 - probability)
+
+# Decides whether a message needs the code interpreter. Tiers, cheapest first: a memo of recent
+# normalized inputs, the lexical classifier for confident cases, and the LLM for everything else.
 class CodeInterpreterSelector:
-    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini") -> None:
+    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini",
+                 confidence_threshold: float = SELECTOR_CONFIDENCE_THRESHOLD, memo_size: int = SELECTOR_MEMO_SIZE) -> None:
         self.api_key = api_key
         self.model = model
-        self.client = openai.OpenAI(api_key = api_key)
+        self.client = openai.AsyncOpenAI(api_key = api_key)
+        self.confidence_threshold = confidence_threshold
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
 
         try:
             with open(prompt_path, "r", encoding = "utf-8") as f:
@@ -19,14 +112,46 @@ class CodeInterpreterSelector:
             logger.error(f"Error reading prompt file: {e}")
             raise
 
-    def should_use_code_interpreter(self, user_input: str, prompt: Optional[str] = None) -> str:
+    def _remember(self, normalized: str, answer: str) -> None:
+        self._memo[normalized] = answer
+        self._memo.move_to_end(normalized)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last = False)
+
+    async def should_use_code_interpreter(self, user_input: str, prompt: Optional[str] = None) -> str:
+        if prompt is not None:  # The local tiers are tuned for the default prompt
+            return await self.ask_llm(user_input, prompt)
+
+        normalized = normalize_selector_input(user_input)
+        answer = self._memo.get(normalized)
+        if answer is not None:
+            self._memo.move_to_end(normalized)
+            metrics.increment("selector_memo_hits")
+            return answer
+
+        started = time.perf_counter()
+        use_code_interpreter, confidence = classify_code_interpreter_need(normalized)
+        metrics.observe("selector_lexical", time.perf_counter() - started)
+        if confidence >= self.confidence_threshold:
+            answer = "yes" if use_code_interpreter else "no"
+            metrics.increment("selector_lexical_answers")
+            logger.info(f"Code interpreter selection (lexical, confidence {confidence:.2f}): {answer}")
+        else:
+            answer = await self.ask_llm(user_input)
+            metrics.increment("selector_llm_answers")
+        self._remember(normalized, answer)
+        return answer
+
+    async def ask_llm(self, user_input: str, prompt: Optional[str] = None) -> str:
         instructions = prompt if prompt is not None else self.prompt
 
         try:
-            response = self.client.responses.create(
+            started = time.perf_counter()
+            response = await self.client.responses.create(
                 model = self.model,
                 input = f"{instructions}\nUser input: {user_input}"
             )
+            metrics.observe("selector_llm", time.perf_counter() - started)
 
             for out_item in response.output:
                 if getattr(out_item, "type", None) == "message":
@@ -45,4 +170,4 @@ class CodeInterpreterSelector:
             raise
         except Exception as e:
             logger.error(f"Unexpected error in should_use_code_interpreter: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,205 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import openai
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional, Dict, Any, Tuple, Callable, Awaitable, Set, AsyncIterator
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = True
+
+WORKSPACE_IDLE_TTL_SECONDS = int(os.getenv("CI_WORKSPACE_IDLE_TTL_SECONDS", "900"))
+WORKSPACE_MAX_ENTRIES = int(os.getenv("CI_WORKSPACE_MAX_ENTRIES", "256"))
+CONTAINER_IDLE_MINUTES = int(os.getenv("CI_CONTAINER_IDLE_MINUTES", "20"))
+
+WorkspaceKey = Tuple[str, str]  # (user_id, content hash or S3 ETag)
+
+@dataclass
+class CodeInterpreterWorkspace:
+    file_id: str
+    container_id: str
+    last_used: float = field(default_factory = time.monotonic)
+    leases: int = 0  # Responses currently streaming against this container
+    retired: bool = False  # Evicted while leased; deleted when the last lease is released
+
+    def tool(self) -> Dict[str, Any]:
+        return {"type": "code_interpreter", "container": self.container_id}
+
+# Error codes that say the container itself is gone, for errors that do not name it
+STALE_CONTAINER_ERROR_CODES = {"container_expired", "container_not_found"}
+
+# Only errors about the cached container or file mean the workspace is stale: they name its container_id
+# or file_id, or carry an explicit expired/not-found container code. Context-length, content-policy or
+# expired previous_response_id errors would fail the same way on a fresh upload.
+def is_stale_workspace_error(e: openai.APIStatusError, workspace: CodeInterpreterWorkspace) -> bool:
+    if getattr(e, "code", None) in STALE_CONTAINER_ERROR_CODES:
+        return True
+    text = f"{getattr(e, 'param', None) or ''} {e.message}".lower()
+    return workspace.container_id.lower() in text or workspace.file_id.lower() in text
+
+# Per-worker cache of uploaded health files and live code-interpreter containers, keyed by user and content
+class CodeInterpreterWorkspaceCache:
+    def __init__(self, api_key: str, idle_ttl_seconds: int = WORKSPACE_IDLE_TTL_SECONDS,
+                 max_entries: int = WORKSPACE_MAX_ENTRIES, container_idle_minutes: int = CONTAINER_IDLE_MINUTES) -> None:
+        self.client = openai.AsyncOpenAI(api_key = api_key)
+        # Entries must expire locally before OpenAI expires the idle container
+        self.idle_ttl_seconds = min(idle_ttl_seconds, max(container_idle_minutes * 60 - 60, 60))
+        self.max_entries = max_entries
+        self.container_idle_minutes = container_idle_minutes
+        self._entries: "OrderedDict[WorkspaceKey, CodeInterpreterWorkspace]" = OrderedDict()
+        self._locks: Dict[WorkspaceKey, asyncio.Lock] = {}
+        self._lock_users: Dict[WorkspaceKey, int] = {}
+        self._retired: Dict[str, CodeInterpreterWorkspace] = {}  # By container id
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+
+    # Hash the file contents without moving the caller's read position
+    @staticmethod
+    def content_hash(file_obj: BinaryIO) -> str:
+        position = file_obj.tell()
+        file_obj.seek(0)
+        digest = hashlib.sha256()
+        for block in iter(lambda: file_obj.read(1024 * 1024), b""):
+            digest.update(block)
+        file_obj.seek(position)
+        return digest.hexdigest()
+
+    def _is_expired(self, workspace: CodeInterpreterWorkspace) -> bool:
+        return not workspace.leases and time.monotonic() - workspace.last_used >= self.idle_ttl_seconds
+
+    # Drop the entry so no new turn picks it up; the remote container is deleted once no stream is using it
+    def _evict(self, key: WorkspaceKey, reason: str) -> None:
+        workspace = self._entries.pop(key, None)
+        if workspace is None:
+            return
+        if workspace.leases:
+            logger.info(f"[CI-WORKSPACE] Retiring workspace for user {key[0]} ({reason}), deleting after {workspace.leases} stream(s) finish: container {workspace.container_id}")
+            workspace.retired = True
+            self._retired[workspace.container_id] = workspace
+            return
+        logger.info(f"[CI-WORKSPACE] Evicting workspace for user {key[0]} ({reason}): file {workspace.file_id}, container {workspace.container_id}")
+        self._schedule_delete(workspace)
+
+    def _schedule_delete(self, workspace: CodeInterpreterWorkspace) -> None:
+        task = asyncio.create_task(self._delete_remote(workspace))
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+
+    def _release(self, workspace: CodeInterpreterWorkspace) -> None:
+        workspace.leases -= 1
+        workspace.last_used = time.monotonic()
+        if workspace.retired and not workspace.leases and self._retired.pop(workspace.container_id, None) is not None:
+            self._schedule_delete(workspace)
+
+    async def _delete_remote(self, workspace: CodeInterpreterWorkspace) -> None:
+        try:
+            await self.client.containers.delete(workspace.container_id)
+        except openai.APIError as e:
+            logger.debug(f"[CI-WORKSPACE] Container {workspace.container_id} already gone: {e}")
+        try:
+            await self.client.files.delete(workspace.file_id)
+        except openai.APIError as e:
+            logger.warning(f"[CI-WORKSPACE] Failed to delete stale file {workspace.file_id}: {e}")
+
+    def _sweep(self, keep: WorkspaceKey) -> None:
+        for key, workspace in list(self._entries.items()):
+            if key == keep:
+                continue
+            if self._is_expired(workspace):
+                self._evict(key, "idle")
+            elif key[0] == keep[0]:
+                self._evict(key, "superseded by newer health data")  # Only the user's latest data stays warm
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._evict(oldest_key, "capacity")
+
+    async def _create(self, file_obj: BinaryIO, filename: str) -> CodeInterpreterWorkspace:
+        file_obj.seek(0)
+        file = await self.client.files.create(
+            file = (filename, file_obj, "text/csv"),
+            purpose = "assistants"
+        )
+        try:
+            container = await self.client.containers.create(
+                name = f"health-data-{file.id}",
+                file_ids = [file.id],
+                expires_after = {"anchor": "last_active_at", "minutes": self.container_idle_minutes}
+            )
+        except BaseException:  # Including cancellation of a speculative warm-up
+            await self.client.files.delete(file.id)
+            raise
+        return CodeInterpreterWorkspace(file_id = file.id, container_id = container.id)
+
+    async def get_workspace(self, user_id: str, file_obj: BinaryIO, filename: str = "user_health_data.csv",
+                            content_key: Optional[str] = None) -> Tuple[WorkspaceKey, CodeInterpreterWorkspace]:
+        key = (user_id, content_key or self.content_hash(file_obj))
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:  # Concurrent turns on the same data share a single upload
+                workspace = self._entries.get(key)
+                if workspace is not None and self._is_expired(workspace):
+                    self._evict(key, "idle")
+                    workspace = None
+                if workspace is None:
+                    started = time.perf_counter()
+                    workspace = await self._create(file_obj, filename)
+                    self._entries[key] = workspace
+                    logger.info(f"[CI-WORKSPACE] Created workspace for user {user_id} in {time.perf_counter() - started:.2f}s: file {workspace.file_id}, container {workspace.container_id}")
+                else:
+                    logger.info(f"[CI-WORKSPACE] Reusing workspace for user {user_id}: container {workspace.container_id}")
+                workspace.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                self._sweep(keep = key)
+                return key, workspace
+        finally:
+            # The lock only serializes callers that are here now; drop it with the last one, even if _create raised
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    def invalidate(self, key: WorkspaceKey) -> None:
+        self._evict(key, "invalidated")
+
+    async def _leased_create(self, workspace: CodeInterpreterWorkspace, create_response: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        workspace.leases += 1
+        try:
+            return await create_response(workspace.tool())
+        except BaseException:
+            self._release(workspace)
+            raise
+
+    # Run a responses.create call against the cached workspace and hold the workspace until the caller has
+    # finished streaming. Retries once on a fresh workspace if the error is about the container or file.
+    @asynccontextmanager
+    async def response_with_workspace(self, user_id: str, file_obj: BinaryIO, create_response: Callable[[Dict[str, Any]], Awaitable[Any]],
+                                      filename: str = "user_health_data.csv", content_key: Optional[str] = None) -> AsyncIterator[Any]:
+        key, workspace = await self.get_workspace(user_id, file_obj, filename, content_key)
+        try:
+            response = await self._leased_create(workspace, create_response)
+        except (openai.NotFoundError, openai.BadRequestError) as e:
+            if not is_stale_workspace_error(e, workspace):
+                raise
+            logger.warning(f"[CI-WORKSPACE] Cached workspace rejected for user {user_id}, recreating: {e}")
+            self.invalidate(key)
+            key, workspace = await self.get_workspace(user_id, file_obj, filename, content_key)
+            response = await self._leased_create(workspace, create_response)
+        try:
+            yield response
+        finally:
+            self._release(workspace)
+
+    # Delete every remote file and container this worker still holds
+    async def close(self) -> None:
+        for key in list(self._entries):
+            self._evict(key, "shutdown")
+        for workspace in self._retired.values():
+            self._schedule_delete(workspace)
+        self._retired.clear()
+        if self._cleanup_tasks:
+            await asyncio.gather(*self._cleanup_tasks, return_exceptions = True)
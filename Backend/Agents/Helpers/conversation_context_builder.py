@@ -0,0 +1,128 @@
+import os
+import asyncio
+import logging
+import openai
+from typing import List, Set, Tuple
+
+from Backend.Database.db import short_session
+from Backend.Database.chat_repository import get_chat_messages_after
+from Backend.Database.conversation_repository import get_conversation, upsert_conversation_summary
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = True
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))
+CHAT_CONTEXT_RECENT_TURNS = int(os.getenv("CHAT_CONTEXT_RECENT_TURNS", "6"))
+CHAT_SUMMARY_BATCH_MESSAGES = int(os.getenv("CHAT_SUMMARY_BATCH_MESSAGES", "8"))
+
+# Rough token estimate (about 4 characters per token for English text); good enough for budgeting
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _format_message(role: str, content: str) -> str:
+    return f"{'User' if role == 'user' else 'Assistant'}: {content}"
+
+# Builds a bounded-size conversation context: a rolling summary of older turns plus the last turns verbatim.
+# The summary lives in user_conversations and is advanced incrementally after each reply.
+class ConversationContextBuilder:
+    def __init__(self, client: openai.AsyncOpenAI, prompt_path: str, model: str = "gpt-4o-mini",
+                 token_budget: int = CHAT_CONTEXT_TOKEN_BUDGET, recent_turns: int = CHAT_CONTEXT_RECENT_TURNS,
+                 summary_batch_messages: int = CHAT_SUMMARY_BATCH_MESSAGES) -> None:
+        self.client = client
+        self.model = model
+        self.token_budget = token_budget
+        self.recent_messages = recent_turns * 2
+        self.summary_batch_messages = summary_batch_messages
+        self._compacting: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        try:
+            with open(prompt_path, "r", encoding = "utf-8") as f:
+                self.prompt = f.read()
+        except Exception as e:
+            logger.error(f"Error reading prompt file: {e}")
+            raise
+
+    async def build(self, conversation_id: str, user_id: str) -> str:
+        async with short_session() as session:  # Released before the LLM stream starts
+            conversation = await get_conversation(session, conversation_id, user_id)
+            summarized_through_id = conversation.summarized_through_id if conversation else 0
+            # Unsummarized messages never exceed the verbatim window plus one pending compaction batch
+            messages = await get_chat_messages_after(
+                session, conversation_id, user_id, after_id = summarized_through_id,
+                limit = self.recent_messages + self.summary_batch_messages * 2
+            )
+
+        remaining = self.token_budget
+        summary_block = ""
+        if conversation and conversation.summary:
+            summary_block = f"Summary of the earlier conversation:\n{conversation.summary}"
+            remaining -= estimate_tokens(summary_block)
+
+        # Newest messages first until the budget runs out, then restore chronological order
+        lines: List[str] = []
+        for message in reversed(messages):
+            line = _format_message(message.role, message.content)
+            cost = estimate_tokens(line)
+            if cost > remaining and lines:
+                break
+            lines.append(line)
+            remaining -= cost
+        lines.reverse()
+
+        parts = [summary_block, "\n".join(lines)] if summary_block else ["\n".join(lines)]
+        context = "\n\n".join(part for part in parts if part)
+        logger.info(f"[CONV] Context for LLM ({conversation_id}, {user_id}): {len(lines)} recent messages, summary {'yes' if summary_block else 'no'}, ~{self.token_budget - remaining} tokens")
+        return context
+
+    # Fold messages that fell out of the verbatim window into the rolling summary, in the background
+    def schedule_compaction(self, conversation_id: str, user_id: str) -> None:
+        key = (conversation_id, user_id)
+        if key in self._compacting:
+            return
+        self._compacting.add(key)
+        task = asyncio.create_task(self._compact(conversation_id, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._compacting.discard(key))
+
+    async def _compact(self, conversation_id: str, user_id: str) -> None:
+        try:
+            async with short_session() as session:
+                conversation = await get_conversation(session, conversation_id, user_id)
+                summarized_through_id = conversation.summarized_through_id if conversation else 0
+                messages = await get_chat_messages_after(session, conversation_id, user_id, after_id = summarized_through_id)
+
+            older = messages[:-self.recent_messages] if self.recent_messages else messages
+            if len(older) < self.summary_batch_messages:
+                return
+
+            # Bound each summarization call; anything left over is folded in by the next compaction
+            batch: List[str] = []
+            batch_tokens = 0
+            last_id = summarized_through_id
+            for message in older:
+                line = _format_message(message.role, message.content)
+                if batch and batch_tokens + estimate_tokens(line) > self.token_budget * 4:
+                    break
+                batch.append(line)
+                batch_tokens += estimate_tokens(line)
+                last_id = message.id
+
+            previous_summary = conversation.summary if conversation and conversation.summary else "(empty)"
+            transcript = "\n".join(batch)
+            response = await self.client.responses.create(
+                model = self.model,
+                instructions = self.prompt,
+                input = f"Current summary:\n{previous_summary}\n\nNewer messages:\n{transcript}"
+            )
+            summary = response.output_text.strip()
+            if not summary:
+                return
+
+            async with short_session() as session:
+                await upsert_conversation_summary(session, conversation_id, user_id, summary, last_id)
+            logger.info(f"[CONV] Compacted {len(batch)} messages into the summary of ({conversation_id}, {user_id})")
+        except Exception as e:
+            logger.error(f"[CONV] Summary compaction failed for ({conversation_id}, {user_id}): {e}")
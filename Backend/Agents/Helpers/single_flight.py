@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterable, Callable, Dict, Hashable, List, Optional
+
+from Backend.Utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = True
+
+# Stable digest of a prompt or input, ignoring whitespace differences
+def normalized_digest(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+@dataclass
+class _Flight:
+    chunks: List[Any] = field(default_factory = list)
+    changed: asyncio.Event = field(default_factory = asyncio.Event)
+    done: bool = False
+    error: Optional[BaseException] = None
+    subscribers: int = 0
+    task: Optional[asyncio.Task] = None
+
+# Coalesces identical concurrent generations: the first caller for a key starts the upstream stream and
+# later callers attach to it. Chunks go into a per-flight log that every subscriber reads at its own pace,
+# so a slow client never holds back the upstream or the other subscribers, and a late joiner still gets
+# the whole response. The upstream is cancelled once its last subscriber leaves.
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def subscribe(self, key: Hashable, start: Callable[[], AsyncIterable[Any]]) -> AsyncGenerator[Any, None]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, start))
+            metrics.increment(f"{self.name}_flights")
+        else:
+            metrics.increment(f"{self.name}_flights_joined")
+            logger.info(f"[SINGLE-FLIGHT] {self.name}: joined an in-flight generation ({flight.subscribers} attached)")
+        flight.subscribers += 1
+
+        index = 0
+        try:
+            while True:
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._forget(key, flight)  # Callers arriving from now on start a fresh generation
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _notify(self, flight: _Flight) -> None:
+        flight.changed.set()
+        flight.changed = asyncio.Event()
+
+    async def _run(self, key: Hashable, flight: _Flight, start: Callable[[], AsyncIterable[Any]]) -> None:
+        upstream = start()
+        try:
+            async for chunk in upstream:
+                flight.chunks.append(chunk)
+                self._notify(flight)
+        except asyncio.CancelledError:
+            flight.error = RuntimeError(f"{self.name} generation was cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(key, flight)
+            self._notify(flight)
+            aclose = getattr(upstream, "aclose", None)
+            if aclose is not None:
+                await aclose()
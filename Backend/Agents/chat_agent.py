@@ -1,9 +1,16 @@
+import asyncio
 import logging
 import openai
-from typing import BinaryIO, Optional, List, Any, Generator
+from typing import BinaryIO, Optional, List, Dict, Any, AsyncGenerator
 from dataclasses import dataclass
 
+from Backend.Database.db import short_session
 from Backend.Database.chat_repository import create_chat_message, get_chat_history
+from Backend.Database.conversation_repository import get_conversation, set_last_response_id, clear_last_response_id
+from Backend.Agents.Helpers.code_interpreter_workspace import CodeInterpreterWorkspaceCache
+from Backend.Agents.Helpers.conversation_context_builder import ConversationContextBuilder, CHAT_CONTEXT_TOKEN_BUDGET, estimate_tokens
+from Backend.Database.chat_write_queue import ChatMessageWriteQueue
+from Backend.Utils.streaming_utils import close_upstream
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -15,10 +22,15 @@ class Message:
     content: str
 
 class ChatAgent:
-    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini") -> None:
+    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini",
+                 workspace_cache: Optional[CodeInterpreterWorkspaceCache] = None,
+                 summary_prompt_path: Optional[str] = None, write_queue: Optional[ChatMessageWriteQueue] = None) -> None:
         self.api_key = api_key
         self.model = model
-        self.client = openai.OpenAI(api_key = api_key)
+        self.client = openai.AsyncOpenAI(api_key = api_key)
+        self.workspace_cache = workspace_cache
+        self.write_queue = write_queue
+        self.context_builder = ConversationContextBuilder(self.client, summary_prompt_path, model) if summary_prompt_path else None
 
         try:
             with open(prompt_path, "r", encoding = "utf-8") as f:
@@ -27,40 +39,130 @@ class ChatAgent:
             logger.error(f"Error reading prompt file: {e}")
             raise
 
+    # Persist one message. With a write-behind queue the message is only queued and the returned
+    # future resolves once its batch has committed; otherwise it is committed before this returns.
+    async def _save_message(self, conversation_id: str, user_id: str, role: str, content: str) -> Optional[asyncio.Future]:
+        if self.write_queue is not None:
+            return self.write_queue.submit(conversation_id, user_id, role, content)
+        async with short_session() as session:  # Released before the LLM stream starts
+            await create_chat_message(session, conversation_id, user_id, role, content)
+        return None
+
     # Save a user message to the database for conversation history
-    def _append_user_message(self, conversation_id: str, user_id: str, user_message: str, session) -> None:
+    async def _append_user_message(self, conversation_id: str, user_id: str, user_message: str) -> Optional[asyncio.Future]:
         if not conversation_id or not user_message.strip():
-            return
-        if session is None:
-            raise ValueError("A database session must be provided.")
-        create_chat_message(session, conversation_id, user_id, "user", user_message.strip())
-        logger.info(f"[CONV] User message appended to DB ({conversation_id}, {user_id}): {user_message.strip()}")
+            return None
+        saved = await self._save_message(conversation_id, user_id, "user", user_message.strip())
+        logger.info(f"[CONV] User message {'queued' if saved is not None else 'appended to DB'} ({conversation_id}, {user_id}): {user_message.strip()}")
+        return saved
 
-    # Save an assistant response to the database for conversation history
-    def _append_assistant_response(self, conversation_id: str, user_id: str, full_response: str, session) -> None:
+    # Save an assistant response to the database for conversation history; durable when this returns
+    async def _append_assistant_response(self, conversation_id: str, user_id: str, full_response: str) -> None:
         if not conversation_id or not full_response.strip():
             return
-        if session is None:
-            raise ValueError("A database session must be provided.")
-        create_chat_message(session, conversation_id, user_id, "assistant", full_response.strip())
+        saved = await self._save_message(conversation_id, user_id, "assistant", full_response.strip())
+        if saved is not None:
+            await saved
         logger.info(f"[CONV] Assistant response appended to DB ({conversation_id}, {user_id}): {full_response.strip()}")
 
     # Build a formatted string for conversation history for LLM context (user: ..., assistant: ...)
-    def _build_conversation_context_string(self, conversation_id: Optional[str], user_id: Optional[str], session) -> str:
+    async def _build_conversation_context_string(self, conversation_id: Optional[str], user_id: Optional[str]) -> str:
         if not conversation_id or not user_id:
             return ""
 
-        db_history = get_chat_history(session, conversation_id, user_id)
-        conversation_context = ""
-        for message in db_history:
-            role = "User" if message.role == "user" else "Assistant"
-            conversation_context += f"{role}: {message.content}\n"
-        logger.info(f"[CONV] Context for LLM ({conversation_id}, {user_id}):\n{conversation_context.strip()}")
-        return conversation_context.strip()
+        if self.context_builder is not None:
+            return await self.context_builder.build(conversation_id, user_id)
+
+        async with short_session() as session:  # Released before the LLM stream starts
+            db_history = await get_chat_history(session, conversation_id, user_id)
+        conversation_context = "\n".join(
+            f"{'User' if message.role == 'user' else 'Assistant'}: {message.content}" for message in db_history
+        )
+        logger.info(f"[CONV] Context for LLM ({conversation_id}, {user_id}): {len(db_history)} messages")
+        return conversation_context
+
+    # Fold older turns into the rolling conversation summary after a reply has been saved
+    def schedule_context_compaction(self, conversation_id: str, user_id: str) -> None:
+        if self.context_builder is not None and conversation_id and user_id:
+            self.context_builder.schedule_compaction(conversation_id, user_id)
+
+    # Latest stored upstream response for this conversation, if any
+    async def _get_previous_response_id(self, conversation_id: Optional[str], user_id: Optional[str]) -> Optional[str]:
+        if not conversation_id or not user_id:
+            return None
+        async with short_session() as session:
+            conversation = await get_conversation(session, conversation_id, user_id)
+        return conversation.last_response_id if conversation else None
+
+    @staticmethod
+    def _is_expired_chain_error(e: openai.APIError) -> bool:
+        return getattr(e, "param", None) == "previous_response_id" or "previous_response" in str(e)
+
+    # Chain the turn to the previous upstream response so only the new user message is sent.
+    # Instructions go in the fixed `instructions` prefix so upstream prompt caching applies.
+    # Falls back to rebuilding the context from the database when there is no chain or it has expired.
+    async def _create_chained_response(self, conversation_id: Optional[str], user_id: Optional[str], user_input: str,
+                                       instructions: str, **kwargs) -> Any:
+        previous_response_id = await self._get_previous_response_id(conversation_id, user_id)
+        if previous_response_id:
+            try:
+                return await self.client.responses.create(
+                    model = self.model,
+                    instructions = instructions,
+                    input = user_input,
+                    previous_response_id = previous_response_id,
+                    truncation = "auto",
+                    store = True,
+                    stream = True,
+                    **kwargs
+                )
+            except (openai.NotFoundError, openai.BadRequestError) as e:
+                if not self._is_expired_chain_error(e):
+                    raise
+                logger.warning(f"[CONV] Response chain expired for ({conversation_id}, {user_id}), rebuilding from DB: {e}")
+                async with short_session() as session:
+                    await clear_last_response_id(session, conversation_id, user_id, previous_response_id)
+
+        conversation_context = await self._build_conversation_context_string(conversation_id, user_id)
+        return await self.client.responses.create(
+            model = self.model,
+            instructions = instructions,
+            input = f"Conversation:\n{conversation_context}\nUser: {user_input}" if conversation_context else user_input,
+            truncation = "auto",
+            store = True,
+            stream = True,
+            **kwargs
+        )
+
+    # Pass stream events through and remember the completed response id as the conversation's chain head.
+    # A chained turn is billed for the whole upstream history, so once that history exceeds
+    # CHAT_CONTEXT_TOKEN_BUDGET the chain is dropped and the next turn starts a new one from the
+    # bounded context (rolling summary plus recent turns).
+    async def _stream_and_record(self, response: Any, conversation_id: Optional[str], user_id: Optional[str],
+                                 instructions: str = "") -> AsyncGenerator[Any, None]:
+        response_id = None
+        input_tokens = None
+        try:
+            async for chunk in response:
+                if getattr(chunk, "type", None) == "response.completed":
+                    response_id = chunk.response.id
+                    input_tokens = getattr(getattr(chunk.response, "usage", None), "input_tokens", None)
+                yield chunk
+        finally:
+            await close_upstream(response)  # Stops generation (and billing) when the client has gone away
+        if response_id and conversation_id and user_id:
+            if input_tokens is not None and input_tokens - estimate_tokens(instructions) > CHAT_CONTEXT_TOKEN_BUDGET:
+                logger.info(f"[CONV] Response chain for ({conversation_id}, {user_id}) reached {input_tokens} input tokens; starting a new chain next turn")
+                response_id = None
+            try:
+                async with short_session() as session:
+                    await set_last_response_id(session, conversation_id, user_id, response_id)
+            except Exception as e:
+                logger.error(f"[CONV] Failed to record response id for ({conversation_id}, {user_id}): {e}")
 
     # Retrieve conversation history as a list of Message objects
-    def get_conversation_messages(self, conversation_id: str, user_id: str, session) -> List[Message]:
-        db_history = get_chat_history(session, conversation_id, user_id)
+    async def get_conversation_messages(self, conversation_id: str, user_id: str, session) -> List[Message]:
+        db_history = await get_chat_history(session, conversation_id, user_id)
         messages = []
         for m in db_history:
             msg = Message(role = m.role, content = m.content)
@@ -68,18 +170,13 @@ class ChatAgent:
         return messages
 
     # Generate a streaming simple chat response (without OpenAI tools)
-    def simple_chat(self, user_input: str, user_id: str, prompt: Optional[str] = None,
-                    conversation_id: Optional[str] = None, session = None) -> Generator[Any, None, None]:
-        conversation_context = self._build_conversation_context_string(conversation_id, user_id, session)
+    async def simple_chat(self, user_input: str, user_id: str, prompt: Optional[str] = None,
+                          conversation_id: Optional[str] = None) -> AsyncGenerator[Any, None]:
         instructions = prompt if prompt is not None else self.prompt
 
         try:
-            response = self.client.responses.create(
-                model = self.model,
-                input = f"{instructions}\nConversation:\n{conversation_context}\nUser: {user_input}",
-                stream = True
-            )
-            for chunk in response:
+            response = await self._create_chained_response(conversation_id, user_id, user_input, instructions)
+            async for chunk in self._stream_and_record(response, conversation_id, user_id, instructions):
                 yield chunk
         except openai.APIError as e:
             logger.error(f"OpenAI API error: {e}")
@@ -89,35 +186,36 @@ class ChatAgent:
             raise
 
     # Generate a streaming chat response (with code interpreter)
-    def chat_with_code_interpreter(self, file_obj: BinaryIO, user_input: str, user_id: str,
-                          prompt: Optional[str] = None, conversation_id: Optional[str] = None,
-                          filename: str = "user_health_data.csv", session = None) -> Generator[Any, None, None]:
-        conversation_context = self._build_conversation_context_string(conversation_id, user_id, session)
+    async def chat_with_code_interpreter(self, file_obj: BinaryIO, user_input: str, user_id: str,
+                                         prompt: Optional[str] = None, conversation_id: Optional[str] = None,
+                                         filename: str = "user_health_data.csv", content_key: Optional[str] = None) -> AsyncGenerator[Any, None]:
         instructions = prompt if prompt is not None else self.prompt
 
+        async def create_response(tool: Dict[str, Any]):
+            return await self._create_chained_response(conversation_id, user_id, user_input, instructions, tools = [tool])
+
         try:
-            file_obj.seek(0)
-            file = self.client.files.create(
-                file = (filename, file_obj, "text/csv"),
-                purpose = "assistants"
-            )
-            response = self.client.responses.create(
-                model = self.model,
-                tools = [
-                    {
-                        "type": "code_interpreter",
-                        "container": {
-                            "type": "auto",
-                            "file_ids": [file.id]
-                        }
+            if self.workspace_cache is not None:
+                # Reuse the uploaded file and a warm container for follow-up questions on the same data;
+                # the container is held until this stream ends
+                async with self.workspace_cache.response_with_workspace(user_id, file_obj, create_response, filename, content_key) as response:
+                    async for chunk in self._stream_and_record(response, conversation_id, user_id, instructions):
+                        yield chunk
+            else:
+                file_obj.seek(0)
+                file = await self.client.files.create(
+                    file = (filename, file_obj, "text/csv"),
+                    purpose = "assistants"
+                )
+                response = await create_response({
+                    "type": "code_interpreter",
+                    "container": {
+                        "type": "auto",
+                        "file_ids": [file.id]
                     }
-                ],
-                instructions = instructions,
-                input = f"{conversation_context}\nUser: {user_input}",
-                stream = True
-            )
-            for chunk in response:
-                yield chunk
+                })
+                async for chunk in self._stream_and_record(response, conversation_id, user_id, instructions):
+                    yield chunk
         except openai.APIError as e:
             logger.error(f"OpenAI API error: {e}")
             raise
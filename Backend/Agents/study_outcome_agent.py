@@ -1,18 +1,22 @@
 import logging
 import openai
-from typing import BinaryIO, Optional, Any, Generator
+from typing import BinaryIO, Optional, Dict, Any, AsyncGenerator
 
 from Backend.Database.study_repository import update_study_outcome_by_id
+from Backend.Agents.Helpers.code_interpreter_workspace import CodeInterpreterWorkspaceCache
+from Backend.Utils.streaming_utils import close_upstream
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.propagate = True
 
 class StudyOutcomeAgent:
-    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini") -> None:
+    def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini",
+                 workspace_cache: Optional[CodeInterpreterWorkspaceCache] = None) -> None:
         self.api_key = api_key
         self.model = model
-        self.client = openai.OpenAI(api_key = api_key)
+        self.client = openai.AsyncOpenAI(api_key = api_key)
+        self.workspace_cache = workspace_cache
 
         try:
             with open(prompt_path, "r", encoding = "utf-8") as f:
@@ -22,39 +26,55 @@ class StudyOutcomeAgent:
             raise
 
     # Persist study outcome to the database
-    def _append_study_outcome(self, study_id: str, user_id: str, outcome: str, session) -> None:
+    async def _append_study_outcome(self, study_id: str, user_id: str, outcome: str, session) -> None:
         if not study_id or not outcome.strip():
             return
         if session is None:
             raise ValueError("A database session must be provided.")
-        update_study_outcome_by_id(session, study_id, outcome.strip(), user_id)
+        await update_study_outcome_by_id(session, study_id, outcome.strip(), user_id)
 
-    def generate_study_outcome(self, file_obj: BinaryIO, user_input: str, prompt: Optional[str] = None, filename: str = "user_health_data.csv") -> Generator[Any, None, None]:
+    async def generate_study_outcome(self, file_obj: BinaryIO, user_input: str, prompt: Optional[str] = None, filename: str = "user_health_data.csv",
+                                     user_id: Optional[str] = None, content_key: Optional[str] = None) -> AsyncGenerator[Any, None]:
         instructions = prompt if prompt is not None else self.prompt
 
-        try:
-            file_obj.seek(0)
-            file = self.client.files.create(
-                file = (filename, file_obj, "text/csv"),
-                purpose = "assistants"
-            )
-            response = self.client.responses.create(
+        async def create_response(tool: Dict[str, Any]):
+            return await self.client.responses.create(
                 model = self.model,
-                tools = [
-                    {
-                        "type": "code_interpreter",
-                        "container": {
-                            "type": "auto",
-                            "file_ids": [file.id]
-                        }
-                    }
-                ],
+                tools = [tool],
                 instructions = instructions,
                 input = user_input,
                 stream = True
             )
-            for chunk in response:
-                yield chunk
+
+        async def relay(response) -> AsyncGenerator[Any, None]:
+            try:
+                async for chunk in response:
+                    yield chunk
+            finally:
+                await close_upstream(response)  # Stops generation when the client has gone away
+
+        try:
+            if self.workspace_cache is not None and user_id:
+                # Reuse the uploaded file and a warm container when the user's data has not changed;
+                # the container is held until this stream ends
+                async with self.workspace_cache.response_with_workspace(user_id, file_obj, create_response, filename, content_key) as response:
+                    async for chunk in relay(response):
+                        yield chunk
+            else:
+                file_obj.seek(0)
+                file = await self.client.files.create(
+                    file = (filename, file_obj, "text/csv"),
+                    purpose = "assistants"
+                )
+                response = await create_response({
+                    "type": "code_interpreter",
+                    "container": {
+                        "type": "auto",
+                        "file_ids": [file.id]
+                    }
+                })
+                async for chunk in relay(response):
+                    yield chunk
         except openai.APIError as e:
             logger.error(f"OpenAI API error: {e}")
             raise
@@ -1,8 +1,10 @@
 import logging
 import openai
-from typing import Optional, Any, Generator
+from typing import Optional, Any, AsyncGenerator
 
 from Backend.Database.study_repository import update_study_summary_by_id
+from Backend.Utils.streaming_utils import close_upstream
+from Backend.Agents.Helpers.single_flight import SingleFlight, normalized_digest
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -12,7 +14,8 @@ class StudySummaryAgent:
     def __init__(self, api_key: str, prompt_path: str, model: str = "gpt-4o-mini") -> None:
         self.api_key = api_key
         self.model = model
-        self.client = openai.OpenAI(api_key = api_key)
+        self.client = openai.AsyncOpenAI(api_key = api_key)
+        self.flights = SingleFlight("study_summary")
 
         try:
             with open(prompt_path, "r", encoding = "utf-8") as f:
@@ -22,27 +25,40 @@ class StudySummaryAgent:
             raise
 
     # Persist study summary to the database
-    def _append_study_summary(self, study_id: str, user_id: str, summary: str, session) -> None:
+    async def _append_study_summary(self, study_id: str, user_id: str, summary: str, session) -> None:
         if not study_id or not summary.strip():
             return
         if session is None:
             raise ValueError("A database session must be provided.")
-        update_study_summary_by_id(session, study_id, summary.strip(), user_id)
+        await update_study_summary_by_id(session, study_id, summary.strip(), user_id)
 
-    def generate_study_summary(self, text: str, prompt: Optional[str] = None) -> Generator[Any, None, None]:
+    # Concurrent requests for the same text and prompt share one upstream generation; each caller still
+    # persists the result through its own callback
+    async def generate_study_summary(self, text: str, prompt: Optional[str] = None) -> AsyncGenerator[Any, None]:
         instructions = prompt if prompt is not None else self.prompt
+        key = ("study_summary", self.model, normalized_digest(instructions), normalized_digest(text))
+        subscription = self.flights.subscribe(key, lambda: self._stream_study_summary(text, instructions))
+        try:
+            async for chunk in subscription:
+                yield chunk
+        finally:
+            await subscription.aclose()  # Detach now, so the upstream stops as soon as nobody is left
 
+    async def _stream_study_summary(self, text: str, instructions: str) -> AsyncGenerator[Any, None]:
         try:
-            response = self.client.responses.create(
+            response = await self.client.responses.create(
                 model = self.model,
                 input = f"{instructions}\n\nText to summarize:\n{text}",
                 stream = True
             )
-            for chunk in response:
-                yield chunk
+            try:
+                async for chunk in response:
+                    yield chunk
+            finally:
+                await close_upstream(response)  # Stops generation when the client has gone away
         except openai.APIError as e:
             logger.error(f"OpenAI API error: {e}")
             raise
         except Exception as e:
             logger.error(f"Unexpected error in generate_study_summary: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,96 @@
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import func, select, text, delete
+
+from Backend.Database.db import AsyncSessionLocal, async_engine
+from Backend.Database.chat_models import ChatsDB
+from Backend.Database.conversation_models import ConversationsDB
+from Backend.Database.conversation_repository import list_conversations
+
+# Compares the previous GROUP BY session listing with the conversation index on a user with a
+# large message history. Seeds a throwaway user in the configured DATABASE_URL (migrated to head)
+# and removes it afterwards.
+#
+#   python -m Backend.Benchmarks.chat_sessions_benchmark --messages 100000 --conversations 500
+
+SEED_MESSAGES_SQL = text("""
+    INSERT INTO user_chats_data (conversation_id, user_id, role, content, timestamp)
+    SELECT md5(:user_id || '-' || (g % :conversations))::uuid, :user_id,
+           CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+           'benchmark message ' || g,
+           now() - make_interval(secs => :messages - g)
+    FROM generate_series(1, :messages) AS g
+""")
+
+SEED_CONVERSATIONS_SQL = text("""
+    INSERT INTO user_conversations (conversation_id, user_id, summarized_through_id, last_active, message_count, title_snippet)
+    SELECT conversation_id, user_id, 0, max(timestamp), count(*), left(min(content), 80)
+    FROM user_chats_data WHERE user_id = :user_id
+    GROUP BY conversation_id, user_id
+""")
+
+# The listing query this index replaces
+async def legacy_sessions(session, user_id: str) -> int:
+    subquery = select(
+        ChatsDB.conversation_id,
+        func.max(ChatsDB.timestamp).label('last_message_at')
+    ).filter(ChatsDB.user_id == user_id).group_by(ChatsDB.conversation_id).subquery()
+    result = await session.execute(
+        select(ChatsDB).join(
+            subquery,
+            (ChatsDB.conversation_id == subquery.c.conversation_id) &
+            (ChatsDB.timestamp == subquery.c.last_message_at)
+        ).filter(ChatsDB.user_id == user_id)
+    )
+    return len(result.scalars().all())
+
+async def indexed_sessions(session, user_id: str, limit: int) -> int:
+    return len(await list_conversations(session, user_id, limit))
+
+async def time_query(query: Callable[[], Awaitable[int]], repeats: int) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await query()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description = "Chat session listing, GROUP BY vs conversation index")
+    parser.add_argument("--messages", type = int, default = 100_000)
+    parser.add_argument("--conversations", type = int, default = 500)
+    parser.add_argument("--page-size", type = int, default = 100)
+    parser.add_argument("--repeats", type = int, default = 20)
+    args = parser.parse_args()
+
+    user_id = f"bench-{uuid.uuid4().hex[:12]}"
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(SEED_MESSAGES_SQL, {"user_id": user_id, "messages": args.messages, "conversations": args.conversations})
+            await session.execute(SEED_CONVERSATIONS_SQL, {"user_id": user_id})
+            await session.commit()
+            await session.execute(text("ANALYZE user_chats_data"))
+            await session.execute(text("ANALYZE user_conversations"))
+            await session.commit()
+        print(f"Seeded {args.messages} messages in {args.conversations} conversations for {user_id}")
+
+        async with AsyncSessionLocal() as session:
+            legacy = await time_query(lambda: legacy_sessions(session, user_id), args.repeats)
+            indexed = await time_query(lambda: indexed_sessions(session, user_id, args.page_size), args.repeats)
+
+        for name, timings in (("group-by", legacy), (f"index (page {args.page_size})", indexed)):
+            print(f"{name:>20}: median {statistics.median(timings):8.2f} ms, max {max(timings):8.2f} ms")
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(ChatsDB).where(ChatsDB.user_id == user_id))
+            await session.execute(delete(ConversationsDB).where(ConversationsDB.user_id == user_id))
+            await session.commit()
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+from Backend.Agents.Helpers.code_interpreter_selector import (
+    CodeInterpreterSelector, SELECTOR_CONFIDENCE_THRESHOLD, classify_code_interpreter_need, normalize_selector_input
+)
+
+# Offline evaluation of the lexical pre-router against labelled corpora. For each confidence threshold
+# it reports coverage (share answered locally) and accuracy of the local answers; with --llm it also
+# asks the LLM selector for every example and reports agreement between the router and the LLM.
+#
+# The classifier's vocabulary and weights were fit on the tuning corpus, so its numbers flatter the
+# router. The threshold is picked on the held-out corpus instead: the lowest one whose local accuracy
+# reaches --target. Never add held-out examples to the vocabulary, or that choice stops meaning anything.
+#
+#   python -m Backend.Benchmarks.code_interpreter_selector_eval
+#   python -m Backend.Benchmarks.code_interpreter_selector_eval --corpus labelled.jsonl --holdout other.jsonl --llm
+#
+# A corpus is JSONL, one example per line: {"text": ..., "label": "yes" | "no"}
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "code_interpreter_selector_corpus.jsonl")
+DEFAULT_HOLDOUT = os.path.join(os.path.dirname(__file__), "data", "code_interpreter_selector_holdout.jsonl")
+DEFAULT_PROMPT = os.path.join(os.path.dirname(__file__), "..", "Prompts", "CodeInterpreterSelectorPrompt.txt")
+THRESHOLDS = [0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+def load_corpus(path: str) -> List[Dict[str, str]]:
+    with open(path, "r", encoding = "utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def classify_all(corpus: List[Dict[str, str]]) -> Tuple[List[Tuple[str, float]], float]:
+    results = []
+    started = time.perf_counter()
+    for example in corpus:
+        use_code_interpreter, confidence = classify_code_interpreter_need(normalize_selector_input(example["text"]))
+        results.append(("yes" if use_code_interpreter else "no", confidence))
+    return results, (time.perf_counter() - started) / max(len(corpus), 1)
+
+async def llm_answers(corpus: List[Dict[str, str]], concurrency: int) -> List[str]:
+    selector = CodeInterpreterSelector(os.environ["OPENAI_API_KEY"], prompt_path = DEFAULT_PROMPT)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(text: str) -> str:
+        async with semaphore:
+            return await selector.ask_llm(text)
+    return await asyncio.gather(*(ask(example["text"]) for example in corpus))
+
+def rate(hits: int, total: int) -> str:
+    return f"{hits / total:6.1%}" if total else "    -"
+
+def report(corpus: List[Dict[str, str]], local: List[Tuple[str, float]], llm: Optional[List[str]]) -> None:
+    print(f"{'threshold':>9}  {'coverage':>8}  {'local acc':>9}" + (f"  {'llm agree':>9}  {'tiered acc':>10}" if llm else ""))
+    for threshold in THRESHOLDS:
+        answered = [i for i, (_, confidence) in enumerate(local) if confidence >= threshold]
+        correct = sum(local[i][0] == corpus[i]["label"] for i in answered)
+        line = f"{threshold:>9.2f}  {rate(len(answered), len(corpus)):>8}  {rate(correct, len(answered)):>9}"
+        if llm:
+            agree = sum(local[i][0] == llm[i] for i in answered)
+            # What the endpoint would return: local answer when confident, the LLM's otherwise
+            tiered = [local[i][0] if local[i][1] >= threshold else llm[i] for i in range(len(corpus))]
+            tiered_correct = sum(answer == example["label"] for answer, example in zip(tiered, corpus))
+            line += f"  {rate(agree, len(answered)):>9}  {rate(tiered_correct, len(corpus)):>10}"
+        marker = "  <- SELECTOR_CONFIDENCE_THRESHOLD" if abs(threshold - SELECTOR_CONFIDENCE_THRESHOLD) < 1e-9 else ""
+        print(line + marker)
+    if llm:
+        llm_correct = sum(answer == example["label"] for answer, example in zip(llm, corpus))
+        print(f"LLM alone: accuracy {rate(llm_correct, len(corpus))}")
+
+def show_mistakes(corpus: List[Dict[str, str]], local: List[Tuple[str, float]], threshold: float) -> None:
+    for example, (answer, confidence) in zip(corpus, local):
+        if confidence >= threshold and answer != example["label"]:
+            print(f"  wrong ({confidence:.2f}): {example['text']!r} -> {answer}, labelled {example['label']}")
+
+# Lowest threshold whose local answers reach the target accuracy
+def pick_threshold(corpus: List[Dict[str, str]], local: List[Tuple[str, float]], target: float) -> float:
+    for threshold in THRESHOLDS:
+        answered = [i for i, (_, confidence) in enumerate(local) if confidence >= threshold]
+        if answered and sum(local[i][0] == corpus[i]["label"] for i in answered) / len(answered) >= target:
+            return threshold
+    return THRESHOLDS[-1]
+
+async def evaluate(name: str, corpus: List[Dict[str, str]], use_llm: bool, concurrency: int) -> List[Tuple[str, float]]:
+    local, seconds_per_input = classify_all(corpus)
+    print(f"\n{name}: {len(corpus)} examples, lexical router {seconds_per_input * 1e6:.1f} us/input")
+    llm = await llm_answers(corpus, concurrency) if use_llm else None
+    report(corpus, local, llm)
+    return local
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description = "Lexical code-interpreter router vs labels and the LLM selector")
+    parser.add_argument("--corpus", default = DEFAULT_CORPUS, help = "Tuning corpus the vocabulary was fit on")
+    parser.add_argument("--holdout", default = DEFAULT_HOLDOUT, help = "Held-out corpus; picks the threshold")
+    parser.add_argument("--target", type = float, default = 0.97, help = "Local accuracy the threshold must reach on the held-out corpus")
+    parser.add_argument("--llm", action = "store_true", help = "Also query the LLM selector (needs OPENAI_API_KEY)")
+    parser.add_argument("--concurrency", type = int, default = 8)
+    args = parser.parse_args()
+
+    tuning = load_corpus(args.corpus)
+    holdout = load_corpus(args.holdout)
+    tuning_local = await evaluate("Tuning corpus", tuning, args.llm, args.concurrency)
+    holdout_local = await evaluate("Held-out corpus", holdout, args.llm, args.concurrency)
+
+    threshold = pick_threshold(holdout, holdout_local, args.target)
+    print(f"\nPicked threshold {threshold:.2f} on the held-out corpus (target local accuracy {args.target:.0%}); "
+          f"SELECTOR_CONFIDENCE_THRESHOLD is {SELECTOR_CONFIDENCE_THRESHOLD:.2f}")
+    print("Tuning corpus mistakes:")
+    show_mistakes(tuning, tuning_local, threshold)
+    print("Held-out corpus mistakes:")
+    show_mistakes(holdout, holdout_local, threshold)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import List
+
+from Backend.Utils.streaming_utils import process_streaming_response
+
+# Measures how many concurrent SSE streams a single event loop (one gunicorn worker) sustains.
+# "sync" iterates a blocking upstream inside the async generator (the old OpenAI client path),
+# "async" awaits an async upstream (the AsyncOpenAI path). A stream counts as sustained when it
+# finishes within --slack times the duration it would take on its own.
+#
+#   python -m Backend.Benchmarks.concurrent_streams_benchmark --streams 1 10 50 100 200 500
+
+def _delta(text: str) -> SimpleNamespace:
+    return SimpleNamespace(type = "response.output_text.delta", delta = text)
+
+def sync_upstream(tokens: int, token_latency: float):
+    for i in range(tokens):
+        time.sleep(token_latency)  # Blocking socket read in the sync client
+        yield _delta(f"tok{i} ")
+
+async def async_upstream(tokens: int, token_latency: float):
+    for i in range(tokens):
+        await asyncio.sleep(token_latency)
+        yield _delta(f"tok{i} ")
+
+async def sync_path(tokens: int, token_latency: float):
+    # Mirrors the previous implementation: a sync stream consumed inside an async generator
+    for chunk in sync_upstream(tokens, token_latency):
+        yield chunk
+
+async def consume(mode: str, tokens: int, token_latency: float) -> float:
+    started = time.perf_counter()
+    upstream = sync_path(tokens, token_latency) if mode == "sync" else async_upstream(tokens, token_latency)
+    async for _ in process_streaming_response(upstream):
+        pass
+    return time.perf_counter() - started
+
+async def run_level(mode: str, streams: int, tokens: int, token_latency: float) -> List[float]:
+    return await asyncio.gather(*(consume(mode, tokens, token_latency) for _ in range(streams)))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Concurrent SSE streams per worker, sync vs async upstream")
+    parser.add_argument("--streams", type = int, nargs = "+", default = [1, 10, 50, 100, 200, 500])
+    parser.add_argument("--tokens", type = int, default = 50)
+    parser.add_argument("--token-latency-ms", type = float, default = 20.0)
+    parser.add_argument("--slack", type = float, default = 2.0)
+    args = parser.parse_args()
+
+    token_latency = args.token_latency_ms / 1000
+    ideal = args.tokens * token_latency
+    for mode in ("sync", "async"):
+        sustained = 0
+        for streams in args.streams:
+            durations = asyncio.run(run_level(mode, streams, args.tokens, token_latency))
+            worst = max(durations)
+            ok = worst <= ideal * args.slack
+            print(f"{mode:>5} streams={streams:<5} worst={worst:7.2f}s ideal={ideal:5.2f}s {'ok' if ok else 'saturated'}")
+            if not ok:
+                break
+            sustained = streams
+        print(f"{mode:>5} sustained concurrent streams: {sustained}\n")
+
+if __name__ == "__main__":
+    main()
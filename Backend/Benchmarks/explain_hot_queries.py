@@ -0,0 +1,102 @@
+import sys
+import json
+import uuid
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from Backend.Database.db import AsyncSessionLocal, async_engine
+from Backend.Database.chat_models import ChatsDB
+from Backend.Database.study_models import StudiesDB
+from Backend.Database.conversation_models import ConversationsDB
+from Backend.Database.study_repository import study_headers_query
+
+# Plan regression check for the hot queries: each one must be served by its composite index,
+# without a Sort or a BitmapAnd. Sequential scans are disabled for the check so the result does not
+# depend on how much data the target database holds. Exits non-zero on any regression.
+#
+#   python -m Backend.Benchmarks.explain_hot_queries
+
+USER_ID = "explain-user"
+CONVERSATION_ID = str(uuid.UUID(int = 1))
+STUDY_ID = str(uuid.UUID(int = 2))
+
+# (name, query, index it must use)
+HOT_QUERIES: List[Tuple[str, Any, str]] = [
+    (
+        "chat history",
+        select(ChatsDB).filter_by(conversation_id = CONVERSATION_ID, user_id = USER_ID).order_by(ChatsDB.timestamp),
+        "ix_user_chats_data_user_conversation_timestamp",
+    ),
+    (
+        "study by id",
+        select(StudiesDB).filter_by(study_id = STUDY_ID, user_id = USER_ID).limit(1),
+        "uq_user_studies_data_user_study",
+    ),
+    (
+        "studies for user",
+        select(StudiesDB).filter_by(user_id = USER_ID),
+        "uq_user_studies_data_user_study",
+    ),
+    (
+        "conversation state",
+        select(ConversationsDB).filter_by(conversation_id = CONVERSATION_ID, user_id = USER_ID).limit(1),
+        "uq_user_conversations_user_conversation",
+    ),
+    (
+        "session list page",
+        select(ConversationsDB).filter(ConversationsDB.user_id == USER_ID, ConversationsDB.message_count > 0)
+        .order_by(ConversationsDB.last_active.desc(), ConversationsDB.id.desc()).limit(100),
+        "ix_user_conversations_user_last_active",
+    ),
+    (
+        "study headers page",
+        study_headers_query(USER_ID).limit(50),
+        "ix_user_studies_data_user_import_date",
+    ),
+    (
+        "conversation messages page",
+        select(ChatsDB.id, ChatsDB.role, ChatsDB.content, ChatsDB.timestamp)
+        .filter_by(conversation_id = CONVERSATION_ID, user_id = USER_ID).order_by(ChatsDB.id.desc()).limit(50),
+        "ix_user_chats_data_user_conversation_id",
+    ),
+]
+
+FORBIDDEN_NODES = {"Sort", "BitmapAnd", "Seq Scan"}
+
+def _walk(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_walk(child))
+    return nodes
+
+def check_plan(plan: Dict[str, Any], expected_index: str) -> Optional[str]:
+    nodes = _walk(plan)
+    forbidden = sorted({node["Node Type"] for node in nodes} & FORBIDDEN_NODES)
+    if forbidden:
+        return f"plan contains {', '.join(forbidden)}"
+    indexes = {node.get("Index Name") for node in nodes if node.get("Index Name")}
+    if expected_index not in indexes:
+        return f"expected {expected_index}, plan uses {sorted(indexes) or 'no index'}"
+    return None
+
+async def main() -> int:
+    failures = 0
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, query, expected_index in HOT_QUERIES:
+            sql = str(query.compile(dialect = postgresql.dialect(), compile_kwargs = {"literal_binds": True}))
+            result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            raw = result.scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            problem = check_plan(plan, expected_index)
+            print(f"{'FAIL' if problem else 'ok':>4}  {name}: {problem or expected_index}")
+            failures += bool(problem)
+        await session.rollback()
+    await async_engine.dispose()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
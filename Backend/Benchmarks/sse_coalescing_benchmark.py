@@ -0,0 +1,114 @@
+import json
+import time
+import logging
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, List, Optional, Tuple
+
+from Backend.Utils.streaming_utils import process_streaming_response
+
+# Replays a recorded Responses API stream through the previous per-token SSE encoder and the
+# coalescing one. Reports CPU per stream with the recording replayed as fast as possible, and
+# frames (socket writes) plus the worst added delay with the recording's real timing.
+#
+#   python -m Backend.Benchmarks.sse_coalescing_benchmark
+#   python -m Backend.Benchmarks.sse_coalescing_benchmark --recording stream.jsonl
+#
+# A recording is JSONL, one event per line: {"t": seconds since start, "type": ..., "delta": ...}
+# ("text" instead of "delta" for response.output_text.done), as logged from a real stream.
+
+Recording = List[Tuple[float, SimpleNamespace]]
+
+def load_recording(path: str) -> Recording:
+    events = []
+    with open(path, "r", encoding = "utf-8") as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                offset = event.pop("t", 0.0)
+                events.append((offset, SimpleNamespace(**event)))
+    return events
+
+# A long code-interpreter style answer: ~3-4 character tokens at ~80 tokens/s with jitter
+def synthetic_recording(tokens: int, tokens_per_second: float, seed: int = 7) -> Recording:
+    rng = random.Random(seed)
+    vocabulary = ["Your", " average", " resting", " heart", " rate", " was", " 62", " bpm", ",", " and", " steps",
+                  " rose", " by", " 12", "%", ".", "\n", "```", "python", " df", "[", "'date'", "]", " =", " pd", ".to_datetime"]
+    events, text, offset = [], [], 0.0
+    for _ in range(tokens):
+        offset += rng.expovariate(tokens_per_second)
+        token = rng.choice(vocabulary)
+        text.append(token)
+        events.append((offset, SimpleNamespace(type = "response.output_text.delta", delta = token)))
+    events.append((offset, SimpleNamespace(type = "response.output_text.done", text = "".join(text))))
+    return events
+
+# The encoder this replaced: string concatenation and one json.dumps per token
+async def legacy_process_streaming_response(response) -> AsyncGenerator[str, None]:
+    full_response = ""
+    async for chunk in response:
+        text = ""
+        if chunk.type == "response.output_text.delta":
+            text = chunk.delta or ""
+        elif chunk.type == "response.output_text.done":
+            text = chunk.text[len(full_response):]
+        if text:
+            full_response += text
+            yield f"data: {json.dumps({'content': text, 'done': False})}\n\n"
+    yield f"data: {json.dumps({'content': '', 'done': True})}\n\n"
+
+async def replay(recording: Recording, realtime: bool, arrivals: Optional[List[float]] = None) -> AsyncGenerator[Any, None]:
+    started = time.monotonic()
+    for offset, chunk in recording:
+        if realtime:
+            delay = offset - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if arrivals is not None:
+            arrivals.append(time.monotonic())
+        yield chunk
+
+def encoder_for(name: str):
+    return legacy_process_streaming_response if name == "legacy" else process_streaming_response
+
+async def cpu_per_stream(name: str, recording: Recording, repeats: int) -> float:
+    encode = encoder_for(name)
+    started = time.process_time()
+    for _ in range(repeats):
+        async for _ in encode(replay(recording, realtime = False)):
+            pass
+    return (time.process_time() - started) / repeats
+
+async def realtime_profile(name: str, recording: Recording) -> Tuple[int, float, float]:
+    arrivals: List[float] = []
+    frames, worst_delay, next_unsent = 0, 0.0, 0
+    started = time.monotonic()
+    async for _ in encoder_for(name)(replay(recording, realtime = True, arrivals = arrivals)):
+        now = time.monotonic()
+        frames += 1
+        if next_unsent < len(arrivals):
+            worst_delay = max(worst_delay, now - arrivals[next_unsent])  # Oldest delta carried by this frame
+            next_unsent = len(arrivals)
+    duration = time.monotonic() - started
+    return frames, frames / duration, worst_delay
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description = "SSE delta coalescing vs per-token frames")
+    parser.add_argument("--recording", help = "JSONL recording of stream events")
+    parser.add_argument("--tokens", type = int, default = 1500)
+    parser.add_argument("--tokens-per-second", type = float, default = 80.0)
+    parser.add_argument("--repeats", type = int, default = 200)
+    args = parser.parse_args()
+
+    logging.getLogger("Backend.Utils.streaming_utils").setLevel(logging.ERROR)  # No callbacks here; skip the per-stream warning
+    recording = load_recording(args.recording) if args.recording else synthetic_recording(args.tokens, args.tokens_per_second)
+    print(f"Recording: {len(recording)} events over {recording[-1][0]:.1f}s")
+    for name in ("legacy", "coalesced"):
+        cpu = await cpu_per_stream(name, recording, args.repeats)
+        frames, frames_per_second, worst_delay = await realtime_profile(name, recording)
+        print(f"{name:>10}: cpu/stream {cpu * 1000:7.2f} ms, frames {frames:5d} ({frames_per_second:6.1f}/s), worst added delay {worst_delay * 1000:6.1f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
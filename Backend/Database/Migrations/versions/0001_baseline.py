@@ -0,0 +1,115 @@
+"""Baseline: the schema previously created by init_db
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases that were created by Base.metadata.create_all already have most of this schema,
+so every step is guarded and the revision can be applied to both empty and existing databases.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not _has_table('user_chats_data'):
+        op.create_table(
+            'user_chats_data',
+            sa.Column('id', sa.Integer, primary_key = True, autoincrement = True),
+            sa.Column('conversation_id', sa.String(64), nullable = False),
+            sa.Column('user_id', sa.String(64), nullable = False),
+            sa.Column('role', sa.String(16), nullable = False),
+            sa.Column('content', sa.Text, nullable = False),
+            sa.Column('timestamp', sa.DateTime(timezone = True), server_default = sa.func.now()),
+        )
+        op.create_index('ix_user_chats_data_conversation_id', 'user_chats_data', ['conversation_id'])
+        op.create_index('ix_user_chats_data_user_id', 'user_chats_data', ['user_id'])
+
+    if not _has_table('user_studies_data'):
+        op.create_table(
+            'user_studies_data',
+            sa.Column('id', sa.Integer, primary_key = True, autoincrement = True),
+            sa.Column('study_id', sa.String(64), nullable = False),
+            sa.Column('user_id', sa.String(64), nullable = False),
+            sa.Column('title', sa.String(256), nullable = False),
+            sa.Column('summary', sa.Text, nullable = True),
+            sa.Column('outcome', sa.Text, nullable = True),
+            sa.Column('import_date', sa.DateTime(timezone = True), server_default = sa.func.now()),
+        )
+        op.create_index('ix_user_studies_data_study_id', 'user_studies_data', ['study_id'])
+        op.create_index('ix_user_studies_data_user_id', 'user_studies_data', ['user_id'])
+
+    if not _has_table('user_health_data_files'):
+        op.create_table(
+            'user_health_data_files',
+            sa.Column('id', sa.Integer, primary_key = True, autoincrement = True),
+            sa.Column('user_id', sa.String(64), nullable = False),
+            sa.Column('s3_key', sa.String(512), nullable = False, unique = True),
+            sa.Column('etag', sa.String(128), nullable = True),
+            sa.Column('size_bytes', sa.BigInteger, nullable = False),
+            sa.Column('content_sha256', sa.String(64), nullable = True),
+            sa.Column('row_count', sa.Integer, nullable = True),
+            sa.Column('first_date', sa.Date, nullable = True),
+            sa.Column('last_date', sa.Date, nullable = True),
+            sa.Column('is_current', sa.Boolean, nullable = False, server_default = sa.text('false')),
+            sa.Column('uploaded_at', sa.DateTime(timezone = True), server_default = sa.func.now()),
+            sa.Column('superseded_at', sa.DateTime(timezone = True), nullable = True),
+        )
+        op.create_index('ix_user_health_data_files_user_id', 'user_health_data_files', ['user_id'])
+        op.create_index('ix_user_health_data_files_superseded_at', 'user_health_data_files', ['superseded_at'])
+        op.create_index('ix_user_health_data_files_current', 'user_health_data_files', ['user_id'],
+                        unique = True, postgresql_where = sa.text('is_current'))
+
+    if not _has_table('user_conversations'):
+        op.create_table(
+            'user_conversations',
+            sa.Column('id', sa.Integer, primary_key = True, autoincrement = True),
+            sa.Column('conversation_id', sa.String(64), nullable = False),
+            sa.Column('user_id', sa.String(64), nullable = False),
+            sa.Column('summary', sa.Text, nullable = True),
+            sa.Column('summarized_through_id', sa.Integer, nullable = False, server_default = '0'),
+            sa.Column('summary_updated_at', sa.DateTime(timezone = True), nullable = True),
+            sa.UniqueConstraint('user_id', 'conversation_id', name = 'uq_user_conversations_user_conversation'),
+        )
+
+    # Columns that init_db used to add to user_conversations tables created before them
+    op.execute("ALTER TABLE user_conversations ADD COLUMN IF NOT EXISTS last_response_id VARCHAR(128)")
+    op.execute("ALTER TABLE user_conversations ADD COLUMN IF NOT EXISTS last_response_at TIMESTAMP WITH TIME ZONE")
+    op.execute("ALTER TABLE user_conversations ADD COLUMN IF NOT EXISTS last_active TIMESTAMP WITH TIME ZONE")
+    op.execute("ALTER TABLE user_conversations ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0")
+    op.execute("ALTER TABLE user_conversations ADD COLUMN IF NOT EXISTS title_snippet VARCHAR(80)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_user_conversations_user_last_active ON user_conversations (user_id, last_active, id)")
+
+    # Session-list entries for conversations whose messages predate the conversation index
+    op.execute("""
+        INSERT INTO user_conversations (conversation_id, user_id, summarized_through_id, last_active, message_count, title_snippet)
+        SELECT m.conversation_id, m.user_id, 0, max(m.timestamp), count(*),
+               left((array_agg(m.content ORDER BY m.id) FILTER (WHERE m.role = 'user'))[1], 80)
+        FROM user_chats_data m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_conversations c
+            WHERE c.user_id = m.user_id AND c.conversation_id = m.conversation_id AND c.message_count > 0
+        )
+        GROUP BY m.conversation_id, m.user_id
+        ON CONFLICT ON CONSTRAINT uq_user_conversations_user_conversation DO UPDATE SET
+            last_active = EXCLUDED.last_active,
+            message_count = EXCLUDED.message_count,
+            title_snippet = COALESCE(user_conversations.title_snippet, EXCLUDED.title_snippet)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_conversations')
+    op.drop_table('user_health_data_files')
+    op.drop_table('user_studies_data')
+    op.drop_table('user_chats_data')
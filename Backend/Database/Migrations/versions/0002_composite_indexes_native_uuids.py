@@ -0,0 +1,124 @@
+"""Composite indexes for the hot chat and study queries, unique studies, native UUID ids
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+- user_chats_data: (user_id, conversation_id, timestamp) replaces the single-column indexes, so
+  history reads are one index range scan already in timestamp order.
+- user_studies_data: unique (user_id, study_id) replaces the single-column indexes. Duplicate rows
+  left by re-posting an existing study_id are merged into the oldest row first.
+- conversation_id and study_id become native uuid columns (16 bytes instead of a 36-char string).
+  Legacy values that are not UUIDs are remapped to uuid5(LEGACY_ID_NAMESPACE, old value), which keeps
+  a conversation's chats and index row together; every remap is recorded in legacy_id_remaps. The
+  API maps the old ids clients still send the same way (Backend/Utils/id_utils.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from Backend.Utils.id_utils import UUID_PATTERN, legacy_uuid
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+UUID_COLUMNS = [
+    ('user_chats_data', 'conversation_id'),
+    ('user_conversations', 'conversation_id'),
+    ('user_studies_data', 'study_id'),
+]
+
+
+def _remap_invalid_ids() -> None:
+    bind = op.get_bind()
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS legacy_id_remaps (
+            table_name varchar(64) NOT NULL,
+            column_name varchar(64) NOT NULL,
+            old_value varchar(64) NOT NULL,
+            new_value uuid NOT NULL,
+            PRIMARY KEY (table_name, column_name, old_value)
+        )
+    """)
+    for table, column in UUID_COLUMNS:
+        invalid = bind.execute(
+            sa.text(f"SELECT DISTINCT {column} FROM {table} WHERE {column} !~ :pattern"), {"pattern": UUID_PATTERN}
+        ).scalars().all()
+        if not invalid:
+            continue
+        remaps = [{"old": old, "new": legacy_uuid(old)} for old in invalid]
+        bind.execute(sa.text(f"UPDATE {table} SET {column} = :new WHERE {column} = :old"), remaps)
+        bind.execute(
+            sa.text("INSERT INTO legacy_id_remaps (table_name, column_name, old_value, new_value) "
+                    "VALUES (:table, :column, :old, CAST(:new AS uuid)) ON CONFLICT DO NOTHING"),
+            [{"table": table, "column": column, **remap} for remap in remaps]
+        )
+        print(f"Remapped {len(remaps)} non-UUID values of {table}.{column}; see legacy_id_remaps")
+
+
+def _merge_duplicate_studies() -> None:
+    # Keep the oldest row per (user_id, study_id), taking the newest non-empty summary/outcome from its duplicates
+    op.execute("""
+        UPDATE user_studies_data k SET
+            summary = COALESCE(NULLIF(k.summary, ''), d.summary),
+            outcome = COALESCE(NULLIF(k.outcome, ''), d.outcome)
+        FROM (
+            SELECT min(id) AS keep_id,
+                   (array_agg(summary ORDER BY id DESC) FILTER (WHERE summary <> ''))[1] AS summary,
+                   (array_agg(outcome ORDER BY id DESC) FILTER (WHERE outcome <> ''))[1] AS outcome
+            FROM user_studies_data
+            GROUP BY user_id, study_id
+            HAVING count(*) > 1
+        ) d
+        WHERE k.id = d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM user_studies_data s
+        USING user_studies_data k
+        WHERE s.user_id = k.user_id AND s.study_id = k.study_id AND s.id > k.id
+    """)
+
+
+def upgrade() -> None:
+    _remap_invalid_ids()  # One bad legacy row must not keep the service from starting
+
+    op.execute("DROP INDEX IF EXISTS ix_user_chats_data_conversation_id")
+    op.execute("DROP INDEX IF EXISTS ix_user_chats_data_user_id")
+    op.execute("DROP INDEX IF EXISTS ix_user_studies_data_study_id")
+    op.execute("DROP INDEX IF EXISTS ix_user_studies_data_user_id")
+
+    for table, column in UUID_COLUMNS:
+        op.alter_column(
+            table, column,
+            existing_type = sa.String(64),
+            type_ = postgresql.UUID(as_uuid = False),
+            existing_nullable = False,
+            postgresql_using = f"{column}::uuid"
+        )
+
+    op.create_index('ix_user_chats_data_user_conversation_timestamp', 'user_chats_data', ['user_id', 'conversation_id', 'timestamp'])
+    _merge_duplicate_studies()
+    op.create_unique_constraint('uq_user_studies_data_user_study', 'user_studies_data', ['user_id', 'study_id'])
+
+
+# legacy_id_remaps is kept: remapped ids cannot be restored to their old strings automatically
+def downgrade() -> None:
+    op.drop_constraint('uq_user_studies_data_user_study', 'user_studies_data', type_ = 'unique')
+    op.drop_index('ix_user_chats_data_user_conversation_timestamp', table_name = 'user_chats_data')
+
+    for table, column in UUID_COLUMNS:
+        op.alter_column(
+            table, column,
+            existing_type = postgresql.UUID(as_uuid = False),
+            type_ = sa.String(64),
+            existing_nullable = False,
+            postgresql_using = f"{column}::text"
+        )
+
+    op.create_index('ix_user_studies_data_user_id', 'user_studies_data', ['user_id'])
+    op.create_index('ix_user_studies_data_study_id', 'user_studies_data', ['study_id'])
+    op.create_index('ix_user_chats_data_user_id', 'user_chats_data', ['user_id'])
+    op.create_index('ix_user_chats_data_conversation_id', 'user_chats_data', ['conversation_id'])
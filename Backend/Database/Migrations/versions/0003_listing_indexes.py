@@ -0,0 +1,27 @@
+"""Indexes for the paginated study and message listings
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+- user_studies_data (user_id, import_date, id): keyset pages of a user's studies, newest first.
+- user_chats_data (user_id, conversation_id, id): keyset pages of a conversation and the
+  after-id reads of the conversation context builder, without sorting the conversation.
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_studies_data_user_import_date', 'user_studies_data', ['user_id', 'import_date', 'id'])
+    op.create_index('ix_user_chats_data_user_conversation_id', 'user_chats_data', ['user_id', 'conversation_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_chats_data_user_conversation_id', table_name = 'user_chats_data')
+    op.drop_index('ix_user_studies_data_user_import_date', table_name = 'user_studies_data')
@@ -0,0 +1,23 @@
+"""Track when a study last changed, as the version stamp for conditional GETs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_studies_data', sa.Column('updated_at', sa.DateTime(timezone = True), server_default = sa.func.now(), nullable = True))
+    op.execute("UPDATE user_studies_data SET updated_at = COALESCE(import_date, now())")
+
+
+def downgrade() -> None:
+    op.drop_column('user_studies_data', 'updated_at')
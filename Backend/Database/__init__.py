@@ -1,9 +1,8 @@
 from .chat_models import ChatsDB
 from .study_models import StudiesDB
+from .health_data_models import HealthDataDB
+from .conversation_models import ConversationsDB
 
-from .db import Base, engine
+from .db import Base
 
-Base.metadata.create_all(
-    bind = engine,
-    tables = [ChatsDB.__table__, StudiesDB.__table__]
-)
\ No newline at end of file
+# The schema is managed by Alembic (Backend/Database/Migrations); run `alembic -c Backend/alembic.ini upgrade head`
@@ -1,12 +1,20 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import UUID
 
 from .db import Base
 
 class ChatsDB(Base):
     __tablename__ = 'user_chats_data'  # Name of the table
     id = Column(Integer, primary_key = True, autoincrement = True)
-    conversation_id = Column(String(64), index = True, nullable = False)
-    user_id = Column(String(64), index = True, nullable = False)
+    conversation_id = Column(UUID(as_uuid = False), nullable = False)
+    user_id = Column(String(64), nullable = False)
     role = Column(String(16), nullable = False)
     content = Column(Text, nullable = False)
     timestamp = Column(DateTime(timezone = True), server_default = func.now())
+
+    __table_args__ = (
+        # History reads filter on (user_id, conversation_id) and order by timestamp
+        Index('ix_user_chats_data_user_conversation_timestamp', 'user_id', 'conversation_id', 'timestamp'),
+        # Keyset pages and after-id reads walk a conversation in id order
+        Index('ix_user_chats_data_user_conversation_id', 'user_id', 'conversation_id', 'id'),
+    )
@@ -1,18 +1,88 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
 from .chat_models import ChatsDB
+from .conversation_models import ConversationsDB, TITLE_SNIPPET_LENGTH
+
+# Bump the session-list entries of every conversation touched by a batch of new messages.
+# Rows are aggregated per conversation (ON CONFLICT cannot update a row twice in one statement)
+# and sorted by key so concurrent batches lock conversations in the same order.
+async def _upsert_conversation_index(session, messages):
+    entries = {}
+    for msg in messages:
+        key = (msg.user_id, msg.conversation_id)
+        entry = entries.setdefault(key, {
+            "conversation_id": msg.conversation_id,
+            "user_id": msg.user_id,
+            "last_active": msg.timestamp,
+            "message_count": 0,
+            "title_snippet": None
+        })
+        entry["last_active"] = max(entry["last_active"], msg.timestamp)
+        entry["message_count"] += 1
+        if entry["title_snippet"] is None and msg.role == "user":
+            entry["title_snippet"] = msg.content.strip()[:TITLE_SNIPPET_LENGTH]
 
-# Adds a new message to a user's conversation
-def create_chat_message(session, conversation_id, user_id, role, content):
-    msg = ChatsDB(
-        conversation_id = conversation_id,
-        user_id = user_id,
-        role = role,
-        content = content
+    statement = insert(ConversationsDB).values([entries[key] for key in sorted(entries)])
+    statement = statement.on_conflict_do_update(
+        constraint = 'uq_user_conversations_user_conversation',
+        set_ = {
+            "last_active": func.greatest(ConversationsDB.last_active, statement.excluded.last_active),
+            "message_count": ConversationsDB.message_count + statement.excluded.message_count,
+            "title_snippet": func.coalesce(ConversationsDB.title_snippet, statement.excluded.title_snippet)
+        }
     )
-    session.add(msg)
-    session.commit()
-    session.refresh(msg)
-    return msg
+    await session.execute(statement)
+
+# Adds messages in one transaction: a multi-row INSERT ... RETURNING id plus one conversation-index upsert.
+# Timestamps are assigned here rather than by the server default, so no refresh round-trip is needed.
+# `messages` are (conversation_id, user_id, role, content) tuples; returns the ChatsDB rows in the same order.
+async def create_chat_messages(session, messages):
+    now = datetime.now(timezone.utc)
+    rows = [
+        # Microsecond steps keep timestamp order equal to submission order within a batch
+        ChatsDB(conversation_id = conversation_id, user_id = user_id, role = role, content = content,
+                timestamp = now + timedelta(microseconds = i))
+        for i, (conversation_id, user_id, role, content) in enumerate(messages)
+    ]
+    session.add_all(rows)
+    await session.flush()  # Batched into multi-row INSERTs; ids come back through RETURNING
+    await _upsert_conversation_index(session, rows)
+    await session.commit()
+    return rows
+
+# Adds a new message to a user's conversation and bumps the conversation's session-list entry
+async def create_chat_message(session, conversation_id, user_id, role, content):
+    rows = await create_chat_messages(session, [(conversation_id, user_id, role, content)])
+    return rows[0]
 
 # Retrieves all messages for a user's conversation
-def get_chat_history(session, conversation_id, user_id):
-    return session.query(ChatsDB).filter_by(conversation_id = conversation_id, user_id = user_id).order_by(ChatsDB.timestamp).all()
\ No newline at end of file
+async def get_chat_history(session, conversation_id, user_id):
+    result = await session.execute(
+        select(ChatsDB).filter_by(conversation_id = conversation_id, user_id = user_id).order_by(ChatsDB.timestamp)
+    )
+    return result.scalars().all()
+
+# Retrieves messages newer than after_id in chronological order, optionally only the latest `limit` of them
+async def get_chat_messages_after(session, conversation_id, user_id, after_id = 0, limit = None):
+    query = select(ChatsDB).filter_by(conversation_id = conversation_id, user_id = user_id).filter(ChatsDB.id > after_id)
+    if limit is None:
+        result = await session.execute(query.order_by(ChatsDB.id))
+        return result.scalars().all()
+    result = await session.execute(query.order_by(ChatsDB.id.desc()).limit(limit))
+    return list(reversed(result.scalars().all()))
+
+# One page of a conversation, newest message first; `before_id` is the id of the previous page's last message
+async def list_chat_messages(session, conversation_id, user_id, limit, before_id = None):
+    query = select(ChatsDB.id, ChatsDB.role, ChatsDB.content, ChatsDB.timestamp).filter_by(conversation_id = conversation_id, user_id = user_id)
+    if before_id is not None:
+        query = query.filter(ChatsDB.id < before_id)
+    result = await session.execute(query.order_by(ChatsDB.id.desc()).limit(limit))
+    return result.all()
+
+# Whole conversation in chronological order, for streaming through a server-side cursor
+def chat_messages_query(conversation_id, user_id):
+    return select(ChatsDB.id, ChatsDB.role, ChatsDB.content, ChatsDB.timestamp).filter_by(
+        conversation_id = conversation_id, user_id = user_id
+    ).order_by(ChatsDB.id)
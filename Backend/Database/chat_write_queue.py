@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from Backend.Database.db import short_session
+from Backend.Database.chat_repository import create_chat_messages
+from Backend.Utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+CHAT_WRITE_FLUSH_INTERVAL_MS = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL_MS", "10"))
+CHAT_WRITE_MAX_BATCH = int(os.getenv("CHAT_WRITE_MAX_BATCH", "200"))
+
+@dataclass
+class _PendingMessage:
+    conversation_id: str
+    user_id: str
+    role: str
+    content: str
+    future: asyncio.Future = field(repr = False)
+
+# Write-behind queue for chat messages: submissions within one flush interval are written together
+# as multi-row INSERTs and a single commit (group commit), so a burst of turns costs one WAL flush
+# instead of one per message. Each submission resolves only after its batch has committed.
+class ChatMessageWriteQueue:
+    def __init__(self, flush_interval_ms: float = CHAT_WRITE_FLUSH_INTERVAL_MS, max_batch: int = CHAT_WRITE_MAX_BATCH) -> None:
+        self.flush_interval = max(flush_interval_ms, 0) / 1000
+        self.max_batch = max(max_batch, 1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    # Flush everything still queued, then stop the writer
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    # Queue a message; the returned future resolves to its ChatsDB row once the batch is durable
+    def submit(self, conversation_id: str, user_id: str, role: str, content: str) -> asyncio.Future:
+        if self._task is None:
+            raise RuntimeError("ChatMessageWriteQueue is not running")
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # Failures are logged in _flush even if nobody awaits
+        self._queue.put_nowait(_PendingMessage(conversation_id, user_id, role, content, future))
+        return future
+
+    async def _collect_batch(self, first: _PendingMessage) -> List[Optional[_PendingMessage]]:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            batch = [first] if first is None else await self._collect_batch(first)
+            stopping = batch[-1] is None
+            pending = [item for item in batch if item is not None]
+            while stopping and not self._queue.empty():  # Drain anything submitted during shutdown
+                item = self._queue.get_nowait()
+                if item is not None:
+                    pending.append(item)
+            if pending:
+                await self._flush(pending)
+
+    async def _flush(self, pending: List[_PendingMessage]) -> None:
+        started = time.perf_counter()
+        try:
+            async with short_session() as session:
+                rows = await create_chat_messages(
+                    session, [(item.conversation_id, item.user_id, item.role, item.content) for item in pending]
+                )
+        except Exception as e:
+            logger.error(f"[CHAT-WRITE] Failed to write a batch of {len(pending)} messages: {e}")
+            metrics.increment("chat_write_batch_failures")
+            for item in pending:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, row in zip(pending, rows):
+            if not item.future.done():
+                item.future.set_result(row)
+        metrics.increment("chat_write_batches")
+        metrics.increment("chat_write_messages", len(pending))
+        metrics.observe("chat_write_flush", time.perf_counter() - started)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID
+
+from .db import Base
+
+TITLE_SNIPPET_LENGTH = 80
+
+class ConversationsDB(Base):
+    __tablename__ = 'user_conversations'  # One row per conversation, alongside its messages in user_chats_data
+    id = Column(Integer, primary_key = True, autoincrement = True)
+    conversation_id = Column(UUID(as_uuid = False), nullable = False)
+    user_id = Column(String(64), nullable = False)
+    summary = Column(Text, nullable = True)  # Rolling summary of messages up to summarized_through_id
+    summarized_through_id = Column(Integer, nullable = False, default = 0, server_default = '0')
+    summary_updated_at = Column(DateTime(timezone = True), nullable = True)
+    last_response_id = Column(String(128), nullable = True)  # Latest stored upstream response; new turns chain to it
+    last_response_at = Column(DateTime(timezone = True), nullable = True)
+    # Session-list index, maintained by create_chat_message in the same transaction as the message
+    last_active = Column(DateTime(timezone = True), nullable = True)
+    message_count = Column(Integer, nullable = False, default = 0, server_default = '0')
+    title_snippet = Column(String(TITLE_SNIPPET_LENGTH), nullable = True)  # Start of the first user message
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'conversation_id', name = 'uq_user_conversations_user_conversation'),
+        Index('ix_user_conversations_user_last_active', 'user_id', 'last_active', 'id'),  # Keyset pagination of the session list
+    )
@@ -0,0 +1,78 @@
+from sqlalchemy import select, update, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from .conversation_models import ConversationsDB
+
+# Retrieves the conversation row (rolling summary state) for a user's conversation
+async def get_conversation(session, conversation_id, user_id):
+    result = await session.execute(
+        select(ConversationsDB).filter_by(conversation_id = conversation_id, user_id = user_id).limit(1)
+    )
+    return result.scalars().first()
+
+# Store a newer rolling summary; never moves summarized_through_id backwards
+async def upsert_conversation_summary(session, conversation_id, user_id, summary, summarized_through_id):
+    statement = insert(ConversationsDB).values(
+        conversation_id = conversation_id,
+        user_id = user_id,
+        summary = summary,
+        summarized_through_id = summarized_through_id,
+        summary_updated_at = func.now()
+    )
+    statement = statement.on_conflict_do_update(
+        constraint = 'uq_user_conversations_user_conversation',
+        set_ = {
+            "summary": statement.excluded.summary,
+            "summarized_through_id": statement.excluded.summarized_through_id,
+            "summary_updated_at": statement.excluded.summary_updated_at
+        },
+        where = ConversationsDB.summarized_through_id < statement.excluded.summarized_through_id
+    )
+    await session.execute(statement)
+    await session.commit()
+
+# Record the latest upstream response id so the next turn can chain to it instead of resending history
+async def set_last_response_id(session, conversation_id, user_id, response_id):
+    statement = insert(ConversationsDB).values(
+        conversation_id = conversation_id,
+        user_id = user_id,
+        last_response_id = response_id,
+        last_response_at = func.now()
+    )
+    statement = statement.on_conflict_do_update(
+        constraint = 'uq_user_conversations_user_conversation',
+        set_ = {
+            "last_response_id": statement.excluded.last_response_id,
+            "last_response_at": statement.excluded.last_response_at
+        }
+    )
+    await session.execute(statement)
+    await session.commit()
+
+# Forget a chain the upstream no longer has, so later turns rebuild context from the database
+async def clear_last_response_id(session, conversation_id, user_id, response_id):
+    await session.execute(
+        update(ConversationsDB)
+        .filter_by(conversation_id = conversation_id, user_id = user_id, last_response_id = response_id)
+        .values(last_response_id = None)
+    )
+    await session.commit()
+
+# A user's conversations, most recently active first; all of them when `limit` is None. `before` is the
+# (last_active, id) of the last row of the previous page (keyset pagination).
+async def list_conversations(session, user_id, limit = None, before = None):
+    query = select(ConversationsDB).filter(ConversationsDB.user_id == user_id, ConversationsDB.message_count > 0)
+    if before is not None:
+        query = query.filter(tuple_(ConversationsDB.last_active, ConversationsDB.id) < tuple_(*before))
+    result = await session.execute(
+        query.order_by(ConversationsDB.last_active.desc(), ConversationsDB.id.desc()).limit(limit)
+    )
+    return result.scalars().all()
+
+# Cheap version stamp of a user's session list: every new message moves last_active or the count
+async def get_conversations_version(session, user_id):
+    result = await session.execute(
+        select(func.count(ConversationsDB.id), func.max(ConversationsDB.last_active))
+        .filter(ConversationsDB.user_id == user_id, ConversationsDB.message_count > 0)
+    )
+    return tuple(result.one())
@@ -1,8 +1,13 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Any
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 
+from Backend.Utils.metrics import metrics
+
 DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
     POSTGRES_USER = os.getenv('POSTGRES_USER', 'postgres')
@@ -12,6 +17,69 @@ if not DATABASE_URL:
     POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
     DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(DATABASE_URL, pool_pre_ping = True)
-SessionLocal = sessionmaker(autocommit = False, autoflush = False, bind = engine)
-Base = declarative_base()
\ No newline at end of file
+# Pool limits apply per gunicorn worker, so the total is workers * (pool size + overflow)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+# Point a postgres:// or postgresql:// URL at the asyncpg driver
+def to_async_database_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url.replace("sslmode=", "ssl=")  # asyncpg names the libpq sslmode option "ssl"
+
+ASYNC_DATABASE_URL = to_async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping = True,
+    pool_size = DB_POOL_SIZE,
+    max_overflow = DB_MAX_OVERFLOW,
+    pool_timeout = DB_POOL_TIMEOUT,
+    pool_recycle = DB_POOL_RECYCLE
+)
+AsyncSessionLocal = async_sessionmaker(bind = async_engine, autoflush = False, expire_on_commit = False)
+Base = declarative_base()
+
+# Track how long pooled connections stay checked out, so long-held connections are visible
+@event.listens_for(async_engine.sync_engine, "checkout")
+def _on_pool_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    connection_record.info["checked_out_at"] = time.perf_counter()
+    metrics.increment("db_pool_checkouts")
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+def _on_pool_checkin(dbapi_connection, connection_record) -> None:
+    checked_out_at = connection_record.info.pop("checked_out_at", None)
+    if checked_out_at is not None:
+        metrics.observe("db_pool_connection_hold", time.perf_counter() - checked_out_at)
+
+# Current pool occupancy for this worker
+def get_pool_status() -> Dict[str, Any]:
+    pool = async_engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW
+    }
+
+# Short-lived session that checks out a connection eagerly so the pool wait is measured
+@asynccontextmanager
+async def short_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as session:
+        started = time.perf_counter()
+        try:
+            await session.connection()
+        except Exception:
+            metrics.increment("db_pool_checkout_errors")
+            raise
+        metrics.observe("db_pool_checkout_wait", time.perf_counter() - started)
+        yield session
+
+# FastAPI dependency that scopes a session to a single request
+async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as session:
+        yield session
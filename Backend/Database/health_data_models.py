@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, Index, func, text
+
+from .db import Base
+
+class HealthDataDB(Base):
+    __tablename__ = 'user_health_data_files'  # Manifest of each user's uploaded health data objects
+    id = Column(Integer, primary_key = True, autoincrement = True)
+    user_id = Column(String(64), index = True, nullable = False)
+    s3_key = Column(String(512), unique = True, nullable = False)
+    etag = Column(String(128), nullable = True)
+    size_bytes = Column(BigInteger, nullable = False)
+    content_sha256 = Column(String(64), nullable = True)
+    row_count = Column(Integer, nullable = True)
+    first_date = Column(Date, nullable = True)
+    last_date = Column(Date, nullable = True)
+    is_current = Column(Boolean, nullable = False, server_default = text('false'))
+    uploaded_at = Column(DateTime(timezone = True), server_default = func.now())
+    superseded_at = Column(DateTime(timezone = True), nullable = True, index = True)
+
+    __table_args__ = (
+        # At most one current file per user
+        Index('ix_user_health_data_files_current', 'user_id', unique = True, postgresql_where = text('is_current')),
+    )
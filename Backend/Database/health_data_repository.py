@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, delete, func
+
+from .health_data_models import HealthDataDB
+
+# Register a new upload as the user's current health data and supersede the previous one atomically
+async def register_health_data_file(session, user_id, s3_key, etag, size_bytes, content_sha256 = None,
+                                    row_count = None, first_date = None, last_date = None):
+    await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"health_data:{user_id}"))))  # Serialize concurrent uploads per user
+    await session.execute(
+        update(HealthDataDB)
+        .where(HealthDataDB.user_id == user_id, HealthDataDB.is_current.is_(True))
+        .values(is_current = False, superseded_at = func.now())
+    )
+    record = HealthDataDB(
+        user_id = user_id,
+        s3_key = s3_key,
+        etag = etag,
+        size_bytes = size_bytes,
+        content_sha256 = content_sha256,
+        row_count = row_count,
+        first_date = first_date,
+        last_date = last_date,
+        is_current = True
+    )
+    session.add(record)
+    await session.commit()
+    return record
+
+# The manifest row of an already registered object, so a retried completion can return it
+async def get_health_data_by_key(session, user_id, s3_key):
+    result = await session.execute(
+        select(HealthDataDB).where(HealthDataDB.user_id == user_id, HealthDataDB.s3_key == s3_key).limit(1)
+    )
+    return result.scalars().first()
+
+# Retrieves the user's current health data file, if any
+async def get_current_health_data(session, user_id):
+    result = await session.execute(
+        select(HealthDataDB).where(HealthDataDB.user_id == user_id, HealthDataDB.is_current.is_(True)).limit(1)
+    )
+    return result.scalars().first()
+
+# Claim superseded files old enough that no in-flight request should still be reading them, and commit.
+# Claiming restarts their superseded_at, so other workers skip them for another grace period while this
+# one deletes the objects; SKIP LOCKED keeps two concurrent claims from taking the same rows. A claim
+# that is never finished is picked up again after the grace period.
+async def claim_reclaimable_health_data(session, grace_seconds, limit = 1000):
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds = grace_seconds)
+    reclaimable = (
+        select(HealthDataDB.id)
+        .where(HealthDataDB.is_current.is_(False), HealthDataDB.superseded_at < cutoff)
+        .order_by(HealthDataDB.superseded_at)
+        .limit(limit)
+        .with_for_update(skip_locked = True)
+    )
+    result = await session.execute(
+        update(HealthDataDB)
+        .where(HealthDataDB.id.in_(reclaimable))
+        .values(superseded_at = func.now())
+        .returning(HealthDataDB.id, HealthDataDB.s3_key)
+        .execution_options(synchronize_session = False)
+    )
+    rows = result.all()
+    await session.commit()
+    return rows
+
+# Drop manifest rows whose objects have been deleted from storage
+async def delete_health_data_records(session, record_ids):
+    if not record_ids:
+        return
+    await session.execute(delete(HealthDataDB).where(HealthDataDB.id.in_(record_ids)))
+    await session.commit()
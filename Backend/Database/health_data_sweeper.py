@@ -0,0 +1,41 @@
+import os
+import asyncio
+import logging
+
+from Backend.Database.db import short_session
+from Backend.Database.health_data_repository import claim_reclaimable_health_data, delete_health_data_records
+
+logger = logging.getLogger(__name__)
+
+HEALTH_DATA_SWEEP_INTERVAL_SECONDS = int(os.getenv("HEALTH_DATA_SWEEP_INTERVAL_SECONDS", "300"))
+HEALTH_DATA_RECLAIM_GRACE_SECONDS = int(os.getenv("HEALTH_DATA_RECLAIM_GRACE_SECONDS", "900"))
+
+# Delete superseded health data objects with batched delete_objects calls; returns how many were reclaimed.
+# No connection is held during the storage calls: the rows are claimed and committed first, and the
+# deleted ones are dropped in a second short session.
+async def sweep_superseded_health_data(s3_storage) -> int:
+    async with short_session() as session:
+        rows = await claim_reclaimable_health_data(session, HEALTH_DATA_RECLAIM_GRACE_SECONDS)
+    if not rows:
+        return 0
+
+    ids_by_key = {row.s3_key: row.id for row in rows}
+    deleted_keys = await asyncio.to_thread(s3_storage.delete_objects, list(ids_by_key))
+    async with short_session() as session:
+        await delete_health_data_records(session, [ids_by_key[key] for key in deleted_keys if key in ids_by_key])
+    logger.info(f"[HEALTH-DATA] Reclaimed {len(deleted_keys)} superseded health data objects")
+    return len(deleted_keys)
+
+async def run_health_data_sweeper(s3_storage) -> None:
+    try:
+        await asyncio.to_thread(s3_storage.ensure_upload_lifecycle_rules)
+    except Exception as e:
+        logger.warning(f"[HEALTH-DATA] Could not install lifecycle rules for abandoned uploads: {e}")
+    while True:
+        try:
+            await sweep_superseded_health_data(s3_storage)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[HEALTH-DATA] Sweep failed: {e}")
+        await asyncio.sleep(HEALTH_DATA_SWEEP_INTERVAL_SECONDS)
@@ -0,0 +1,96 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # S3 rejects non-final parts smaller than 5 MiB
+S3_UPLOAD_PART_SIZE = max(int(os.getenv("S3_UPLOAD_PART_SIZE_MB", "8")) * 1024 * 1024, S3_MIN_PART_SIZE)
+S3_UPLOAD_CONCURRENCY = max(int(os.getenv("S3_UPLOAD_CONCURRENCY", "4")), 1)
+
+# Incremental multipart upload: write() buffers at most one part and uploads full parts in the
+# background, so memory per upload stays at roughly part_size * (concurrency + 1) and the blocking
+# boto3 calls run in worker threads instead of on the event loop.
+class S3MultipartUploader:
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = S3_UPLOAD_PART_SIZE,
+                 concurrency: int = S3_UPLOAD_CONCURRENCY, content_type: Optional[str] = None) -> None:
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.content_type = content_type
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._next_part_number = 1
+        self._parts: List[Dict[str, Any]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+
+    async def _start(self) -> None:
+        extra = {"ContentType": self.content_type} if self.content_type else {}
+        response = await asyncio.to_thread(self.s3_client.create_multipart_upload, Bucket = self.bucket, Key = self.key, **extra)
+        self._upload_id = response["UploadId"]
+
+    async def _upload_part(self, part_number: int, body: bytes) -> None:
+        try:
+            response = await asyncio.to_thread(
+                self.s3_client.upload_part,
+                Bucket = self.bucket, Key = self.key, UploadId = self._upload_id,
+                PartNumber = part_number, Body = body
+            )
+            self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        finally:
+            self._slots.release()
+
+    async def _flush_part(self) -> None:
+        if self._upload_id is None:
+            await self._start()
+        body = bytes(self._buffer[:self.part_size])
+        del self._buffer[:self.part_size]
+        await self._slots.acquire()  # Backpressure: wait for a free slot before reading more of the request
+        for task in self._tasks:
+            if task.done() and task.exception() is not None:
+                self._slots.release()
+                raise task.exception()
+        self._tasks.append(asyncio.create_task(self._upload_part(self._next_part_number, body)))
+        self._next_part_number += 1
+
+    async def write(self, data: bytes) -> None:
+        self._buffer.extend(data)
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            await self._flush_part()
+
+    async def complete(self) -> Dict[str, Any]:
+        if self._upload_id is None:
+            # Small upload: a single PUT is cheaper than a one-part multipart upload
+            extra = {"ContentType": self.content_type} if self.content_type else {}
+            response = await asyncio.to_thread(self.s3_client.put_object, Bucket = self.bucket, Key = self.key, Body = bytes(self._buffer), **extra)
+            self._buffer.clear()
+            return {"etag": response.get("ETag"), "size": self.size}
+
+        if self._buffer:
+            await self._slots.acquire()
+            self._tasks.append(asyncio.create_task(self._upload_part(self._next_part_number, bytes(self._buffer))))
+            self._buffer.clear()
+        await asyncio.gather(*self._tasks)
+        response = await asyncio.to_thread(
+            self.s3_client.complete_multipart_upload,
+            Bucket = self.bucket, Key = self.key, UploadId = self._upload_id,
+            MultipartUpload = {"Parts": sorted(self._parts, key = lambda part: part["PartNumber"])}
+        )
+        logger.info(f"Completed multipart upload of {self.key}: {len(self._parts)} parts, {self.size} bytes")
+        return {"etag": response.get("ETag"), "size": self.size}
+
+    async def abort(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions = True)
+        self._buffer.clear()
+        if self._upload_id is not None:
+            try:
+                await asyncio.to_thread(self.s3_client.abort_multipart_upload, Bucket = self.bucket, Key = self.key, UploadId = self._upload_id)
+            except Exception as e:
+                logger.error(f"Failed to abort multipart upload of {self.key}: {e}")
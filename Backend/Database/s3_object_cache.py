@@ -0,0 +1,83 @@
+import os
+import io
+import threading
+import logging
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Iterable, Tuple
+
+from Backend.Utils.disk_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", "/tmp/healthpredictor-s3-cache")
+S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+S3_CACHE_MEMORY_MAX_BYTES = int(os.getenv("S3_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+S3_CACHE_MEMORY_MAX_OBJECT_BYTES = int(os.getenv("S3_CACHE_MEMORY_MAX_OBJECT_BYTES", str(4 * 1024 * 1024)))
+
+# Two-tier cache of downloaded S3 objects keyed by S3 key: a small per-worker memory tier for
+# small objects in front of a byte-bounded disk tier shared by all workers on the host.
+# Entries carry the object's ETag so callers can revalidate with a conditional GET.
+class S3ObjectCache:
+    def __init__(self, root: str = S3_CACHE_DIR, max_bytes: int = S3_CACHE_MAX_BYTES,
+                 memory_max_bytes: int = S3_CACHE_MEMORY_MAX_BYTES, memory_max_object_bytes: int = S3_CACHE_MEMORY_MAX_OBJECT_BYTES) -> None:
+        self.disk = DiskLRUCache(root, max_bytes)
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_max_object_bytes = memory_max_object_bytes
+        self._memory: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_etag(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return entry[0]
+        disk_entry = self.disk.get(key)
+        return disk_entry[1].get("etag") if disk_entry else None
+
+    # Open the cached object; BytesIO over the memory tier shares its buffer, so no extra copy is made.
+    # The caller closes the returned file.
+    def open(self, key: str) -> Optional[Tuple[BinaryIO, str]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return io.BytesIO(entry[1]), entry[0]
+        disk_entry = self.disk.get(key)
+        if disk_entry is None:
+            return None
+        data_path, meta = disk_entry
+        try:
+            return open(data_path, "rb"), meta.get("etag", "")
+        except OSError:
+            return None  # Evicted by another worker between lookup and open
+
+    # Cache a downloaded object and return it opened for reading; the caller closes the returned file.
+    # The disk handle is the one the download was written through, so an eviction cannot pull it away.
+    def store(self, key: str, etag: str, chunks: Iterable[bytes]) -> BinaryIO:
+        file_obj, size = self.disk.put_stream_and_open(key, chunks, {"etag": etag})
+        logger.info(f"[S3-CACHE] Cached {key} ({size} bytes, etag {etag})")
+        if size > self.memory_max_object_bytes:
+            self._forget(key)
+            return file_obj
+        with file_obj:
+            data = file_obj.read()
+        self._remember(key, etag, data)
+        return io.BytesIO(data)
+
+    def _remember(self, key: str, etag: str, data: bytes) -> None:
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous[1])
+            self._memory[key] = (etag, data)
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, (_, evicted) = self._memory.popitem(last = False)
+                self._memory_bytes -= len(evicted)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous[1])
@@ -1,13 +1,47 @@
 import os
+import math
+import base64
+import uuid
 import logging
 import boto3
-import io
-from typing import BinaryIO
+from typing import BinaryIO, Optional, Tuple, List, Dict, Any, AsyncIterable
 from datetime import datetime
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from Backend.Database.s3_object_cache import S3ObjectCache
+from Backend.Database.s3_multipart_upload import S3MultipartUploader, S3_UPLOAD_PART_SIZE, S3_MIN_PART_SIZE
+from Backend.Utils.health_data_stats import HealthDataStats
+
 logger = logging.getLogger(__name__)
 
+S3_PRESIGN_EXPIRES_SECONDS = int(os.getenv("S3_PRESIGN_EXPIRES_SECONDS", "900"))
+S3_PRESIGN_MULTIPART_THRESHOLD = int(os.getenv("S3_PRESIGN_MULTIPART_THRESHOLD_MB", "64")) * 1024 * 1024
+S3_ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "auto")  # "path" for local S3 stand-ins such as MinIO
+S3_ABANDONED_UPLOAD_DAYS = int(os.getenv("S3_ABANDONED_UPLOAD_DAYS", "1"))
+
+# Presigned uploads carry this tag until they are completed, so the lifecycle rule below can expire
+# objects whose client never called complete (or abort)
+PENDING_UPLOAD_TAG = "upload=pending"
+
+UPLOAD_LIFECYCLE_RULES = [
+    {
+        "ID": "abort-incomplete-health-data-uploads",
+        "Filter": {"Prefix": "users/"},
+        "Status": "Enabled",
+        "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": S3_ABANDONED_UPLOAD_DAYS}
+    },
+    {
+        "ID": "expire-pending-health-data-uploads",
+        "Filter": {"And": {"Prefix": "users/", "Tags": [{"Key": "upload", "Value": "pending"}]}},
+        "Status": "Enabled",
+        "Expiration": {"Days": S3_ABANDONED_UPLOAD_DAYS}
+    }
+]
+
+def _sha256_header(hex_digest: str) -> str:
+    return base64.b64encode(bytes.fromhex(hex_digest)).decode("ascii")
+
 class S3Storage:
     def __init__(self):
         self.access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
@@ -24,37 +58,180 @@ class S3Storage:
             aws_access_key_id = self.access_key_id,
             aws_secret_access_key = self.secret_access_key,
             endpoint_url = self.endpoint_url,
-            region_name = self.region
+            region_name = self.region,
+            config = Config(signature_version = "s3v4", s3 = {"addressing_style": S3_ADDRESSING_STYLE})
         )
+        self.cache = S3ObjectCache()
+
+    # Generate a unique S3 key for this upload using a timestamp and a random suffix
+    def _health_data_key(self, user_id: str, filename: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"{self.health_data_prefix(user_id)}{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
+
+    def url_for_key(self, key: str) -> str:
+        return f"{self.endpoint_url}/{self.bucket_name}/{key}"
+
+    def health_data_prefix(self, user_id: str) -> str:
+        return f"users/{user_id}/health_data/"
+
+    # Part size used when the client does not pick one; S3 allows at most 10,000 parts
+    @staticmethod
+    def default_part_size(size_bytes: int) -> int:
+        return max(S3_UPLOAD_PART_SIZE, S3_MIN_PART_SIZE, math.ceil(size_bytes / 10000))
+
+    # Presign a direct-to-storage upload: a single PUT for small files, a set of part URLs for large ones.
+    # Every PUT is signed with its x-amz-checksum-sha256, so storage itself rejects a body that does not
+    # match the digest the client declared. Multipart uploads need the digest of each part up front.
+    def presign_health_data_upload(self, user_id: str, filename: str, size_bytes: int, content_type: str, sha256: str,
+                                   part_size: Optional[int] = None, part_sha256s: Optional[List[str]] = None) -> Dict[str, Any]:
+        key = self._health_data_key(user_id, filename)
+        try:
+            if size_bytes <= S3_PRESIGN_MULTIPART_THRESHOLD:
+                checksum = _sha256_header(sha256)
+                url = self.s3_client.generate_presigned_url(
+                    "put_object",
+                    Params = {"Bucket": self.bucket_name, "Key": key, "ContentType": content_type, "Tagging": PENDING_UPLOAD_TAG, "ChecksumSHA256": checksum},
+                    ExpiresIn = S3_PRESIGN_EXPIRES_SECONDS
+                )
+                headers = {"Content-Type": content_type, "x-amz-tagging": PENDING_UPLOAD_TAG, "x-amz-checksum-sha256": checksum}
+                return {"key": key, "method": "PUT", "url": url, "headers": headers, "expires_in": S3_PRESIGN_EXPIRES_SECONDS}
+
+            part_size = part_size or self.default_part_size(size_bytes)
+            part_count = math.ceil(size_bytes / part_size)
+            if part_size < S3_MIN_PART_SIZE or part_count > 10000 or not part_sha256s or len(part_sha256s) != part_count:
+                raise ValueError(f"Uploads over {S3_PRESIGN_MULTIPART_THRESHOLD} bytes need part_sha256s, one SHA-256 per part of "
+                                 f"part_size bytes (suggested part_size {self.default_part_size(size_bytes)}, at least {S3_MIN_PART_SIZE}).")
+            upload_id = self.s3_client.create_multipart_upload(
+                Bucket = self.bucket_name, Key = key, ContentType = content_type, Tagging = PENDING_UPLOAD_TAG, ChecksumAlgorithm = "SHA256"
+            )["UploadId"]
+            parts = []
+            for part_number, part_sha256 in enumerate(part_sha256s, start = 1):
+                checksum = _sha256_header(part_sha256)
+                url = self.s3_client.generate_presigned_url(
+                    "upload_part",
+                    Params = {"Bucket": self.bucket_name, "Key": key, "UploadId": upload_id, "PartNumber": part_number, "ChecksumSHA256": checksum},
+                    ExpiresIn = S3_PRESIGN_EXPIRES_SECONDS
+                )
+                parts.append({"part_number": part_number, "url": url, "headers": {"x-amz-checksum-sha256": checksum}})
+            return {"key": key, "method": "MULTIPART", "upload_id": upload_id, "part_size": part_size, "parts": parts, "expires_in": S3_PRESIGN_EXPIRES_SECONDS}
+        except ClientError as e:
+            logger.error(f"Error presigning upload to Tigris: {e}")
+            raise Exception(f"Failed to presign upload to Tigris: {str(e)}")
 
-    def upload_health_data_file(self, file_obj: BinaryIO, user_id: str, filename: str) -> str:
+    # Complete a presigned multipart upload from the parts storage holds, each of which it verified
+    # against its signed SHA-256. A retry after an earlier successful completion is a no-op.
+    def complete_presigned_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            key = f"users/{user_id}/health_data/{timestamp}_{filename}"  # Generate a unique S3 key for this upload using a timestamp
-
-            # Upload the file to S3
-            file_obj.seek(0)
-            self.s3_client.upload_fileobj(file_obj, self.bucket_name, key)
-            s3_url = f"{self.endpoint_url}/{self.bucket_name}/{key}"
-            logger.info(f"Successfully uploaded file to Tigris: {s3_url}")
-
-            # Keep only the latest file for this user
-            prefix = f"users/{user_id}/health_data/"
-            response = self.s3_client.list_objects_v2(Bucket = self.bucket_name, Prefix = prefix)
-            files = response.get('Contents', [])
-            files_sorted = sorted(files, key = lambda x: x['Key'], reverse = True)  # Sort files by key (the timestamp in key ensures correct order)
-            for file_info in files_sorted[1:]:  # Keep the first (latest), delete the rest
-                old_key = file_info['Key']
-                self.s3_client.delete_object(Bucket = self.bucket_name, Key = old_key)
-                logger.info(f"Deleted old health data file: {old_key}")
-
-            return s3_url
+            stored = {}
+            for page in self.s3_client.get_paginator("list_parts").paginate(Bucket = self.bucket_name, Key = key, UploadId = upload_id):
+                for part in page.get("Parts", []):
+                    stored[part["PartNumber"]] = part
+            completed = []
+            for part in sorted(parts, key = lambda part: part["part_number"]):
+                held = stored.get(part["part_number"])
+                if held is None or held["ETag"].strip('"') != part["etag"].strip('"'):
+                    raise ValueError(f"Part {part['part_number']} was not uploaded or does not match its ETag.")
+                if not held.get("ChecksumSHA256"):
+                    raise ValueError(f"Part {part['part_number']} was stored without a SHA-256 checksum.")
+                completed.append({"PartNumber": held["PartNumber"], "ETag": held["ETag"], "ChecksumSHA256": held["ChecksumSHA256"]})
+            self.s3_client.complete_multipart_upload(
+                Bucket = self.bucket_name, Key = key, UploadId = upload_id, MultipartUpload = {"Parts": completed}
+            )
         except ClientError as e:
-            logger.error(f"Error uploading file to Tigris: {e}")
-            raise Exception(f"Failed to upload file to Tigris: {str(e)}")
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+            logger.info(f"Multipart upload {upload_id} for {key} is already completed or aborted; verifying the object")
+
+    # Size, ETag and stored SHA-256 checksum of an uploaded object, without downloading it. A single PUT
+    # carries the digest of the whole file; a multipart upload a composite "<digest of part digests>-<parts>".
+    def head_health_data_object(self, key: str) -> Dict[str, Any]:
+        response = self.s3_client.head_object(Bucket = self.bucket_name, Key = key, ChecksumMode = "ENABLED")
+        checksum = response.get("ChecksumSHA256")
+        content_sha256 = base64.b64decode(checksum).hex() if checksum and "-" not in checksum else None
+        return {"key": key, "s3_url": self.url_for_key(key), "etag": response.get("ETag"), "size_bytes": response["ContentLength"],
+                "checksum_sha256": checksum, "content_sha256": content_sha256}
+
+    # Clear the pending tag once an upload is verified, so the lifecycle rule no longer expires it
+    def mark_upload_completed(self, key: str) -> None:
+        self.s3_client.delete_object_tagging(Bucket = self.bucket_name, Key = key)
+
+    # Drop a presigned upload the client gave up on: abort the multipart upload and delete any object
+    def abort_health_data_upload(self, key: str, upload_id: Optional[str] = None) -> None:
+        if upload_id:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket = self.bucket_name, Key = key, UploadId = upload_id)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                    raise
+        self.delete_object(key)
+
+    # Install the lifecycle rules that clean up abandoned uploads, keeping any other rules on the bucket
+    def ensure_upload_lifecycle_rules(self) -> None:
+        try:
+            rules = self.s3_client.get_bucket_lifecycle_configuration(Bucket = self.bucket_name).get("Rules", [])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchLifecycleConfiguration":
+                raise
+            rules = []
+        ours = {rule["ID"] for rule in UPLOAD_LIFECYCLE_RULES}
+        if [rule for rule in rules if rule.get("ID") in ours] == UPLOAD_LIFECYCLE_RULES:
+            return
+        merged = [rule for rule in rules if rule.get("ID") not in ours] + UPLOAD_LIFECYCLE_RULES
+        self.s3_client.put_bucket_lifecycle_configuration(Bucket = self.bucket_name, LifecycleConfiguration = {"Rules": merged})
+        logger.info(f"Installed lifecycle rules for abandoned uploads on {self.bucket_name}")
+
+    def delete_object(self, key: str) -> None:
+        self.s3_client.delete_object(Bucket = self.bucket_name, Key = key)
+
+    # Upload a health data file from an async stream of chunks using a bounded-memory multipart upload.
+    # Returns the object's location plus the manifest metadata computed while streaming.
+    async def upload_health_data_stream(self, chunks: AsyncIterable[bytes], user_id: str, filename: str,
+                                        max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        key = self._health_data_key(user_id, filename)
+        uploader = S3MultipartUploader(self.s3_client, self.bucket_name, key, content_type = "text/csv")
+        stats = HealthDataStats()
+        try:
+            async for chunk in chunks:
+                if max_bytes is not None and uploader.size + len(chunk) > max_bytes:
+                    raise ValueError(f"Upload exceeds the {max_bytes} byte limit")
+                stats.update(chunk)
+                await uploader.write(chunk)
+            result = await uploader.complete()
+        except BaseException as e:
+            await uploader.abort()
+            if isinstance(e, ClientError):
+                logger.error(f"Error uploading file to Tigris: {e}")
+                raise Exception(f"Failed to upload file to Tigris: {str(e)}")
+            raise
+
+        s3_url = self.url_for_key(key)
+        logger.info(f"Successfully uploaded file to Tigris: {s3_url} ({uploader.size} bytes)")
+        return {"s3_url": s3_url, "key": key, "etag": result.get("etag"), **stats.finish()}
+
+    # Delete objects in batches of up to 1000 keys; returns the keys that were deleted (or already gone)
+    def delete_objects(self, keys: List[str]) -> List[str]:
+        deleted: List[str] = []
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            response = self.s3_client.delete_objects(
+                Bucket = self.bucket_name,
+                Delete = {"Objects": [{"Key": key} for key in batch], "Quiet": False}
+            )
+            deleted.extend(item["Key"] for item in response.get("Deleted", []))
+            for error in response.get("Errors", []):
+                if error.get("Code") == "NoSuchKey":
+                    deleted.append(error["Key"])
+                else:
+                    logger.error(f"Failed to delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+        return deleted
 
     # Download a file from Tigris and return as a file object
     def download_file_from_url(self, s3_url: str) -> BinaryIO:
+        file_obj, _ = self.download_file_with_etag(s3_url)
+        return file_obj
+
+    # Serve the object from the local cache, revalidating it against Tigris with If-None-Match
+    def download_file_with_etag(self, s3_url: str) -> Tuple[BinaryIO, Optional[str]]:
         try:
             # Validate and extract the S3 object key from the URL
             expected_prefix = f"{self.endpoint_url}/{self.bucket_name}/"
@@ -62,13 +239,26 @@ class S3Storage:
                 raise Exception(f"Invalid S3 URL format: {s3_url}")
             key = s3_url[len(expected_prefix):]
 
-            # Download the file from S3
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
-            file_content = response['Body'].read()
+            cached_etag = self.cache.get_etag(key)
+            request_args = {"Bucket": self.bucket_name, "Key": key}
+            if cached_etag:
+                request_args["IfNoneMatch"] = cached_etag
+            try:
+                response = self.s3_client.get_object(**request_args)
+            except ClientError as e:
+                if cached_etag and e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304:
+                    cached = self.cache.open(key)
+                    if cached is not None:
+                        logger.info(f"Serving {key} from local cache (etag {cached_etag} not modified)")
+                        return cached
+                    response = self.s3_client.get_object(Bucket = self.bucket_name, Key = key)  # Evicted meanwhile
+                else:
+                    raise
 
-            file_obj = io.BytesIO(file_content)
-            file_obj.seek(0)
-            return file_obj
+            # Stream the body to the cache instead of buffering the whole object in memory
+            etag = response.get("ETag", "")
+            file_obj = self.cache.store(key, etag, response["Body"].iter_chunks(chunk_size = 1024 * 1024))
+            return file_obj, etag or None
         except ClientError as e:
             logger.error(f"Failed to download file from Tigris: {e}")
-            raise Exception(f"Failed to download file from Tigris: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to download file from Tigris: {str(e)}")
@@ -1,13 +1,20 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint, Index, func
+from sqlalchemy.dialects.postgresql import UUID
 
 from .db import Base
 
 class StudiesDB(Base):
     __tablename__ = 'user_studies_data'  # Name of the table
     id = Column(Integer, primary_key = True, autoincrement = True)
-    study_id = Column(String(64), index = True, nullable = False)
-    user_id = Column(String(64), index = True, nullable = False)
+    study_id = Column(UUID(as_uuid = False), nullable = False)
+    user_id = Column(String(64), nullable = False)
     title = Column(String(256), nullable = False)
     summary = Column(Text, nullable = True)
     outcome = Column(Text, nullable = True)
     import_date = Column(DateTime(timezone = True), server_default = func.now())
+    updated_at = Column(DateTime(timezone = True), server_default = func.now(), onupdate = func.now())  # Version stamp for ETags
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'study_id', name = 'uq_user_studies_data_user_study'),  # Also serves per-user listing
+        Index('ix_user_studies_data_user_import_date', 'user_id', 'import_date', 'id'),  # Keyset pages, newest first
+    )
@@ -1,44 +1,90 @@
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
 from .study_models import StudiesDB
 
-# Add a new study to a user's collection
-def create_study(session, study_id, user_id, title, summary, outcome):
-    study = StudiesDB(
+# Add a new study to a user's collection. Re-posting an existing study_id updates that study
+# instead of creating a duplicate; empty summary/outcome values keep what is already stored.
+async def create_study(session, study_id, user_id, title, summary, outcome):
+    statement = insert(StudiesDB).values(
         study_id = study_id,
         user_id = user_id,
         title = title,
         summary = summary,
         outcome = outcome
     )
-    session.add(study)
-    session.commit()
-    session.refresh(study)
+    statement = statement.on_conflict_do_update(
+        constraint = 'uq_user_studies_data_user_study',
+        set_ = {
+            "title": statement.excluded.title,
+            "summary": func.coalesce(func.nullif(statement.excluded.summary, ''), StudiesDB.summary),
+            "outcome": func.coalesce(func.nullif(statement.excluded.outcome, ''), StudiesDB.outcome),
+            "updated_at": func.now()
+        }
+    ).returning(StudiesDB)
+    study = (await session.execute(statement)).scalars().one()
+    await session.commit()
     return study
 
 # Retrieves all studies for a user
-def get_studies_for_user(session, user_id):
-    studies = session.query(StudiesDB).filter_by(user_id = user_id).all()
-    return studies
+async def get_studies_for_user(session, user_id):
+    result = await session.execute(select(StudiesDB).filter_by(user_id = user_id))
+    return result.scalars().all()
+
+# Lightweight study listing: no summary/outcome bodies, only whether they are present.
+# `summary <> ''` compares stored lengths first, so long TOASTed bodies are not read.
+def study_headers_query(user_id, before = None):
+    query = select(
+        StudiesDB.id,
+        StudiesDB.study_id,
+        StudiesDB.title,
+        StudiesDB.import_date,
+        func.coalesce(StudiesDB.summary != '', False).label("has_summary"),
+        func.coalesce(StudiesDB.outcome != '', False).label("has_outcome")
+    ).filter(StudiesDB.user_id == user_id)
+    if before is not None:
+        query = query.filter(tuple_(StudiesDB.import_date, StudiesDB.id) < tuple_(*before))
+    return query.order_by(StudiesDB.import_date.desc(), StudiesDB.id.desc())
+
+# One page of study headers, newest first; `before` is the (import_date, id) of the previous page's last row
+async def list_study_headers(session, user_id, limit, before = None):
+    result = await session.execute(study_headers_query(user_id, before).limit(limit))
+    return result.all()
 
 # Retrieves a specific study by study_id and user_id
-def get_study_by_id(session, study_id, user_id):
-    return session.query(StudiesDB).filter_by(study_id = study_id, user_id = user_id).first()
+async def get_study_by_id(session, study_id, user_id):
+    result = await session.execute(select(StudiesDB).filter_by(study_id = study_id, user_id = user_id).limit(1))
+    return result.scalars().first()
 
 # Update study summary by study_id
-def update_study_summary_by_id(session, study_id, summary, user_id=None):
-    query = session.query(StudiesDB).filter_by(study_id = study_id)
+async def update_study_summary_by_id(session, study_id, summary, user_id=None):
+    query = select(StudiesDB).filter_by(study_id = study_id)
     if user_id:
         query = query.filter_by(user_id = user_id)
-    study = query.first()
+    study = (await session.execute(query.limit(1))).scalars().first()
     if study:
         study.summary = summary
-        session.commit()
+        await session.commit()
 
 # Update study outcome by study_id
-def update_study_outcome_by_id(session, study_id, outcome, user_id=None):
-    query = session.query(StudiesDB).filter_by(study_id = study_id)
+async def update_study_outcome_by_id(session, study_id, outcome, user_id=None):
+    query = select(StudiesDB).filter_by(study_id = study_id)
     if user_id:
         query = query.filter_by(user_id = user_id)
-    study = query.first()
+    study = (await session.execute(query.limit(1))).scalars().first()
     if study:
         study.outcome = outcome
-        session.commit()
+        await session.commit()
+
+# Cheap version stamp of a user's study collection: changes whenever a study is added or updated
+async def get_studies_version(session, user_id):
+    result = await session.execute(
+        select(func.count(StudiesDB.id), func.max(StudiesDB.updated_at)).filter(StudiesDB.user_id == user_id)
+    )
+    return tuple(result.one())
+
+# Version stamp of one study, or None if the user has no such study
+async def get_study_version(session, study_id, user_id):
+    result = await session.execute(select(StudiesDB.updated_at).filter_by(study_id = study_id, user_id = user_id).limit(1))
+    row = result.first()
+    return row[0] if row else None
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel
 
 class StudySummaryRequest(BaseModel):
@@ -13,11 +13,39 @@ class SimpleChatRequest(BaseModel):
     conversation_id: Optional[str] = None
 
 class ChatWithCIRequest(BaseModel):
-    s3_url: str
+    s3_url: Optional[str] = None  # Defaults to the user's current health data from the manifest
+    user_input: str
+    conversation_id: Optional[str] = None
+
+class RoutedChatRequest(BaseModel):
+    s3_url: Optional[str] = None  # Defaults to the user's current health data from the manifest
     user_input: str
     conversation_id: Optional[str] = None
 
 class StudyOutcomeRequest(BaseModel):
-    s3_url: str
+    s3_url: Optional[str] = None  # Defaults to the user's current health data from the manifest
     text: str
     study_id: Optional[str] = None
+
+class PresignHealthDataUploadRequest(BaseModel):
+    size_bytes: int
+    filename: str = "user_health_data.csv"
+    content_type: str = "text/csv"
+    sha256: str  # Hex digest of the file, signed into the upload so storage rejects a body that does not match
+    part_size: Optional[int] = None  # Multipart only: size of every part but the last
+    part_sha256s: Optional[List[str]] = None  # Multipart only: hex digest of each part, in order
+
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+
+class CompleteHealthDataUploadRequest(BaseModel):
+    key: str
+    size_bytes: int
+    sha256: Optional[str] = None  # Hex digest of the file; required for a single PUT, checked against the stored object
+    upload_id: Optional[str] = None  # Only for multipart uploads
+    parts: Optional[List[UploadedPart]] = None
+
+class AbortHealthDataUploadRequest(BaseModel):
+    key: str
+    upload_id: Optional[str] = None  # Only for multipart uploads
@@ -1,76 +1,117 @@
 import logging
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Request
-from sqlalchemy import func
+from datetime import datetime
+from typing import Any, Dict, Literal, Optional
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
 
-from Backend.Database.db import SessionLocal
-from Backend.Database.chat_repository import get_chat_history, create_chat_message
-from Backend.Database.chat_models import ChatsDB
+from Backend.Database.db import get_db_session, short_session
+from Backend.Database.chat_repository import get_chat_history, create_chat_message, list_chat_messages, chat_messages_query
+from Backend.Database.conversation_repository import list_conversations, get_conversation, get_conversations_version
 from Backend.Utils.conversation_utils import generate_conversation_id
+from Backend.Utils.id_utils import normalize_uuid
+from Backend.Utils.pagination_utils import encode_cursor, decode_cursor, split_page, ndjson_response
+from Backend.Utils.http_cache_utils import make_etag, etag_matches, not_modified, cached_json_response
 from Backend.auth import verify_clerk_jwt
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 logger = logging.getLogger(__name__)
 
-# Retrieve all chat sessions for a user
+SESSIONS_PAGE_DEFAULT = 100
+SESSIONS_PAGE_MAX = 500
+MESSAGES_PAGE_DEFAULT = 50
+MESSAGES_PAGE_MAX = 200
+NDJSON_YIELD_PER = 200
+
+# Version stamp of one conversation: create_chat_message bumps message_count and last_active on every message
+async def _conversation_etag(db_session, kind: str, conversation_id: str, user_id: str, *variant: Any) -> str:
+    conversation = await get_conversation(db_session, conversation_id, user_id)
+    version = (conversation.message_count, conversation.last_active) if conversation else (0, None)
+    return make_etag(kind, user_id, conversation_id, *variant, *version)
+
+def _message_to_dict(message) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None
+    }
+
+# Retrieve a user's chat sessions, most recently active first. Without limit or cursor every session is
+# returned, as shipped clients expect; passing either opts into keyset pages with a next_cursor.
 @router.get("/retrieve-chat-sessions/")
-def get_chat_sessions(request: Request):
-    user = verify_clerk_jwt(request)
+async def get_chat_sessions(request: Request, limit: Optional[int] = Query(None, ge = 1, le = SESSIONS_PAGE_MAX),
+                            cursor: Optional[str] = None, db_session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
-    db_session = SessionLocal()
-    try:
-        # Get unique conversation IDs and their last message timestamps
-        # Get the latest message for each conversation
-        subquery = db_session.query(
-            ChatsDB.conversation_id,
-            func.max(ChatsDB.timestamp).label('last_message_at')
-        ).filter(ChatsDB.user_id == user_id).group_by(ChatsDB.conversation_id).subquery()
-
-        # Get the actual messages with the latest timestamps
-        latest_messages = db_session.query(ChatsDB).join(
-            subquery,
-            (ChatsDB.conversation_id == subquery.c.conversation_id) &
-            (ChatsDB.timestamp == subquery.c.last_message_at)
-        ).filter(ChatsDB.user_id == user_id).all()
-
-        sessions_data = [
-            {
-                "conversation_id": msg.conversation_id,
-                "last_active_date": msg.timestamp.isoformat() if msg.timestamp else None
-            }
-            for msg in latest_messages
-        ]
-        logger.info(f"[DEBUG] Returning {len(sessions_data)} sessions for user {user_id}")
-        for session_data in sessions_data:
-            logger.info(f"[DEBUG] Session {session_data['conversation_id']}: last_active_date = {session_data['last_active_date']}")
-        return {"sessions": sessions_data}
-    finally:
-        db_session.close()
+
+    etag = make_etag("sessions", user_id, limit, cursor, *await get_conversations_version(db_session, user_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if limit is None and cursor is None:
+        page, has_more = await list_conversations(db_session, user_id), False
+    else:
+        limit = limit or SESSIONS_PAGE_DEFAULT
+        before = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+        page, has_more = split_page(await list_conversations(db_session, user_id, limit + 1, before), limit)
+
+    sessions_data = [
+        {
+            "conversation_id": conversation.conversation_id,
+            "last_active_date": conversation.last_active.isoformat() if conversation.last_active else None,
+            "message_count": conversation.message_count,
+            "title": conversation.title_snippet
+        }
+        for conversation in page
+    ]
+    next_cursor = encode_cursor(page[-1].last_active, page[-1].id) if has_more else None
+    logger.info(f"Returning {len(sessions_data)} sessions for user {user_id}")
+    return cached_json_response(request, {"sessions": sessions_data, "next_cursor": next_cursor}, etag)
 
 # Retrieve the full chat history for a given conversation and user
 @router.get("/all-messages/{conversation_id}")
-def get_all_chat_messages(conversation_id: str, request: Request):
-    user = verify_clerk_jwt(request)
+async def get_all_chat_messages(conversation_id: str, request: Request, db_session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
-    db_session = SessionLocal()
-    try:
-        messages = get_chat_history(db_session, conversation_id, user_id)
-        return [
-            {
-                "id": m.id,
-                "role": m.role,
-                "content": m.content,
-                "timestamp": m.timestamp.isoformat() if m.timestamp else None
-            }
-            for m in messages
-        ]
-    finally:
-        db_session.close()
+    conversation_id = normalize_uuid(conversation_id, "conversation_id")
+    etag = await _conversation_etag(db_session, "messages", conversation_id, user_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    messages = await get_chat_history(db_session, conversation_id, user_id)
+    return cached_json_response(request, [_message_to_dict(m) for m in messages], etag)
+
+# Retrieve a conversation one keyset page at a time, newest message first.
+# format=ndjson instead streams the whole conversation oldest first, one message per line.
+@router.get("/messages/{conversation_id}")
+async def get_chat_messages_page(conversation_id: str, request: Request,
+                                 limit: int = Query(MESSAGES_PAGE_DEFAULT, ge = 1, le = MESSAGES_PAGE_MAX),
+                                 cursor: Optional[str] = None, format: Literal["json", "ndjson"] = "json",
+                                 db_session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
+    user_id = user['sub']
+    conversation_id = normalize_uuid(conversation_id, "conversation_id")
+
+    if format == "ndjson":
+        async def stream_messages():
+            # Own session: request dependencies are torn down before the response body is sent
+            async with short_session() as session:
+                result = await session.stream(chat_messages_query(conversation_id, user_id).execution_options(yield_per = NDJSON_YIELD_PER))
+                async for message in result:
+                    yield _message_to_dict(message)
+        return ndjson_response(stream_messages())
+
+    etag = await _conversation_etag(db_session, "messages-page", conversation_id, user_id, limit, cursor)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    before_id = decode_cursor(cursor, int)[0] if cursor else None
+    page, has_more = split_page(await list_chat_messages(db_session, conversation_id, user_id, limit + 1, before_id), limit)
+    return cached_json_response(request, {
+        "messages": [_message_to_dict(m) for m in page],
+        "next_cursor": encode_cursor(page[-1].id) if has_more else None
+    }, etag)
 
 # Add a message for a given conversation and user
 @router.post("/add-message/")
-def add_chat_message(conversation_id: Optional[str] = None, role: str = '', content: str = '', request: Request = None):
+async def add_chat_message(conversation_id: Optional[str] = None, role: str = '', content: str = '', request: Request = None, db_session = Depends(get_db_session)):
     if conversation_id is not None and conversation_id.strip() == '':
         raise HTTPException(status_code = 400, detail = "conversation_id cannot be empty string")
 
@@ -78,21 +119,17 @@ def add_chat_message(conversation_id: Optional[str] = None, role: str = '', cont
     conversation_id = generate_conversation_id(conversation_id)
     is_new_conversation = original_conversation_id is None
 
-    user = verify_clerk_jwt(request)
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
-    db_session = SessionLocal()
-    try:
-        msg = create_chat_message(db_session, conversation_id, user_id, role, content)
-        response = {
-            "id": msg.id,
-            "conversation_id": conversation_id,
-            "user_id": msg.user_id,
-            "role": msg.role,
-            "content": msg.content,
-            "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
-        }
-        if is_new_conversation:
-            response["new_conversation"] = True
-        return response
-    finally:
-        db_session.close()
\ No newline at end of file
+    msg = await create_chat_message(db_session, conversation_id, user_id, role, content)
+    response = {
+        "id": msg.id,
+        "conversation_id": conversation_id,
+        "user_id": msg.user_id,
+        "role": msg.role,
+        "content": msg.content,
+        "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
+    }
+    if is_new_conversation:
+        response["new_conversation"] = True
+    return response
@@ -1,33 +1,192 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-import io
+from fastapi import APIRouter, HTTPException, Depends, Request
+import os
+import re
+import asyncio
 import logging
+from sqlalchemy.exc import IntegrityError
 
+from Backend.Database.db import short_session, get_db_session
 from Backend.Database.s3_storage import S3Storage
+from Backend.Database.health_data_repository import (
+    register_health_data_file, get_current_health_data, get_health_data_by_key
+)
+from Backend.Utils.multipart_stream import iter_multipart_file
+from Backend.Models.requests import PresignHealthDataUploadRequest, CompleteHealthDataUploadRequest, AbortHealthDataUploadRequest
 from Backend.auth import verify_clerk_jwt
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 logger = logging.getLogger(__name__)
 
-@router.post("/upload-health-data/")
-async def upload_health_data(file: UploadFile = File(...), user = Depends(verify_clerk_jwt)):
-    try:
-        s3_storage = S3Storage()
-    except ValueError as e:
-        logger.warning(f"S3Storage initialization failed: {e}")
+MAX_HEALTH_DATA_UPLOAD_BYTES = int(os.getenv("MAX_HEALTH_DATA_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+
+SHA256_HEX = re.compile(r"^[0-9a-fA-F]{64}$")
+
+# The app's single S3Storage; building one per request would recreate the boto3 client and caches
+def get_s3_storage(request: Request) -> S3Storage:
+    s3_storage = getattr(request.app.state, "s3_storage", None)
+    if s3_storage is None:
         raise HTTPException(status_code = 503, detail = "Tigris storage not configured")
+    return s3_storage
 
+# Accepts the same multipart "file" field as before, but streams it to Tigris as it arrives
+@router.post("/upload-health-data/")
+async def upload_health_data(request: Request, user = Depends(verify_clerk_jwt), s3_storage: S3Storage = Depends(get_s3_storage)):
     try:
         user_id = user.get('sub', 'unknown')
-        file_bytes = await file.read()
-        file_obj = io.BytesIO(file_bytes)
+        file_stream = iter_multipart_file(request, "file")
+
+        # The filename arrives with the part headers, before the first data chunk
+        filename, first_chunk = "user_health_data.csv", b""
+        async for part_filename, chunk in file_stream:
+            filename, first_chunk = part_filename or filename, chunk
+            break
+
+        async def chunks():
+            if first_chunk:
+                yield first_chunk
+            async for _, chunk in file_stream:
+                yield chunk
 
-        filename = file.filename or "user_health_data.csv"
-        s3_url = s3_storage.upload_health_data_file(file_obj, user_id, filename)
+        upload = await s3_storage.upload_health_data_stream(chunks(), user_id, os.path.basename(filename), max_bytes = MAX_HEALTH_DATA_UPLOAD_BYTES)
+        s3_url = upload["s3_url"]
+
+        # Point the user's manifest at the new object; the sweeper reclaims the previous one
+        async with short_session() as session:
+            await register_health_data_file(
+                session, user_id, upload["key"], upload["etag"], upload["size_bytes"],
+                content_sha256 = upload["content_sha256"], row_count = upload["row_count"],
+                first_date = upload["first_date"], last_date = upload["last_date"]
+            )
 
         logger.info(f"Successfully uploaded health data for user {user_id}: {s3_url}")
         return {"s3_url": s3_url, "message": "Health data uploaded successfully"}
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code = 413, detail = str(e))
     except Exception as e:
         logger.error(f"Error uploading health data: {e}")
-        raise HTTPException(status_code = 500, detail = str(e))
\ No newline at end of file
+        raise HTTPException(status_code = 500, detail = str(e))
+
+# Resolve the user's latest health data file from the manifest
+@router.get("/current-health-data/")
+async def current_health_data(user = Depends(verify_clerk_jwt), session = Depends(get_db_session), s3_storage: S3Storage = Depends(get_s3_storage)):
+    record = await get_current_health_data(session, user['sub'])
+    if record is None:
+        raise HTTPException(status_code = 404, detail = "No health data uploaded.")
+    return {
+        "s3_url": s3_storage.url_for_key(record.s3_key),
+        "etag": record.etag,
+        "size_bytes": record.size_bytes,
+        "content_sha256": record.content_sha256,
+        "row_count": record.row_count,
+        "first_date": record.first_date.isoformat() if record.first_date else None,
+        "last_date": record.last_date.isoformat() if record.last_date else None,
+        "uploaded_at": record.uploaded_at.isoformat() if record.uploaded_at else None
+    }
+
+# Hand the client a presigned upload so health data goes straight to storage instead of through the app tier
+@router.post("/presign-health-data-upload/")
+async def presign_health_data_upload(request: PresignHealthDataUploadRequest, user = Depends(verify_clerk_jwt), s3_storage: S3Storage = Depends(get_s3_storage)):
+    if request.size_bytes <= 0 or request.size_bytes > MAX_HEALTH_DATA_UPLOAD_BYTES:
+        raise HTTPException(status_code = 413, detail = f"size_bytes must be between 1 and {MAX_HEALTH_DATA_UPLOAD_BYTES}")
+    if not all(SHA256_HEX.match(digest) for digest in [request.sha256, *(request.part_sha256s or [])]):
+        raise HTTPException(status_code = 400, detail = "sha256 and part_sha256s must be 64-character hex digests.")
+    try:
+        filename = os.path.basename(request.filename) or "user_health_data.csv"
+        return await asyncio.to_thread(
+            s3_storage.presign_health_data_upload, user['sub'], filename, request.size_bytes, request.content_type,
+            request.sha256, request.part_size, request.part_sha256s
+        )
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        logger.error(f"Error presigning health data upload: {e}")
+        raise HTTPException(status_code = 500, detail = str(e))
+
+# A failure here is retried by the client: a repeated complete call finds the row and tags again
+async def _mark_upload_completed(s3_storage: S3Storage, key: str) -> None:
+    try:
+        await asyncio.to_thread(s3_storage.mark_upload_completed, key)
+    except Exception as e:
+        logger.error(f"Error clearing the pending tag of health data upload {key}: {e}")
+        raise HTTPException(status_code = 500, detail = "Upload registered but not finalized; retry the completion.")
+
+def _check_upload_key(s3_storage: S3Storage, user_id: str, key: str) -> None:
+    if not key.startswith(s3_storage.health_data_prefix(user_id)) or ".." in key:
+        raise HTTPException(status_code = 403, detail = "Key is outside the user's health data prefix.")
+
+# Verify a presigned upload from its metadata (size and the SHA-256 checksums storage verified on
+# upload) and register it in the manifest. Nothing is downloaded: a corrupt upload never becomes current.
+# Row count and date range are only computed for uploads streamed through upload-health-data.
+# Idempotent: a retried call for an already registered key returns the same response.
+@router.post("/complete-health-data-upload/")
+async def complete_health_data_upload(request: CompleteHealthDataUploadRequest, user = Depends(verify_clerk_jwt), s3_storage: S3Storage = Depends(get_s3_storage)):
+    user_id = user['sub']
+    _check_upload_key(s3_storage, user_id, request.key)
+    if not request.upload_id and not (request.sha256 and SHA256_HEX.match(request.sha256)):
+        raise HTTPException(status_code = 400, detail = "sha256 is required to complete a single-PUT upload.")
+    completed = {"s3_url": s3_storage.url_for_key(request.key), "message": "Health data uploaded successfully"}
+
+    async with short_session() as session:
+        registered = await get_health_data_by_key(session, user_id, request.key) is not None
+    if registered:
+        await _mark_upload_completed(s3_storage, request.key)  # An earlier attempt may have failed between the two steps
+        return completed
+
+    try:
+        if request.upload_id:
+            if not request.parts:
+                raise HTTPException(status_code = 400, detail = "parts are required to complete a multipart upload.")
+            await asyncio.to_thread(s3_storage.complete_presigned_multipart_upload, request.key, request.upload_id, [part.model_dump() for part in request.parts])
+        upload = await asyncio.to_thread(s3_storage.head_health_data_object, request.key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error completing health data upload {request.key}: {e}")
+        raise HTTPException(status_code = 400, detail = f"Upload could not be completed: {e}")
+
+    mismatch = None
+    if upload["size_bytes"] != request.size_bytes:
+        mismatch = f"size {upload['size_bytes']} != {request.size_bytes}"
+    elif upload["size_bytes"] > MAX_HEALTH_DATA_UPLOAD_BYTES:
+        mismatch = f"size exceeds the {MAX_HEALTH_DATA_UPLOAD_BYTES} byte limit"
+    elif not upload["checksum_sha256"]:
+        mismatch = "storage recorded no SHA-256 checksum"
+    elif not request.upload_id and upload["content_sha256"] != request.sha256.lower():
+        mismatch = "sha256 does not match"
+    if mismatch:
+        await asyncio.to_thread(s3_storage.delete_object, request.key)
+        raise HTTPException(status_code = 422, detail = f"Uploaded object failed verification: {mismatch}")
+
+    # Register before clearing the pending tag: if registration fails, the lifecycle rule still reclaims the object
+    try:
+        async with short_session() as session:
+            await register_health_data_file(session, user_id, upload["key"], upload["etag"], upload["size_bytes"], content_sha256 = upload["content_sha256"])
+    except IntegrityError:
+        logger.info(f"Health data upload {request.key} was registered by a concurrent retry")
+    except Exception as e:
+        logger.error(f"Error registering health data upload {request.key}: {e}")
+        raise HTTPException(status_code = 500, detail = str(e))
+    await _mark_upload_completed(s3_storage, request.key)
+
+    logger.info(f"Registered presigned health data upload for user {user_id}: {upload['s3_url']}")
+    return completed
+
+# Discard a presigned upload the client will not complete; anything never completed nor aborted is
+# removed by the bucket's lifecycle rules after S3_ABANDONED_UPLOAD_DAYS
+@router.post("/abort-health-data-upload/")
+async def abort_health_data_upload(request: AbortHealthDataUploadRequest, user = Depends(verify_clerk_jwt), s3_storage: S3Storage = Depends(get_s3_storage)):
+    user_id = user['sub']
+    _check_upload_key(s3_storage, user_id, request.key)
+    async with short_session() as session:
+        if await get_health_data_by_key(session, user_id, request.key) is not None:
+            raise HTTPException(status_code = 409, detail = "Upload is already completed.")
+    try:
+        await asyncio.to_thread(s3_storage.abort_health_data_upload, request.key, request.upload_id)
+    except Exception as e:
+        logger.error(f"Error aborting health data upload {request.key}: {e}")
+        raise HTTPException(status_code = 500, detail = str(e))
+    return {"message": "Upload aborted"}
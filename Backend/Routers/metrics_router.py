@@ -0,0 +1,27 @@
+import os
+import hmac
+import logging
+from fastapi import APIRouter, Request, HTTPException
+
+from Backend.Database.db import get_pool_status
+from Backend.Utils.metrics import metrics
+
+router = APIRouter(prefix = "/metrics", tags = ["metrics"])
+
+logger = logging.getLogger(__name__)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Per-worker counters and DB pool occupancy; only served when METRICS_TOKEN is set and presented
+@router.get("/")
+async def get_metrics(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code = 404, detail = "Not Found")
+    token = request.headers.get("X-Metrics-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code = 401, detail = "Invalid metrics token.")
+
+    snapshot = metrics.snapshot()
+    snapshot["db_pool"] = get_pool_status()
+    snapshot["pid"] = os.getpid()  # Each gunicorn worker reports its own numbers
+    return snapshot
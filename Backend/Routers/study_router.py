@@ -1,70 +1,118 @@
 import logging
-from fastapi import APIRouter, Request, HTTPException
+from datetime import datetime
+from typing import Any, Dict, Literal, Optional
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
 
-from Backend.Database.db import SessionLocal
-from Backend.Database.study_repository import create_study, get_studies_for_user, get_study_by_id
+from Backend.Database.db import get_db_session, short_session
+from Backend.Database.study_repository import create_study, get_studies_for_user, get_study_by_id, list_study_headers, study_headers_query, get_studies_version, get_study_version
 from Backend.Utils.study_utils import generate_study_id
+from Backend.Utils.id_utils import normalize_uuid
+from Backend.Utils.pagination_utils import encode_cursor, decode_cursor, split_page, ndjson_response
+from Backend.Utils.http_cache_utils import make_etag, etag_matches, not_modified, cached_json_response
 from Backend.auth import verify_clerk_jwt
 
 router = APIRouter(prefix = "/studies", tags = ["studies"])
 
 logger = logging.getLogger(__name__)
 
+STUDIES_PAGE_DEFAULT = 50
+STUDIES_PAGE_MAX = 200
+NDJSON_YIELD_PER = 200
+
+def _study_header_to_dict(study) -> Dict[str, Any]:
+    return {
+        "id": study.id,
+        "study_id": study.study_id,
+        "title": study.title,
+        "import_date": study.import_date.isoformat() if study.import_date else None,
+        "has_summary": study.has_summary,
+        "has_outcome": study.has_outcome
+    }
+
 # Retrieve all studies for a user
 @router.get("/retrieve-user-studies")
-def retrieve_user_studies(request: Request):
-    user = verify_clerk_jwt(request)
+async def retrieve_user_studies(request: Request, session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
+    user_id = user['sub']
+    etag = make_etag("studies", user_id, *await get_studies_version(session, user_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    studies = await get_studies_for_user(session, user_id)
+    logger.info(f"[DEBUG] retrieve_user_studies: Found {len(studies)} studies for user {user_id}")
+    result = [
+        {
+            "id": s.id,
+            "study_id": s.study_id,
+            "user_id": s.user_id,
+            "title": s.title,
+            "summary": s.summary,
+            "outcome": s.outcome,
+            "import_date": s.import_date.isoformat() if s.import_date else None
+        }
+        for s in studies
+    ]
+    return cached_json_response(request, result, etag)
+
+# List a user's studies without their summary/outcome bodies, newest first, one keyset page at a time.
+# Bodies are fetched per study through /studies/study/{study_id}; format=ndjson streams every header instead.
+@router.get("/list")
+async def list_user_studies(request: Request, limit: int = Query(STUDIES_PAGE_DEFAULT, ge = 1, le = STUDIES_PAGE_MAX),
+                            cursor: Optional[str] = None, format: Literal["json", "ndjson"] = "json",
+                            session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
-    session = SessionLocal()
-    try:
-        studies = get_studies_for_user(session, user_id)
-        logger.info(f"[DEBUG] retrieve_user_studies: Found {len(studies)} studies for user {user_id}")
-        result = [
-            {
-                "id": s.id,
-                "study_id": s.study_id,
-                "user_id": s.user_id,
-                "title": s.title,
-                "summary": s.summary,
-                "outcome": s.outcome,
-                "import_date": s.import_date.isoformat() if s.import_date else None
-            }
-            for s in studies
-        ]
-        return result
-    finally:
-        session.close()
-        logger.info("[DEBUG] retrieve_user_studies: Database session closed")
+
+    if format == "ndjson":
+        async def stream_studies():
+            # Own session: request dependencies are torn down before the response body is sent
+            async with short_session() as stream_session:
+                result = await stream_session.stream(study_headers_query(user_id).execution_options(yield_per = NDJSON_YIELD_PER))
+                async for study in result:
+                    yield _study_header_to_dict(study)
+        return ndjson_response(stream_studies())
+
+    etag = make_etag("study-headers", user_id, limit, cursor, *await get_studies_version(session, user_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    before = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+    page, has_more = split_page(await list_study_headers(session, user_id, limit + 1, before), limit)
+    return cached_json_response(request, {
+        "studies": [_study_header_to_dict(study) for study in page],
+        "next_cursor": encode_cursor(page[-1].import_date, page[-1].id) if has_more else None
+    }, etag)
 
 # Retrieve a specific study by study_id
 @router.get("/study/{study_id}")
-def get_study_by_study_id(study_id: str, request: Request):
-    user = verify_clerk_jwt(request)
+async def get_study_by_study_id(study_id: str, request: Request, session = Depends(get_db_session)):
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
-    session = SessionLocal()
-    try:
-        study = get_study_by_id(session, study_id, user_id)
-        if not study:
-            return None
-        return {
-            "id": study.id,
-            "study_id": study.study_id,
-            "user_id": study.user_id,
-            "title": study.title,
-            "summary": study.summary,
-            "outcome": study.outcome,
-            "import_date": study.import_date.isoformat() if study.import_date else None
-        }
-    finally:
-        session.close()
+    study_id = normalize_uuid(study_id, "study_id")
+    version = await get_study_version(session, study_id, user_id)
+    if version is None:
+        return None
+    etag = make_etag("study", user_id, study_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    study = await get_study_by_id(session, study_id, user_id)
+    if not study:
+        return None
+    return cached_json_response(request, {
+        "id": study.id,
+        "study_id": study.study_id,
+        "user_id": study.user_id,
+        "title": study.title,
+        "summary": study.summary,
+        "outcome": study.outcome,
+        "import_date": study.import_date.isoformat() if study.import_date else None
+    }, etag)
 
 # Add a new study for an authenticated user
 @router.post("/add-new-study")
-def add_new_study(title: str = '', summary: str = '', outcome: str = '', study_id: str = None, request: Request = None):
+async def add_new_study(title: str = '', summary: str = '', outcome: str = '', study_id: str = None, request: Request = None, session = Depends(get_db_session)):
     if request is None:
         raise HTTPException(status_code = 400, detail = "Request object is required")
 
-    user = verify_clerk_jwt(request)
+    user = await verify_clerk_jwt(request)
     user_id = user['sub']
 
     original_study_id = study_id
@@ -72,19 +120,14 @@ def add_new_study(title: str = '', summary: str = '', outcome: str = '', study_i
     if original_study_id is None:  # If a new ID was generated
         logger.info(f"[DEBUG] add_new_study: Generated new study_id: {study_id}")
 
-    session = SessionLocal()
-    try:
-        study = create_study(session, study_id, user_id, title, summary, outcome)
-        result = {
-            "id": study.id,
-            "study_id": study.study_id,
-            "user_id": study.user_id,
-            "title": study.title,
-            "summary": study.summary,
-            "outcome": study.outcome,
-            "import_date": study.import_date.isoformat() if study.import_date else None
-        }
-        return result
-    finally:
-        session.close()
-        logger.info("[DEBUG] add_new_study: Database session closed")
\ No newline at end of file
+    study = await create_study(session, study_id, user_id, title, summary, outcome)
+    result = {
+        "id": study.id,
+        "study_id": study.study_id,
+        "user_id": study.user_id,
+        "title": study.title,
+        "summary": study.summary,
+        "outcome": study.outcome,
+        "import_date": study.import_date.isoformat() if study.import_date else None
+    }
+    return result
@@ -1,7 +1,6 @@
 import os
-import requests
-import tempfile
-import fitz
+import asyncio
+import logging
 
 from typing import Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
@@ -9,20 +8,30 @@ from fastapi.responses import PlainTextResponse
 from bs4 import BeautifulSoup
 from striprtf.striprtf import rtf_to_text
 
+from Backend.Utils.pdf_extraction import extract_pdf_text, PDFTooLargeError, PDF_MAX_BYTES
+from Backend.Utils.extraction_cache import ExtractionCache, revalidation_headers
+from Backend.Utils.metrics import metrics
+from Backend.Utils.url_fetcher import url_fetcher, FetchTooLargeError, UnsupportedContentError
+
 router = APIRouter()
 
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = "\n".join(page.get_text() for page in doc)  # type: ignore
-    return text
+logger = logging.getLogger(__name__)
+
+extraction_cache = ExtractionCache()
+CACHED_FILE_KINDS = {".pdf", ".rtf"}  # Plain text is cheaper to decode than to look up
+
+# Runs in the PDF process pool, straight from the in-memory bytes
+async def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+    try:
+        return await extract_pdf_text(pdf_bytes)
+    except PDFTooLargeError as e:
+        raise HTTPException(status_code = 413, detail = str(e))
 
-def extract_text_from_rtf(file_path):
-    with open(file_path, "r", encoding = "utf-8", errors = "ignore") as f:
-        return rtf_to_text(f.read())
+def extract_text_from_rtf(file_bytes: bytes) -> str:
+    return rtf_to_text(file_bytes.decode("utf-8", errors = "ignore"))
 
-def extract_text_from_plaintext(file_path):
-    with open(file_path, "r", encoding = "utf-8", errors = "ignore") as f:
-        return f.read()
+def extract_text_from_plaintext(file_bytes: bytes) -> str:
+    return file_bytes.decode("utf-8", errors = "ignore")
 
 def extract_text_from_html(html):
     soup = BeautifulSoup(html, "lxml")
@@ -39,28 +48,31 @@ async def extract_text(file: Optional[UploadFile] = File(None), url: Optional[st
         filename = file.filename or ""
         suffix = os.path.splitext(filename)[1].lower()
 
-        with tempfile.NamedTemporaryFile(delete = False, suffix = suffix) as tmp:
-            file_bytes = await file.read()
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
+        if suffix not in [".pdf", ".rtf", ".txt", ".text"]:
+            raise HTTPException(status_code = 400, detail = "Unsupported file type. Please upload a PDF, RTF, or TXT file.")
+        if file.size is not None and file.size > PDF_MAX_BYTES:  # Reject before reading it into memory
+            raise HTTPException(status_code = 413, detail = f"File is {file.size} bytes; the limit is {PDF_MAX_BYTES}.")
 
-        print(f"[DEBUG] Temp file path: {tmp_path}, size: {os.path.getsize(tmp_path)} bytes")
+        file_bytes = await file.read()
+        logger.debug(f"Uploaded file size: {len(file_bytes)} bytes")
+        if suffix in CACHED_FILE_KINDS:
+            cache_key, cached = await extraction_cache.get_content(file_bytes, suffix)
+            if cached is not None:
+                return cached
         try:
             if suffix == ".pdf":
-                text = extract_text_from_pdf(tmp_path)
+                text = await extract_text_from_pdf(file_bytes)
             elif suffix == ".rtf":
-                text = extract_text_from_rtf(tmp_path)
-            elif suffix in [".txt", ".text"]:
-                text = extract_text_from_plaintext(tmp_path)
+                text = extract_text_from_rtf(file_bytes)
             else:
-                os.remove(tmp_path)
-                raise HTTPException(status_code = 400, detail = "Unsupported file type. Please upload a PDF, RTF, or TXT file.")
+                text = extract_text_from_plaintext(file_bytes)
             print(f"Extraction result (first 200 chars): {text[:200] if text else text}")
+        except HTTPException:
+            raise
         except Exception as e:
-            text = f"Extraction error: {e}"
-        finally:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+            return f"Extraction error: {e}"
+        if suffix in CACHED_FILE_KINDS:
+            await extraction_cache.put_content(cache_key, text)
         return text
 
     elif url:
@@ -71,29 +83,41 @@ async def extract_text(file: Optional[UploadFile] = File(None), url: Optional[st
         if not (url.startswith("http://") or url.startswith("https://")):
             return "Unsupported URL scheme. Only http(s) URLs are allowed."
         try:
-            # During the usage of the 'requests' libary, it turns out we need to mimic a custom browser.
-            headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"}
-            resp = requests.get(url, headers = headers)
-            content_type = resp.headers.get("Content-Type", "").lower()
-
-            print(f"[DEBUG] URL content type: {content_type}, response size: {len(resp.content)} bytes")
-            if "pdf" in content_type or url.lower().endswith(".pdf"):
-                with tempfile.NamedTemporaryFile(delete = False, suffix = ".pdf") as tmp:
-                    tmp.write(resp.content)
-                    tmp_path = tmp.name
-                    print(f"[DEBUG] Temp file path (URL): {tmp_path}, size: {os.path.getsize(tmp_path)} bytes")
-                try:
-                    text = extract_text_from_pdf(tmp_path)
-                except Exception as e:
-                    text = f"Extraction error: {e}"
-                finally:
-                    os.remove(tmp_path)
-                    print(f"Extraction result (first 200 chars): {text[:200] if text else text}")
-                return text
+            headers = {}
+            cached = await extraction_cache.get_url(url)
+            if cached is not None:
+                headers.update(revalidation_headers(cached[1]))  # A 304 lets us skip the download and the parse
+            try:
+                resp = await url_fetcher.fetch(url, headers)
+            except FetchTooLargeError as e:
+                raise HTTPException(status_code = 413, detail = str(e))
+            except UnsupportedContentError as e:
+                raise HTTPException(status_code = 415, detail = str(e))
+            if cached is not None and resp.not_modified:
+                metrics.increment("extraction_cache_revalidated")
+                return cached[0]
+
+            print(f"[DEBUG] URL content type: {resp.content_type}, pdf: {resp.is_pdf}, response size: {len(resp.content)} bytes")
+            if resp.is_pdf:
+                # The same paper is often linked from several URLs; its bytes are the better key
+                cache_key, text = await extraction_cache.get_content(resp.content, ".pdf")
+                if text is None:
+                    try:
+                        text = await extract_text_from_pdf(resp.content)
+                    except HTTPException:
+                        raise
+                    except Exception as e:
+                        return f"Extraction error: {e}"
+                    await extraction_cache.put_content(cache_key, text)
             else:
-                text = extract_text_from_html(resp.text)
-                print(f"Extraction result (first 200 chars): {text[:200] if text else text}")
-                return text
+                # Bytes, so BeautifulSoup detects the page's own charset; parsed off the event loop
+                text = await asyncio.to_thread(extract_text_from_html, resp.content)
+            print(f"Extraction result (first 200 chars): {text[:200] if text else text}")
+            if resp.ok:
+                await extraction_cache.put_url(url, text, resp.etag, resp.last_modified)
+            return text
+        except HTTPException:
+            raise
         except Exception as e:
             return f"Extraction error: {e}"
     else:
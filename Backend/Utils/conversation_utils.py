@@ -1,31 +1,42 @@
 import logging
 import uuid
-from typing import Optional, Callable, Tuple
+from typing import Optional, Callable, Awaitable, Tuple
+
+from Backend.Utils.id_utils import normalize_uuid
 
 logger = logging.getLogger(__name__)
 
 # Generate a conversation id, or use a an existing one if provided
 def generate_conversation_id(existing_conversation_id: Optional[str] = None) -> str:
     if existing_conversation_id:
-        return existing_conversation_id
+        return normalize_uuid(existing_conversation_id, "conversation_id")
     return str(uuid.uuid4())
 
-def setup_conversation_history(conversation_id: Optional[str],
-                               user_input: str,
-                               user_id: str,
-                               session,
-                               chat_agent) -> Tuple[Optional[Callable[[str], None]], Optional[Callable[[str], None]], Optional[str]]:
+async def setup_conversation_history(conversation_id: Optional[str],
+                                     user_input: str,
+                                     user_id: str,
+                                     chat_agent) -> Tuple[Optional[Callable[[str], Awaitable[None]]], Optional[Callable[[str], Awaitable[None]]], Optional[str]]:
     original_conversation_id = conversation_id
     conversation_id = generate_conversation_id(conversation_id)
     if original_conversation_id is None:
         logger.info(f"[CONV] Created new conversation_id: {conversation_id}")
 
-    # Save user message to database immediately
-    chat_agent._append_user_message(conversation_id, user_id, user_input, session = session)
+    # Save user message before the LLM stream starts. With write-behind enabled it is only queued,
+    # so the insert overlaps with the LLM call; it is awaited below before `done` is sent
+    user_message_saved = await chat_agent._append_user_message(conversation_id, user_id, user_input)
 
     # Create callback function for saving assistant response. This will be called when the AI response is complete
-    def save_conversation(full_response: str) -> None:
-        chat_agent._append_assistant_response(conversation_id, user_id, full_response, session = session)
+    async def save_conversation(full_response: str) -> None:
+        if user_message_saved is not None:
+            await user_message_saved
+        await chat_agent._append_assistant_response(conversation_id, user_id, full_response)
+        chat_agent.schedule_context_compaction(conversation_id, user_id)
+
+    # Called instead when the client disconnects mid-stream, so the history keeps what was already shown
+    async def save_partial_conversation(partial_response: str) -> None:
+        if user_message_saved is not None:
+            await user_message_saved
+        await chat_agent._append_assistant_response(conversation_id, user_id, partial_response)
+        chat_agent.schedule_context_compaction(conversation_id, user_id)
 
-    # Return None for partial callback since we only save final responses
-    return save_conversation, None, conversation_id
\ No newline at end of file
+    return save_conversation, save_partial_conversation, conversation_id
\ No newline at end of file
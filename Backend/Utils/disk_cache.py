@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Optional, Dict, Any, Iterable, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees down to this share of max_bytes, so the next few writes do not trigger another scan
+DISK_CACHE_LOW_WATER = 0.9
+
+# Byte-bounded LRU cache on local disk, safe to share between gunicorn workers on the same host.
+# Each entry is an immutable data file plus a small JSON pointer that is swapped atomically,
+# so readers never see a half-written entry and can keep reading a file that was just replaced.
+# A running byte total is kept in a small index file, so writes only scan the directory when the
+# cache is over its bound (or the index is missing).
+class DiskLRUCache:
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok = True)
+        self._lock_path = os.path.join(self.root, ".lock")
+        self._size_path = os.path.join(self.root, ".size")
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entry_name(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _pointer_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{self._entry_name(key)}.json")
+
+    def _read_pointer(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._pointer_path(key), "r", encoding = "utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Running total of entry sizes; None when the index is missing or unreadable. Callers hold the lock.
+    def _read_total(self) -> Optional[int]:
+        try:
+            with open(self._size_path, "r", encoding = "utf-8") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_total(self, total: int) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir = self.root, suffix = ".tmp")
+        with os.fdopen(fd, "w", encoding = "utf-8") as f:
+            f.write(str(max(total, 0)))
+        os.replace(tmp_path, self._size_path)
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        pointer_path = self._pointer_path(key)
+        try:
+            with open(pointer_path, "r", encoding = "utf-8") as f:
+                pointer = json.load(f)
+            data_path = os.path.join(self.root, pointer["data_file"])
+            if not os.path.exists(data_path):
+                return None
+            os.utime(pointer_path)  # Pointer mtime is the LRU clock
+            return data_path, pointer["meta"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put_stream(self, key: str, chunks: Iterable[bytes], meta: Dict[str, Any]) -> Tuple[str, int]:
+        handle, data_path, size = self._put(key, chunks, meta)
+        handle.close()
+        return data_path, size
+
+    # Like put_stream, but returns the new entry open for reading. It is the handle the data was written
+    # through, so it stays valid even if the entry is evicted at once (an object larger than the whole
+    # cache, or another worker evicting concurrently). The caller closes it.
+    def put_stream_and_open(self, key: str, chunks: Iterable[bytes], meta: Dict[str, Any]) -> Tuple[BinaryIO, int]:
+        handle, _, size = self._put(key, chunks, meta)
+        handle.seek(0)
+        return handle, size
+
+    def _put(self, key: str, chunks: Iterable[bytes], meta: Dict[str, Any]) -> Tuple[BinaryIO, str, int]:
+        entry_name = self._entry_name(key)
+        fd, tmp_path = tempfile.mkstemp(dir = self.root, prefix = f"{entry_name}.", suffix = ".tmp")
+        handle = os.fdopen(fd, "w+b")
+        size = 0
+        try:
+            for chunk in chunks:
+                handle.write(chunk)
+                size += len(chunk)
+            handle.flush()
+            data_file = f"{entry_name}.{time.time_ns()}.bin"
+            data_path = os.path.join(self.root, data_file)
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            handle.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        try:
+            with self._exclusive():
+                previous = self._read_pointer(key)
+                self._write_pointer(key, {"data_file": data_file, "size": size, "meta": meta})
+                if previous is not None and previous.get("data_file") != data_file:
+                    self._remove_quietly(os.path.join(self.root, previous.get("data_file", "")))
+                total = self._read_total()
+                if total is not None:
+                    total += size - (previous.get("size", 0) if previous else 0)
+                    self._write_total(total)
+                if total is None or total > self.max_bytes:
+                    self._enforce_limit()
+        except BaseException:
+            handle.close()
+            raise
+        return handle, data_path, size
+
+    def put_bytes(self, key: str, data: bytes, meta: Dict[str, Any]) -> str:
+        data_path, _ = self.put_stream(key, [data], meta)
+        return data_path
+
+    def read_bytes(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        entry = self.get(key)
+        if entry is None:
+            return None
+        data_path, meta = entry
+        try:
+            with open(data_path, "rb") as f:
+                return f.read(), meta
+        except OSError:
+            return None
+
+    def delete(self, key: str) -> None:
+        with self._exclusive():
+            pointer = self._read_pointer(key)
+            self._remove_quietly(self._pointer_path(key))
+            if pointer is None:
+                return
+            self._remove_quietly(os.path.join(self.root, pointer.get("data_file", "")))
+            total = self._read_total()
+            if total is not None:
+                self._write_total(total - pointer.get("size", 0))
+
+    def _write_pointer(self, key: str, pointer: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir = self.root, suffix = ".tmp")
+        with os.fdopen(fd, "w", encoding = "utf-8") as f:
+            json.dump(pointer, f)
+        os.replace(tmp_path, self._pointer_path(key))
+
+    @staticmethod
+    def _remove_quietly(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Scan every entry, recompute the exact total and, if over max_bytes, drop least recently used
+    # entries down to the low-water mark. Callers hold the lock.
+    def _enforce_limit(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            pointer_path = os.path.join(self.root, name)
+            try:
+                with open(pointer_path, "r", encoding = "utf-8") as f:
+                    pointer = json.load(f)
+                entries.append((os.path.getmtime(pointer_path), pointer_path, pointer))
+                total += pointer.get("size", 0)
+            except (OSError, ValueError):
+                continue
+
+        if total > self.max_bytes:
+            target = int(self.max_bytes * DISK_CACHE_LOW_WATER)
+            for _, pointer_path, pointer in sorted(entries, key = lambda entry: entry[0]):
+                if total <= target:
+                    break
+                self._remove_quietly(pointer_path)
+                self._remove_quietly(os.path.join(self.root, pointer.get("data_file", "")))
+                total -= pointer.get("size", 0)
+                logger.info(f"[DISK-CACHE] Evicted {pointer.get('data_file')} ({pointer.get('size', 0)} bytes) from {self.root}")
+        self._write_total(total)
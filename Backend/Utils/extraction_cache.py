@@ -0,0 +1,97 @@
+import os
+import zlib
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from Backend.Utils.disk_cache import DiskLRUCache
+from Backend.Utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "/tmp/healthpredictor-extraction-cache")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTION_CACHE_COMPRESSION_LEVEL = 6
+
+# Bump when extraction output changes, so stale texts are never served
+EXTRACTOR_VERSION = "1"
+
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+# Lowercase scheme and host, drop default ports, fragments and tracking parameters, sort the query
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values = True) if not k.lower().startswith(_TRACKING_PARAMS))
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+def content_key(data: bytes, kind: str) -> str:
+    return f"content:{EXTRACTOR_VERSION}:{kind}:{hashlib.sha256(data).hexdigest()}"
+
+def url_key(url: str) -> str:
+    return f"url:{EXTRACTOR_VERSION}:{normalize_url(url)}"
+
+# Extracted texts on local disk, zlib-compressed, byte-bounded with LRU eviction and shared by all
+# workers on the host. Uploads are keyed by the SHA-256 of their bytes (and the extractor that read
+# them); URLs by the normalized URL, with the origin's ETag/Last-Modified kept for revalidation.
+class ExtractionCache:
+    def __init__(self, root: str = EXTRACTION_CACHE_DIR, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES) -> None:
+        self.disk = DiskLRUCache(root, max_bytes)
+
+    def _read(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = self.disk.read_bytes(key)
+        if entry is None:
+            return None
+        data, meta = entry
+        try:
+            return zlib.decompress(data).decode("utf-8"), meta
+        except (zlib.error, UnicodeDecodeError) as e:
+            logger.warning(f"[EXTRACTION-CACHE] Dropping corrupt entry {key}: {e}")
+            self.disk.delete(key)
+            return None
+
+    def _write(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        self.disk.put_bytes(key, zlib.compress(text.encode("utf-8"), EXTRACTION_CACHE_COMPRESSION_LEVEL), meta)
+
+    def _lookup_content(self, data: bytes, kind: str) -> Tuple[str, Optional[Tuple[str, Dict[str, Any]]]]:
+        key = content_key(data, kind)
+        return key, self._read(key)
+
+    # Returns (key, cached text or None). Hashing up to PDF_MAX_BYTES runs in the thread with the read,
+    # and a miss passes the key on to put_content instead of hashing the bytes again.
+    async def get_content(self, data: bytes, kind: str) -> Tuple[str, Optional[str]]:
+        key, entry = await asyncio.to_thread(self._lookup_content, data, kind)
+        metrics.increment("extraction_cache_hits" if entry else "extraction_cache_misses")
+        return key, entry[0] if entry else None
+
+    async def put_content(self, key: str, text: str) -> None:
+        await self._put(key, text, {})
+
+    # Cached text of a URL and the validators to revalidate it with (ETag, Last-Modified)
+    async def get_url(self, url: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        return await asyncio.to_thread(self._read, url_key(url))
+
+    async def put_url(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        if not etag and not last_modified:
+            return  # Nothing to revalidate against; the content-hash entry still covers re-imports
+        await self._put(url_key(url), text, {"etag": etag, "last_modified": last_modified})
+
+    async def _put(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self._write, key, text, meta)
+        except OSError as e:
+            logger.warning(f"[EXTRACTION-CACHE] Failed to store {key}: {e}")
+
+# Conditional request headers for a cached URL entry
+def revalidation_headers(meta: Dict[str, Any]) -> Dict[str, str]:
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
@@ -0,0 +1,52 @@
+import hashlib
+from datetime import date
+from typing import Optional, Dict, Any
+
+# Incrementally computes the manifest metadata of a health data CSV while it streams through:
+# SHA-256 of the content, number of data rows and the date range of the leading "Date" column.
+class HealthDataStats:
+    def __init__(self) -> None:
+        self._digest = hashlib.sha256()
+        self._remainder = b""
+        self._header_seen = False
+        self.size_bytes = 0
+        self.row_count = 0
+        self.first_date: Optional[date] = None
+        self.last_date: Optional[date] = None
+
+    def update(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self.size_bytes += len(chunk)
+        lines = (self._remainder + chunk).split(b"\n")
+        self._remainder = lines.pop()  # Last piece may be an incomplete line
+        for line in lines:
+            self._consume_line(line)
+
+    def _consume_line(self, line: bytes) -> None:
+        line = line.strip()
+        if not line:
+            return
+        if not self._header_seen:
+            self._header_seen = True
+            return
+        self.row_count += 1
+        try:
+            row_date = date.fromisoformat(line.split(b",", 1)[0].decode("ascii"))
+        except (ValueError, UnicodeDecodeError):
+            return
+        if self.first_date is None or row_date < self.first_date:
+            self.first_date = row_date
+        if self.last_date is None or row_date > self.last_date:
+            self.last_date = row_date
+
+    def finish(self) -> Dict[str, Any]:
+        if self._remainder:
+            self._consume_line(self._remainder)
+            self._remainder = b""
+        return {
+            "size_bytes": self.size_bytes,
+            "content_sha256": self._digest.hexdigest(),
+            "row_count": self.row_count,
+            "first_date": self.first_date,
+            "last_date": self.last_date
+        }
@@ -0,0 +1,62 @@
+import gzip
+import json
+import hashlib
+from typing import Any
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip
+    brotli = None
+
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Good ratio for JSON at a fraction of the cost of the max level
+
+# Weak validator derived from a cheap version stamp (max timestamps, counts), never from the body itself
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+# Weak comparison as required for If-None-Match
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque_tag(etag) in {_opaque_tag(tag) for tag in header.split(",")}
+
+def _cache_headers(etag: str) -> dict:
+    # private: per-user data; no-cache: clients may store it but must revalidate with If-None-Match
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding, Authorization"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code = 304, headers = _cache_headers(etag))
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+# Serialize once, then brotli or gzip the body when the client accepts it and it is large enough to matter
+def cached_json_response(request: Request, payload: Any, etag: str) -> Response:
+    body = json.dumps(payload, separators = (",", ":")).encode("utf-8")
+    headers = _cache_headers(etag)
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality = BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel = GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content = body, media_type = "application/json", headers = headers)
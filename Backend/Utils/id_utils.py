@@ -0,0 +1,27 @@
+import re
+import uuid
+from typing import Optional
+from fastapi import HTTPException
+
+# Migration 0002 rewrote stored ids that were not UUIDs to uuid5(LEGACY_ID_NAMESPACE, old id). Clients
+# still hold the old strings, so they are mapped the same way here. Never change this value.
+LEGACY_ID_NAMESPACE = uuid.UUID('6f1c2a4e-8d3b-5e7f-9a0b-1c2d3e4f5a6b')
+LEGACY_ID_MAX_LENGTH = 64  # The ids were varchar(64) before they became native UUIDs
+# What the migration kept as a UUID; every other stored value was remapped (POSIX and Python regex alike)
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+_UUID_RE = re.compile(UUID_PATTERN)
+
+def legacy_uuid(value: str) -> str:
+    return str(uuid.uuid5(LEGACY_ID_NAMESPACE, value))
+
+# Conversation and study ids are stored as native UUIDs; legacy ids map to their remapped UUID,
+# anything else is rejected before it reaches the database
+def normalize_uuid(value: str, field: str) -> str:
+    if not isinstance(value, str) or not value.strip() or len(value) > LEGACY_ID_MAX_LENGTH:
+        raise HTTPException(status_code = 400, detail = f"Invalid {field}")
+    if _UUID_RE.fullmatch(value):
+        return str(uuid.UUID(value))
+    return legacy_uuid(value)
+
+def normalize_optional_uuid(value: Optional[str], field: str) -> Optional[str]:
+    return normalize_uuid(value, field) if value else None
@@ -0,0 +1,64 @@
+from typing import AsyncGenerator, List, Optional, Tuple
+from fastapi import Request, HTTPException
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Stream one file field of a multipart/form-data body straight from the socket, without
+# spooling the upload to memory or a temp file first. Yields (filename, chunk) pairs.
+async def iter_multipart_file(request: Request, field_name: str = "file") -> AsyncGenerator[Tuple[Optional[str], bytes], None]:
+    content_type, params = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code = 400, detail = "Expected a multipart/form-data upload.")
+
+    pending: List[bytes] = []
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "in_field": False, "filename": None, "found": False}
+
+    def on_part_begin() -> None:
+        state["headers"] = {}
+        state["in_field"] = False
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        state["header_value"] += data[start:end]
+
+    def on_header_end() -> None:
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished() -> None:
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name") == field_name.encode() and b"filename" in disposition:
+            state["in_field"] = True
+            state["found"] = True
+            state["filename"] = disposition[b"filename"].decode("utf-8", errors = "ignore") or None
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["in_field"]:
+            pending.append(data[start:end])
+
+    def on_part_end() -> None:
+        state["in_field"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+
+    async for body_chunk in request.stream():
+        parser.write(body_chunk)
+        if pending:
+            data = b"".join(pending)
+            pending.clear()
+            yield state["filename"], data
+    parser.finalize()
+
+    if not state["found"]:
+        raise HTTPException(status_code = 400, detail = f"Missing file field '{field_name}'.")
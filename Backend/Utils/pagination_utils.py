@@ -0,0 +1,31 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, AsyncIterable, Callable, Dict, List, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# Keyset pagination cursors: the sort-key values of the last row of a page, opaque to clients
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, *parsers: Callable[[Any], Any]) -> Tuple[Any, ...]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("cursor arity")
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code = 400, detail = "Invalid cursor")
+
+# Fetch limit + 1 rows to learn whether another page exists without a COUNT query
+def split_page(rows: List[Any], limit: int) -> Tuple[List[Any], bool]:
+    return rows[:limit], len(rows) > limit
+
+# One JSON object per line, written as rows arrive from a server-side cursor
+def ndjson_response(items: AsyncIterable[Dict[str, Any]]) -> StreamingResponse:
+    async def lines():
+        async for item in items:
+            yield json.dumps(item, separators = (",", ":")) + "\n"
+    return StreamingResponse(lines(), media_type = "application/x-ndjson", headers = {"Cache-Control": "no-cache"})
@@ -0,0 +1,105 @@
+import os
+import asyncio
+import tempfile
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "32"))
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Large documents are written here once for the page-range workers; tmpfs keeps that in memory
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+# Raised for documents over PDF_MAX_BYTES or PDF_MAX_PAGES
+class PDFTooLargeError(ValueError):
+    pass
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# One pool per gunicorn worker, created on first use. Spawned rather than forked: the parent runs an
+# event loop and client threads that must not be copied into the children.
+def get_pdf_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers = max(PDF_EXTRACTION_WORKERS, 1), mp_context = multiprocessing.get_context("spawn"))
+    return _executor
+
+def shutdown_pdf_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait = False, cancel_futures = True)
+        _executor = None
+
+def _page_range_text(doc: "fitz.Document", start: int, stop: int) -> str:
+    return "\n".join(doc.load_page(number).get_text() for number in range(start, stop))
+
+# Runs in a pool process: opens the document from memory, counts its pages and, when it fits in
+# one range, extracts it in the same pass. Returns (page_count, text or None if it must be split).
+def _open_and_extract(data: bytes, max_pages: int, pages_per_chunk: int) -> Tuple[int, Optional[str]]:
+    with fitz.open(stream = data, filetype = "pdf") as doc:
+        if doc.page_count > max_pages or doc.page_count > pages_per_chunk:
+            return doc.page_count, None
+        return doc.page_count, _page_range_text(doc, 0, doc.page_count)
+
+# Runs in a pool process: each range task gets the spool file's path instead of its own copy of the bytes
+def _extract_page_range(path: str, start: int, stop: int) -> str:
+    with fitz.open(path, filetype = "pdf") as doc:
+        return _page_range_text(doc, start, stop)
+
+def _spool_to(directory: str, data: bytes) -> str:
+    spool = tempfile.NamedTemporaryFile(dir = directory, suffix = ".pdf", delete = False)
+    try:
+        with spool:
+            spool.write(data)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+    return spool.name
+
+# /dev/shm is only 64 MB in a default Docker container, so a full tmpfs falls back to the disk temp dir
+def _spool(data: bytes) -> str:
+    try:
+        return _spool_to(PDF_SPOOL_DIR, data)
+    except OSError as e:
+        fallback = tempfile.gettempdir()
+        if os.path.abspath(PDF_SPOOL_DIR) == os.path.abspath(fallback):
+            raise
+        logger.warning(f"[PDF] Could not spool to {PDF_SPOOL_DIR} ({e}); using {fallback}")
+        return _spool_to(fallback, data)
+
+def page_ranges(page_count: int, pages_per_chunk: int = PDF_PAGES_PER_CHUNK) -> List[Tuple[int, int]]:
+    pages_per_chunk = max(pages_per_chunk, 1)
+    return [(start, min(start + pages_per_chunk, page_count)) for start in range(0, page_count, pages_per_chunk)]
+
+# Extracts the text of a PDF held in memory without blocking the event loop. Small documents are one
+# pool task; large ones are split into page ranges extracted in parallel and joined back in page order,
+# giving the same text as extracting page by page. The bytes cross to the pool once: the range tasks
+# read a single spooled copy rather than each being sent the whole document.
+async def extract_pdf_text(data: bytes, max_bytes: int = PDF_MAX_BYTES, max_pages: int = PDF_MAX_PAGES) -> str:
+    if len(data) > max_bytes:
+        raise PDFTooLargeError(f"PDF is {len(data)} bytes; the limit is {max_bytes}.")
+    loop = asyncio.get_running_loop()
+    executor = get_pdf_executor()
+
+    pages_per_chunk = max(PDF_PAGES_PER_CHUNK, 1)
+    page_count, text = await loop.run_in_executor(executor, _open_and_extract, data, max_pages, pages_per_chunk)
+    if page_count > max_pages:
+        raise PDFTooLargeError(f"PDF has {page_count} pages; the limit is {max_pages}.")
+    if text is not None:
+        return text
+
+    ranges = page_ranges(page_count, pages_per_chunk)
+    logger.info(f"[PDF] Extracting {page_count} pages in {len(ranges)} parallel ranges")
+    path = await asyncio.to_thread(_spool, data)
+    try:
+        chunks = await asyncio.gather(*(loop.run_in_executor(executor, _extract_page_range, path, start, stop) for start, stop in ranges))
+    finally:
+        os.remove(path)
+    return "\n".join(chunks)
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterable, Deque, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from Backend.Utils.metrics import metrics
+from Backend.Utils.streaming_utils import create_streaming_response, wait_for_disconnect
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional; without Redis, streams can only be resumed on the worker that started them
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))  # Gunicorn worker count, set in the Dockerfile
+STREAM_REPLAY_MAX_EVENTS = int(os.getenv("STREAM_REPLAY_MAX_EVENTS", "2048"))
+STREAM_REPLAY_TTL_SECONDS = int(os.getenv("STREAM_REPLAY_TTL_SECONDS", "300"))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "30"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+# How often subscribers renew their lease and the producer its heartbeat
+_POLL_SECONDS = max(min(STREAM_RESUME_GRACE_SECONDS / 3, 2.0), 0.1)
+
+# A buffered event: (seq, frame); a None frame marks the end of the stream
+Event = Tuple[int, Optional[str]]
+
+# Event ids are "<stream_id>:<seq>", so Last-Event-ID alone says which stream to resume and from where
+def format_event_id(stream_id: str, seq: int) -> str:
+    return f"{stream_id}:{seq}"
+
+def parse_event_id(event_id: str) -> Optional[Tuple[str, int]]:
+    stream_id, _, seq = event_id.strip().rpartition(":")
+    try:
+        return str(uuid.UUID(stream_id)), int(seq)
+    except ValueError:
+        return None
+
+@dataclass
+class _MemoryStream:
+    owner: str
+    events: Deque[Event]
+    changed: asyncio.Event = field(default_factory = asyncio.Event)
+    lease_until: float = 0.0
+    expires_at: Optional[float] = None
+
+# Per-worker replay buffers, used when REDIS_URL is not set
+class MemoryStreamStore:
+    def __init__(self, max_events: int = STREAM_REPLAY_MAX_EVENTS, ttl_seconds: int = STREAM_REPLAY_TTL_SECONDS) -> None:
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self._streams: Dict[str, _MemoryStream] = {}
+
+    def _get(self, stream_id: str) -> Optional[_MemoryStream]:
+        stream = self._streams.get(stream_id)
+        if stream is not None and stream.expires_at is not None and time.monotonic() >= stream.expires_at:
+            del self._streams[stream_id]
+            return None
+        return stream
+
+    async def create(self, stream_id: str, owner: str) -> None:
+        for key in [key for key, stream in self._streams.items() if stream.expires_at is not None and time.monotonic() >= stream.expires_at]:
+            del self._streams[key]
+        self._streams[stream_id] = _MemoryStream(owner, deque(maxlen = self.max_events))
+
+    async def append(self, stream_id: str, seq: int, frame: Optional[str]) -> None:
+        stream = self._get(stream_id)
+        if stream is None:
+            return
+        stream.events.append((seq, frame))
+        if frame is None:
+            stream.expires_at = time.monotonic() + self.ttl_seconds
+        stream.changed.set()
+        stream.changed = asyncio.Event()
+
+    async def read(self, stream_id: str, after_seq: int, timeout: float) -> List[Event]:
+        stream = self._get(stream_id)
+        if stream is None:
+            return []
+        if not stream.events or stream.events[-1][0] <= after_seq:
+            try:
+                await asyncio.wait_for(stream.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        return [event for event in stream.events if event[0] > after_seq]
+
+    async def owner(self, stream_id: str) -> Optional[str]:
+        stream = self._get(stream_id)
+        return stream.owner if stream is not None else None
+
+    async def oldest_seq(self, stream_id: str) -> Optional[int]:
+        stream = self._get(stream_id)
+        return stream.events[0][0] if stream is not None and stream.events else None
+
+    async def renew_lease(self, stream_id: str, seconds: float) -> None:
+        stream = self._get(stream_id)
+        if stream is not None:
+            stream.lease_until = time.monotonic() + seconds
+
+    async def has_lease(self, stream_id: str) -> bool:
+        stream = self._get(stream_id)
+        return stream is not None and time.monotonic() < stream.lease_until
+
+    # The producer runs in this worker, so the stream is alive for as long as its buffer exists
+    async def heartbeat(self, stream_id: str) -> None:
+        pass
+
+    async def producer_alive(self, stream_id: str) -> bool:
+        return self._get(stream_id) is not None
+
+    async def close(self) -> None:
+        self._streams.clear()
+
+# Replay buffers shared by all workers: one capped Redis stream per SSE stream, with entry ids "0-<seq>"
+# so XREAD can resume directly after the client's last event
+class RedisStreamStore:
+    def __init__(self, url: str, max_events: int = STREAM_REPLAY_MAX_EVENTS, ttl_seconds: int = STREAM_REPLAY_TTL_SECONDS) -> None:
+        self.redis = aioredis.from_url(url, decode_responses = True)
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _keys(stream_id: str) -> Tuple[str, str, str, str]:
+        prefix = f"sse:{stream_id}"
+        return f"{prefix}:events", f"{prefix}:owner", f"{prefix}:lease", f"{prefix}:alive"
+
+    async def create(self, stream_id: str, owner: str) -> None:
+        _, owner_key, _, _ = self._keys(stream_id)
+        await self.redis.set(owner_key, owner, ex = self.ttl_seconds)
+
+    async def append(self, stream_id: str, seq: int, frame: Optional[str]) -> None:
+        events_key, owner_key, _, _ = self._keys(stream_id)
+        fields = {"end": "1"} if frame is None else {"frame": frame}
+        async with self.redis.pipeline(transaction = False) as pipe:
+            pipe.xadd(events_key, fields, id = f"0-{seq}", maxlen = self.max_events, approximate = True)
+            pipe.expire(events_key, self.ttl_seconds)
+            pipe.expire(owner_key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def read(self, stream_id: str, after_seq: int, timeout: float) -> List[Event]:
+        events_key = self._keys(stream_id)[0]
+        result = await self.redis.xread({events_key: f"0-{after_seq}"}, count = 512, block = max(int(timeout * 1000), 1))
+        if not result:
+            return []
+        return [(int(entry_id.split("-")[1]), fields.get("frame")) for entry_id, fields in result[0][1]]
+
+    async def owner(self, stream_id: str) -> Optional[str]:
+        return await self.redis.get(self._keys(stream_id)[1])
+
+    async def oldest_seq(self, stream_id: str) -> Optional[int]:
+        entries = await self.redis.xrange(self._keys(stream_id)[0], count = 1)
+        return int(entries[0][0].split("-")[1]) if entries else None
+
+    async def renew_lease(self, stream_id: str, seconds: float) -> None:
+        await self.redis.set(self._keys(stream_id)[2], "1", px = max(int(seconds * 1000), 1))
+
+    async def has_lease(self, stream_id: str) -> bool:
+        return bool(await self.redis.exists(self._keys(stream_id)[2]))
+
+    async def heartbeat(self, stream_id: str) -> None:
+        await self.redis.set(self._keys(stream_id)[3], "1", px = max(int(_POLL_SECONDS * 3000), 1))
+
+    async def producer_alive(self, stream_id: str) -> bool:
+        return bool(await self.redis.exists(self._keys(stream_id)[3]))
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+def _default_store():
+    if REDIS_URL and aioredis is not None:
+        return RedisStreamStore(REDIS_URL)
+    if REDIS_URL:
+        logger.warning("[STREAM] REDIS_URL is set but the redis package is not installed; replay buffers are per worker")
+    elif WEB_CONCURRENCY > 1:
+        logger.warning(f"[STREAM] REDIS_URL is not set with {WEB_CONCURRENCY} workers; replay buffers are per worker, "
+                       f"so most resumes will land on another worker and get 410")
+    return MemoryStreamStore()
+
+# Decouples an SSE generation from the connection that started it. The generation runs as a task that
+# numbers its frames and appends them to a bounded replay buffer; clients read from the buffer. A client
+# that reconnects with Last-Event-ID (to any worker, when Redis is configured) gets the frames it missed
+# and then follows the same in-flight generation instead of starting a new one. The generation is only
+# cancelled once no client has been attached for the grace period.
+class ResumableStreams:
+    def __init__(self, store = None, grace_seconds: float = STREAM_RESUME_GRACE_SECONDS,
+                 keepalive_seconds: float = STREAM_KEEPALIVE_SECONDS) -> None:
+        self.store = store if store is not None else _default_store()
+        self.grace_seconds = grace_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self._producers: Set[asyncio.Task] = set()
+
+    # Start a generation and stream it to this client
+    async def start(self, request: Request, owner: str, frames: AsyncIterable[str]) -> StreamingResponse:
+        stream_id = str(uuid.uuid4())
+        await self.store.create(stream_id, owner)
+        await self.store.renew_lease(stream_id, self.grace_seconds)
+        await self.store.heartbeat(stream_id)
+        task = asyncio.create_task(self._produce(stream_id, frames))
+        self._producers.add(task)
+        task.add_done_callback(self._producers.discard)
+        return create_streaming_response(self._subscribe, stream_id = stream_id, after_seq = 0, request = request)
+
+    # If the request carries Last-Event-ID, reattach it to its stream; None means start a new generation
+    async def resume(self, request: Request, owner: str) -> Optional[StreamingResponse]:
+        last_event_id = request.headers.get("last-event-id")
+        if not last_event_id:
+            return None
+        parsed = parse_event_id(last_event_id)
+        stream_owner = await self.store.owner(parsed[0]) if parsed else None
+        oldest_seq = await self.store.oldest_seq(parsed[0]) if stream_owner == owner else None
+        if stream_owner != owner or (oldest_seq is not None and oldest_seq > parsed[1] + 1):
+            metrics.increment("stream_resume_expired")
+            raise HTTPException(status_code = 410, detail = "Stream can no longer be resumed; reload the conversation instead.")
+        stream_id, after_seq = parsed
+        metrics.increment("streams_resumed")
+        logger.info(f"[STREAM] Resuming {stream_id} after event {after_seq}")
+        return create_streaming_response(self._subscribe, stream_id = stream_id, after_seq = after_seq, request = request)
+
+    async def _produce(self, stream_id: str, frames: AsyncIterable[str]) -> None:
+        generation = asyncio.create_task(self._append_frames(stream_id, frames))
+        try:
+            while True:
+                await asyncio.wait({generation}, timeout = _POLL_SECONDS)
+                if generation.done():
+                    break
+                try:
+                    await self.store.heartbeat(stream_id)
+                    attached = await self.store.has_lease(stream_id)
+                except Exception as e:
+                    logger.warning(f"[STREAM] Lease check failed for {stream_id}: {e}")
+                    continue  # A buffer hiccup must not cancel a paid-for generation
+                if not attached:
+                    logger.info(f"[STREAM] No client attached to {stream_id} for {self.grace_seconds}s; cancelling")
+                    metrics.increment("streams_cancelled_unattached")
+                    generation.cancel()
+                    break
+            await asyncio.gather(generation, return_exceptions = True)
+        finally:
+            if not generation.done():
+                generation.cancel()
+
+    # A failing generation ends with an error frame, so the client sees an error rather than a clean close
+    async def _append_frames(self, stream_id: str, frames: AsyncIterable[str]) -> None:
+        seq = 0
+        iterator = frames.__aiter__()
+        try:
+            while True:
+                try:
+                    frame = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    logger.error(f"[STREAM] Generation of {stream_id} failed: {e}")
+                    metrics.increment("stream_generation_errors")
+                    seq += 1
+                    await self.store.append(stream_id, seq, f"data: {json.dumps({'error': getattr(e, 'detail', None) or str(e), 'done': True})}\n\n")
+                    break
+                seq += 1
+                await self.store.append(stream_id, seq, frame)
+        except Exception as e:
+            logger.error(f"[STREAM] Replay buffer error for {stream_id}: {e}")
+        finally:
+            aclose = getattr(frames, "aclose", None)
+            if aclose is not None:
+                await aclose()  # Runs the generation's cleanup (upstream close, partial save) if it stopped early
+            try:
+                await asyncio.shield(self.store.append(stream_id, seq + 1, None))
+            except Exception as e:
+                logger.error(f"[STREAM] Failed to end {stream_id}: {e}")
+
+    # Yields buffered frames after `after_seq`, then follows the live generation until its end marker.
+    # While attached it keeps the stream's lease alive; after a disconnect the lease runs out.
+    async def _subscribe(self, stream_id: str, after_seq: int, request: Request) -> AsyncGenerator[str, None]:
+        disconnected = asyncio.create_task(wait_for_disconnect(request))
+        last_sent = time.monotonic()
+        try:
+            while not disconnected.done():
+                await self.store.renew_lease(stream_id, self.grace_seconds)
+                events = await self.store.read(stream_id, after_seq, _POLL_SECONDS)
+                for seq, frame in events:
+                    after_seq = seq
+                    if frame is None:
+                        return
+                    last_sent = time.monotonic()
+                    yield f"id: {format_event_id(stream_id, seq)}\n{frame}"
+                if events:
+                    continue
+                if not await self.store.producer_alive(stream_id):
+                    logger.warning(f"[STREAM] Producer of {stream_id} is gone")
+                    return
+                if time.monotonic() - last_sent >= self.keepalive_seconds:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"  # Comment line; keeps idle connections open during long tool calls
+        finally:
+            disconnected.cancel()
+
+    async def close(self) -> None:
+        for task in list(self._producers):
+            task.cancel()
+        await asyncio.gather(*self._producers, return_exceptions = True)
+        await self.store.close()
@@ -1,11 +1,23 @@
+import os
 import json
+import time
+import asyncio
 import logging
-from typing import Any, Optional, Callable
+from typing import Any, List, Optional, Set, Callable, Awaitable, AsyncIterable, AsyncGenerator
+from fastapi import Request
 from fastapi.responses import StreamingResponse
 
+from Backend.Utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
-def extract_text_from_chunk(chunk: Any, full_response: str = "") -> str:
+SSE_COALESCE_WINDOW_MS = float(os.getenv("SSE_COALESCE_WINDOW_MS", "30"))
+SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "512"))
+
+DONE_FRAME = f"data: {json.dumps({'content': '', 'done': True})}\n\n"
+
+# `emitted_chars` is how much text has already been streamed; the final done event repeats the whole text
+def extract_text_from_chunk(chunk: Any, emitted_chars: int = 0) -> str:
     if hasattr(chunk, 'type'):
         if chunk.type == 'text_delta':
             if hasattr(chunk, 'delta') and chunk.delta and hasattr(chunk.delta, 'text'):
@@ -16,28 +28,176 @@ def extract_text_from_chunk(chunk: Any, full_response: str = "") -> str:
                 return chunk.delta or ""
 
         elif chunk.type == 'response.output_text.done':
-            if hasattr(chunk, 'text') and chunk.text:
-                remaining_text = chunk.text[len(full_response):]
-                return remaining_text or ""
+            if hasattr(chunk, 'text') and chunk.text and len(chunk.text) > emitted_chars:
+                return chunk.text[emitted_chars:]
     return ""
 
-def process_streaming_response(response: Any, conversation_callback: Optional[Callable[[str], None]] = None, partial_callback: Optional[Callable[[str], None]] = None) -> Any:
-    full_response = ""
-    for chunk in response:
-        text = extract_text_from_chunk(chunk, full_response)
-        if text:
-            full_response += text
-            yield f"data: {json.dumps({'content': text, 'done': False})}\n\n"
+# Coalesces token deltas into SSE frames: a frame is emitted once the buffered text reaches max_chars
+# or has waited window_ms, so a fast stream costs one json.dumps and one socket write per window instead
+# of per token. The first delta is sent immediately to keep time-to-first-token unchanged.
+class SSEFrameEncoder:
+    def __init__(self, window_ms: float = SSE_COALESCE_WINDOW_MS, max_chars: int = SSE_COALESCE_MAX_CHARS) -> None:
+        self.window = max(window_ms, 0) / 1000
+        self.max_chars = max(max_chars, 1)
+        self.frames = 0
+        self._parts: List[str] = []
+        self._chars = 0
+        self._first_buffered_at = 0.0
+
+    def add(self, text: str) -> None:
+        if not self._parts:
+            self._first_buffered_at = time.monotonic()
+        self._parts.append(text)
+        self._chars += len(text)
+
+    def should_flush(self) -> bool:
+        return bool(self._parts) and (self.frames == 0 or self._chars >= self.max_chars or self.time_until_flush() == 0)
+
+    # Seconds until the buffered text is due, or None when nothing is buffered
+    def time_until_flush(self) -> Optional[float]:
+        if not self._parts:
+            return None
+        return max(self.window - (time.monotonic() - self._first_buffered_at), 0.0)
+
+    def flush(self) -> Optional[str]:
+        if not self._parts:
+            return None
+        text = self._parts[0] if len(self._parts) == 1 else "".join(self._parts)
+        self._parts.clear()
+        self._chars = 0
+        self.frames += 1
+        return f'data: {{"content": {json.dumps(text)}, "done": false}}\n\n'
+
+_END_OF_STREAM = object()
+_DISCONNECTED = object()
+_background_saves: Set[asyncio.Task] = set()
+
+# Resolves when the client goes away. The request body has already been read, so the next ASGI
+# message is the disconnect; this catches it even while the upstream is silent (e.g. a long tool call).
+async def wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+# Closes an OpenAI stream so generation stops and the connection goes back to the pool; safe on plain iterables
+async def close_upstream(response: Any) -> None:
+    close = getattr(response, "close", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception as e:
+        logger.warning(f"[STREAM] Failed to close upstream stream: {e}")
+
+# The request task may already be cancelled, so partial saves run on their own
+def _save_in_background(save: Awaitable[None]) -> None:
+    async def run() -> None:
+        try:
+            await save
+            logger.info("[STREAM] Partial response saved for an abandoned stream")
+        except Exception as e:
+            logger.error(f"[STREAM] Failed to save partial response: {e}")
+    task = asyncio.create_task(run())
+    _background_saves.add(task)
+    task.add_done_callback(_background_saves.discard)
+
+# When `request` is given, a client disconnect stops the stream: the upstream is cancelled (closing the
+# OpenAI stream), whatever text arrived is handed to `partial_callback`, and streams_abandoned is counted.
+async def process_streaming_response(response: AsyncIterable[Any], conversation_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                                     partial_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                                     request: Optional[Request] = None) -> AsyncGenerator[str, None]:
+    encoder = SSEFrameEncoder()
+    parts: List[str] = []
+    frames: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    timer: Optional[asyncio.TimerHandle] = None
+
+    def flush_due() -> None:
+        nonlocal timer
+        timer = None
+        frame = encoder.flush()
+        if frame is not None:
+            frames.put_nowait(frame)
+
+    # Reads the upstream and coalesces deltas; the consumer below only wakes up once per frame.
+    # A single timer per frame (not per token) sends buffered text once it has waited the window.
+    async def pump() -> None:
+        nonlocal timer
+        emitted_chars = 0
+        try:
+            async for chunk in response:
+                text = extract_text_from_chunk(chunk, emitted_chars)
+                if not text:
+                    continue
+                parts.append(text)
+                emitted_chars += len(text)
+                encoder.add(text)
+                if encoder.should_flush():
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    frames.put_nowait(encoder.flush())
+                elif timer is None:
+                    timer = loop.call_later(encoder.time_until_flush(), flush_due)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            frame = encoder.flush()
+            if frame is not None:
+                frames.put_nowait(frame)
+            frames.put_nowait(_END_OF_STREAM)
+
+    pump_task = asyncio.create_task(pump())
+    watcher: Optional[asyncio.Task] = None
+    if request is not None:
+        watcher = asyncio.create_task(wait_for_disconnect(request))
+        watcher.add_done_callback(lambda task: task.cancelled() or task.exception() or frames.put_nowait(_DISCONNECTED))
+
+    abandoned = False
+    try:
+        while True:
+            frame = await frames.get()
+            if frame is _END_OF_STREAM:
+                break
+            if frame is _DISCONNECTED:
+                abandoned = True
+                break
+            yield frame
+        if not abandoned:
+            await pump_task  # Re-raise upstream errors to the caller
+    except (asyncio.CancelledError, GeneratorExit):
+        abandoned = True  # The server cancelled or closed the response because the client went away
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if not pump_task.done():
+            pump_task.cancel()
+        if abandoned:
+            metrics.increment("streams_abandoned")
+            partial_response = "".join(parts).strip()
+            logger.info(f"[STREAM] Client disconnected after {len(partial_response)} characters; upstream cancelled")
+            if partial_callback and partial_response:
+                _save_in_background(partial_callback(partial_response))
+
+    if abandoned:
+        return
 
-    if conversation_callback and full_response.strip():
+    full_response = "".join(parts).strip()
+    if conversation_callback and full_response:
         try:
-            conversation_callback(full_response.strip())
+            await asyncio.shield(conversation_callback(full_response))  # A disconnect during the save must not cut it short
             logger.info(f"[DEBUG] process_streaming_response: conversation_callback successful")
         except Exception as e:
+            # The text was streamed but not stored; tell the client instead of reporting a clean finish
             logger.error(f"[DEBUG] process_streaming_response: conversation_callback failed: {e}")
+            metrics.increment("stream_save_errors")
+            yield f"data: {json.dumps({'error': 'The response could not be saved.', 'done': True})}\n\n"
+            return
     else:
         logger.warning(f"[DEBUG] process_streaming_response: No callback or empty response - callback: {conversation_callback is not None}")
-    yield f"data: {json.dumps({'content': '', 'done': True})}\n\n"
+    yield DONE_FRAME
 
 def create_streaming_response(generator_func: Callable, **kwargs) -> StreamingResponse:
     return StreamingResponse(
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+from Backend.Utils.metrics import metrics
+from Backend.Utils.pdf_extraction import PDF_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+URL_FETCH_CONNECT_TIMEOUT = float(os.getenv("URL_FETCH_CONNECT_TIMEOUT", "5"))
+URL_FETCH_READ_TIMEOUT = float(os.getenv("URL_FETCH_READ_TIMEOUT", "15"))
+URL_FETCH_TOTAL_TIMEOUT = float(os.getenv("URL_FETCH_TOTAL_TIMEOUT", "60"))
+URL_FETCH_MAX_BYTES = int(os.getenv("URL_FETCH_MAX_BYTES", str(PDF_MAX_BYTES)))
+URL_FETCH_MAX_CONNECTIONS = int(os.getenv("URL_FETCH_MAX_CONNECTIONS", "50"))
+URL_FETCH_MAX_KEEPALIVE = int(os.getenv("URL_FETCH_MAX_KEEPALIVE", "20"))
+
+# Publisher sites serve bots a stripped page or nothing at all, so we mimic a browser
+BROWSER_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml")
+SNIFFED_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream", "application/download", "")
+
+class FetchTooLargeError(ValueError):
+    pass
+
+class UnsupportedContentError(ValueError):
+    pass
+
+@dataclass
+class FetchedDocument:
+    status_code: int
+    content: bytes
+    content_type: str
+    is_pdf: bool
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+# Async URL fetches over one pooled keep-alive client per worker. The body is streamed with a byte cap
+# (Content-Length is checked before reading) and the type is decided from the headers and the first
+# bytes, so an unsupported or oversized response is abandoned before it is downloaded. Every fetch
+# has connect/read timeouts and an overall deadline, so a slow site cannot hold a request forever.
+class URLFetcher:
+    def __init__(self, max_bytes: int = URL_FETCH_MAX_BYTES, total_timeout: float = URL_FETCH_TOTAL_TIMEOUT) -> None:
+        self.max_bytes = max_bytes
+        self.total_timeout = total_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout = httpx.Timeout(URL_FETCH_READ_TIMEOUT, connect = URL_FETCH_CONNECT_TIMEOUT),
+                limits = httpx.Limits(max_connections = URL_FETCH_MAX_CONNECTIONS, max_keepalive_connections = URL_FETCH_MAX_KEEPALIVE),
+                follow_redirects = True,
+                headers = {"User-Agent": BROWSER_USER_AGENT}
+            )
+        return self._client
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedDocument:
+        try:
+            async with asyncio.timeout(self.total_timeout):
+                return await self._fetch(url, headers or {})
+        except TimeoutError:
+            metrics.increment("url_fetch_timeouts")
+            raise TimeoutError(f"Fetching {url} took longer than {self.total_timeout:.0f}s")
+
+    async def _fetch(self, url: str, headers: Dict[str, str]) -> FetchedDocument:
+        async with self._get_client().stream("GET", url, headers = headers) as resp:
+            content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            document = FetchedDocument(resp.status_code, b"", content_type, False, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            if resp.status_code == 304:
+                return document
+
+            declared_length = resp.headers.get("Content-Length")
+            if declared_length and declared_length.isdigit() and int(declared_length) > self.max_bytes:
+                metrics.increment("url_fetch_too_large")
+                raise FetchTooLargeError(f"Response is {declared_length} bytes; the limit is {self.max_bytes}.")
+
+            document.is_pdf = content_type == "application/pdf" or resp.url.path.lower().endswith(".pdf")
+            if not document.is_pdf and not content_type.startswith(TEXT_CONTENT_TYPES) and content_type not in SNIFFED_CONTENT_TYPES:
+                metrics.increment("url_fetch_unsupported")
+                raise UnsupportedContentError(f"Unsupported content type {content_type}.")
+
+            chunks = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                if not chunks and chunk.lstrip()[:5] == b"%PDF-":
+                    document.is_pdf = True  # Sniffed: many sites serve PDFs as octet-stream or with no type
+                elif not chunks and content_type in SNIFFED_CONTENT_TYPES and not document.is_pdf and b"<" not in chunk[:1024]:
+                    metrics.increment("url_fetch_unsupported")
+                    raise UnsupportedContentError("Response is neither a PDF nor a web page.")
+                size += len(chunk)
+                if size > self.max_bytes:
+                    metrics.increment("url_fetch_too_large")
+                    raise FetchTooLargeError(f"Response exceeds the {self.max_bytes} byte limit.")
+                chunks.append(chunk)
+            document.content = b"".join(chunks)
+            metrics.increment("url_fetch_bytes", size)
+            return document
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+url_fetcher = URLFetcher()
@@ -1,6 +1,9 @@
 import os
 import logging
 import json
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Request
 from dotenv import load_dotenv
 
@@ -8,24 +11,32 @@ from Backend.Agents.chat_agent import ChatAgent
 from Backend.Agents.study_outcome_agent import StudyOutcomeAgent
 from Backend.Agents.study_summary_agent import StudySummaryAgent
 from Backend.Agents.Helpers.code_interpreter_selector import CodeInterpreterSelector
+from Backend.Agents.Helpers.code_interpreter_workspace import CodeInterpreterWorkspaceCache
 
 from Backend.auth import verify_clerk_jwt
 
-from Backend.Database.db import SessionLocal
+from Backend.Database.db import short_session
 from Backend.Database.s3_storage import S3Storage
-
-from Backend.Utils.streaming_utils import process_streaming_response, create_streaming_response
+from Backend.Database.health_data_repository import get_current_health_data
+from Backend.Database.health_data_sweeper import run_health_data_sweeper
+from Backend.Database.chat_write_queue import ChatMessageWriteQueue, CHAT_WRITE_BEHIND
+
+from Backend.Utils.streaming_utils import process_streaming_response
+from Backend.Utils.resumable_streams import ResumableStreams
+from Backend.Utils.metrics import metrics
+from Backend.Utils.pdf_extraction import shutdown_pdf_executor
+from Backend.Utils.url_fetcher import url_fetcher
 from Backend.Utils.conversation_utils import setup_conversation_history
 from Backend.Utils.study_utils import setup_study_id
+from Backend.Utils.id_utils import normalize_optional_uuid
 
-from Backend.Models.requests import StudySummaryRequest, CodeInterpreterSelectorRequest, SimpleChatRequest, ChatWithCIRequest, StudyOutcomeRequest
-
-from Backend.Database import *
+from Backend.Models.requests import StudySummaryRequest, CodeInterpreterSelectorRequest, SimpleChatRequest, ChatWithCIRequest, StudyOutcomeRequest, RoutedChatRequest
 
 from Backend.Routers.text_extraction_router import router as text_extraction_router
 from Backend.Routers.file_router import router as file_router
 from Backend.Routers.chat_router import router as chat_router
 from Backend.Routers.study_router import router as study_router
+from Backend.Routers.metrics_router import router as metrics_router
 
 logging.basicConfig(level = logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -33,18 +44,35 @@ logging.getLogger('chat_agent').setLevel(logging.DEBUG)
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(run_health_data_sweeper(s3_storage)) if s3_storage is not None else None
+    if chat_write_queue is not None:
+        chat_write_queue.start()
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    if chat_write_queue is not None:
+        await chat_write_queue.stop()
+    await workspace_cache.close()
+    await resumable_streams.close()
+    shutdown_pdf_executor()
+    await url_fetcher.close()
+
+app = FastAPI(lifespan = lifespan)
 
 app.include_router(text_extraction_router)
 app.include_router(file_router)
 app.include_router(chat_router)
 app.include_router(study_router)
+app.include_router(metrics_router)
 
 try:
     s3_storage = S3Storage()
 except ValueError as e:
     logger.warning(f"S3Storage initialization failed: {e}")
     s3_storage = None
+app.state.s3_storage = s3_storage  # Shared with the routers, one boto3 client and object cache per worker
 
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
@@ -56,76 +84,176 @@ PROMPT_PATHS = {
     "simple_chat": os.path.join(PROMPT_DIR, "SimpleChatPrompt.txt"),
     "code_interpreter_selector": os.path.join(PROMPT_DIR, "CodeInterpreterSelectorPrompt.txt"),
     "outcome": os.path.join(PROMPT_DIR, "OutcomePrompt.txt"),
-    "summary": os.path.join(PROMPT_DIR, "SummaryPrompt.txt")
+    "summary": os.path.join(PROMPT_DIR, "SummaryPrompt.txt"),
+    "conversation_summary": os.path.join(PROMPT_DIR, "ConversationSummaryPrompt.txt")
 }
 
-chat_agent = ChatAgent(api_key, prompt_path = PROMPT_PATHS["chat"])
+workspace_cache = CodeInterpreterWorkspaceCache(api_key)
+
+chat_write_queue = ChatMessageWriteQueue() if CHAT_WRITE_BEHIND else None
+
+resumable_streams = ResumableStreams()
+
+chat_agent = ChatAgent(api_key, prompt_path = PROMPT_PATHS["chat"], workspace_cache = workspace_cache,
+                       summary_prompt_path = PROMPT_PATHS["conversation_summary"], write_queue = chat_write_queue)
 selector_agent = CodeInterpreterSelector(api_key, prompt_path = PROMPT_PATHS["code_interpreter_selector"])
-outcome_agent = StudyOutcomeAgent(api_key, prompt_path = PROMPT_PATHS["outcome"])
+outcome_agent = StudyOutcomeAgent(api_key, prompt_path = PROMPT_PATHS["outcome"], workspace_cache = workspace_cache)
 summary_agent = StudySummaryAgent(api_key, prompt_path = PROMPT_PATHS["summary"])
 
+# Use the client's s3_url, or resolve the user's current health data from the manifest
+async def resolve_health_data_url(user_id: str, s3_url: Optional[str]) -> str:
+    if s3_url:
+        return s3_url
+    async with short_session() as session:
+        record = await get_current_health_data(session, user_id)
+    if record is None:
+        raise HTTPException(status_code = 404, detail = "No health data uploaded.")
+    return s3_storage.url_for_key(record.s3_key)
+
+# Frames of one code-interpreter chat turn over an already downloaded health data file
+async def code_interpreter_chat_frames(user_id: str, user_input: str, conversation_id: Optional[str], file_obj, etag: Optional[str]):
+    save_conversation, save_partial_conversation, new_conversation_id = await setup_conversation_history(conversation_id, user_input, user_id, chat_agent)
+
+    try:
+        # Use the new conversation_id if one was created
+        conversation_id = new_conversation_id or conversation_id
+        response = chat_agent.chat_with_code_interpreter(file_obj, user_input, user_id, conversation_id = conversation_id, content_key = etag)
+        async for event in process_streaming_response(response, save_conversation, save_partial_conversation):
+            yield event
+    except Exception as e:
+        logger.error(f"Health analysis error: {e}")
+        yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+
+# Frames of one chat turn without tools
+async def simple_chat_frames(user_id: str, user_input: str, conversation_id: Optional[str]):
+    save_conversation, save_partial_conversation, new_conversation_id = await setup_conversation_history(conversation_id, user_input, user_id, chat_agent)
+
+    try:
+        with open(PROMPT_PATHS["simple_chat"], "r", encoding = "utf-8") as f:
+            simple_chat_prompt = f.read()
+        # Use the new conversation_id if one was created
+        conversation_id = new_conversation_id or conversation_id
+        response = chat_agent.simple_chat(user_input, user_id, prompt = simple_chat_prompt, conversation_id = conversation_id)
+        async for event in process_streaming_response(response, save_conversation, save_partial_conversation):
+            yield event
+    except Exception as e:
+        logger.error(f"Simple chat error: {e}")
+        yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+
+# Download the health data as (file_obj, etag); the caller closes file_obj. The download thread cannot be
+# interrupted, so if the caller is cancelled the file it eventually returns is closed here.
+async def download_health_data(s3_url: str):
+    download = asyncio.ensure_future(asyncio.to_thread(s3_storage.download_file_with_etag, s3_url))
+    try:
+        return await asyncio.shield(download)
+    except asyncio.CancelledError:
+        download.add_done_callback(lambda task: task.cancelled() or task.exception() or task.result()[0].close())
+        raise
+
+# Speculative code-interpreter setup: download the health data and warm its workspace. Returns (file_obj, etag).
+async def prepare_code_interpreter(user_id: str, s3_url: Optional[str]):
+    s3_url = await resolve_health_data_url(user_id, s3_url)
+    file_obj, etag = await download_health_data(s3_url)
+    try:
+        await workspace_cache.get_workspace(user_id, file_obj, content_key = etag)
+    except BaseException:
+        file_obj.close()
+        raise
+    return file_obj, etag
+
 @app.post("/chat-with-ci/")
 async def chat_with_ci(request: ChatWithCIRequest, req: Request):
-    user = verify_clerk_jwt(req)
+    user = await verify_clerk_jwt(req)
     user_id = user['sub']
     print(f"[DEBUG] /chat-with-ci/ called with conversation_id={request.conversation_id}, user_id={user_id}")
+    resumed = await resumable_streams.resume(req, user_id)
+    if resumed is not None:
+        return resumed
+    conversation_id = normalize_optional_uuid(request.conversation_id, "conversation_id")  # Rejected here: inside the stream a 400 would only truncate it
     if s3_storage is None:
         logger.error("S3 storage is None")
         raise HTTPException(status_code = 503, detail = "Tigris storage not configured")
+    s3_url = await resolve_health_data_url(user_id, request.s3_url)
 
     async def generate_stream():
-        session = SessionLocal()
+        file_obj, etag = await download_health_data(s3_url)
+        logger.info(f"[chat-with-ci] File downloaded from S3: {s3_url}")
         try:
-            file_obj = s3_storage.download_file_from_url(request.s3_url)
-            logger.info(f"[chat-with-ci] File downloaded from S3: {request.s3_url}")
-
-            user_input_str = request.user_input
-            save_conversation, save_partial_conversation, new_conversation_id = setup_conversation_history(request.conversation_id, user_input_str, user_id, session, chat_agent)
-
-            try:
-                # Use the new conversation_id if one was created
-                conversation_id = new_conversation_id or request.conversation_id
-                response = chat_agent.chat_with_code_interpreter(file_obj, user_input_str, user_id, conversation_id = conversation_id, session = session)
-                for event in process_streaming_response(response, save_conversation, save_partial_conversation):
-                    yield event
-            except Exception as e:
-                logger.error(f"Health analysis error: {e}")
-                yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+            async for event in code_interpreter_chat_frames(user_id, request.user_input, conversation_id, file_obj, etag):
+                yield event
         finally:
-            session.close()
+            file_obj.close()
 
-    return create_streaming_response(generate_stream)
+    return await resumable_streams.start(req, user_id, generate_stream())
 
 @app.post("/simple-chat/")
 async def simple_chat(request: SimpleChatRequest, req: Request):
-    user = verify_clerk_jwt(req)
+    user = await verify_clerk_jwt(req)
+    user_id = user['sub']
+    resumed = await resumable_streams.resume(req, user_id)
+    if resumed is not None:
+        return resumed
+    conversation_id = normalize_optional_uuid(request.conversation_id, "conversation_id")
+    return await resumable_streams.start(req, user_id, simple_chat_frames(user_id, request.user_input, conversation_id))
+
+# Routes and streams a chat turn in one request. The health data download and workspace warm-up start
+# while the selector runs, so the code-interpreter path does not wait for the decision; they are
+# cancelled if the turn goes to simple chat. The first frame tells the client which route was taken.
+@app.post("/chat/")
+async def routed_chat(request: RoutedChatRequest, req: Request):
+    user = await verify_clerk_jwt(req)
     user_id = user['sub']
+    resumed = await resumable_streams.resume(req, user_id)
+    if resumed is not None:
+        return resumed
+    conversation_id = normalize_optional_uuid(request.conversation_id, "conversation_id")
 
     async def generate_stream():
-        session = SessionLocal()
+        prepared = asyncio.create_task(prepare_code_interpreter(user_id, request.s3_url)) if s3_storage is not None else None
+        if prepared is not None:
+            prepared.add_done_callback(lambda task: task.cancelled() or task.exception())  # Unused failures are not errors
+        file_obj = etag = None
         try:
-            save_conversation, save_partial_conversation, new_conversation_id = setup_conversation_history(request.conversation_id, request.user_input, user_id, session, chat_agent)
-
             try:
-                with open(PROMPT_PATHS["simple_chat"], "r", encoding = "utf-8") as f:
-                    simple_chat_prompt = f.read()
-                # Use the new conversation_id if one was created
-                conversation_id = new_conversation_id or request.conversation_id
-                response = chat_agent.simple_chat(request.user_input, user_id, prompt = simple_chat_prompt, conversation_id = conversation_id, session = session)
-                for event in process_streaming_response(response, save_conversation, save_partial_conversation):
-                    yield event
+                use_code_interpreter = await selector_agent.should_use_code_interpreter(request.user_input) == "yes"
             except Exception as e:
-                logger.error(f"Simple chat error: {e}")
-                yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+                logger.error(f"Selector error, falling back to simple chat: {e}")
+                use_code_interpreter = False
+
+            if use_code_interpreter and prepared is not None:
+                try:
+                    file_obj, etag = await prepared
+                except HTTPException as e:
+                    logger.info(f"[chat] No health data for code interpreter ({e.detail}); using simple chat")
+                except Exception as e:
+                    logger.error(f"[chat] Code interpreter preparation failed, using simple chat: {e}")
+        finally:
+            if prepared is not None and not prepared.done():
+                prepared.cancel()
+                metrics.increment("routed_chat_speculation_cancelled")
+            elif file_obj is None and prepared is not None and not prepared.cancelled() and prepared.exception() is None:
+                prepared.result()[0].close()  # Prepared, but the turn went to simple chat
+
+        route = "code_interpreter" if file_obj is not None else "simple"
+        metrics.increment(f"routed_chat_{route}")
+        yield f"data: {json.dumps({'route': route, 'done': False})}\n\n"
+        try:
+            if file_obj is not None:
+                frames = code_interpreter_chat_frames(user_id, request.user_input, conversation_id, file_obj, etag)
+            else:
+                frames = simple_chat_frames(user_id, request.user_input, conversation_id)
+            async for event in frames:
+                yield event
         finally:
-            session.close()
+            if file_obj is not None:
+                file_obj.close()
 
-    return create_streaming_response(generate_stream)
+    return await resumable_streams.start(req, user_id, generate_stream())
 
 @app.post("/should-use-code-interpreter/")
 async def should_use_code_interpreter(request: CodeInterpreterSelectorRequest, _ = Depends(verify_clerk_jwt)):
     try:
-        result = selector_agent.should_use_code_interpreter(request.user_input)
+        result = await selector_agent.should_use_code_interpreter(request.user_input)
         use_code_interpreter = result.lower() == "yes"
         return {"use_code_interpreter": use_code_interpreter}
     except Exception as e:
@@ -134,73 +262,79 @@ async def should_use_code_interpreter(request: CodeInterpreterSelectorRequest, _
 
 @app.post("/create-study/")
 async def create_study_endpoint(req: Request):
-    user = verify_clerk_jwt(req)
+    user = await verify_clerk_jwt(req)
     user_id = user['sub']
 
     try:
-        session = SessionLocal()
-        try:
-            save_outcome, save_summary, study_id = setup_study_id(user_id, "Study", session, summary_agent, outcome_agent)
-            logger.info(f"[DEBUG] create_study: Created study with study_id: {study_id}")
-            return {"study_id": study_id}
-        finally:
-            session.close()
+        save_outcome, save_summary, study_id = await setup_study_id(user_id, "Study", summary_agent, outcome_agent)
+        logger.info(f"[DEBUG] create_study: Created study with study_id: {study_id}")
+        return {"study_id": study_id}
     except Exception as e:
         logger.error(f"Error in create_study: {e}")
         raise HTTPException(status_code = 500, detail = str(e))
 
 @app.post("/generate-study-outcome/")
 async def generate_outcome(request: StudyOutcomeRequest, req: Request):
-    user = verify_clerk_jwt(req)
+    user = await verify_clerk_jwt(req)
     user_id = user['sub']
     logger.info(f"[DEBUG] generate_outcome: Received request with user_id: {user_id}")
+    resumed = await resumable_streams.resume(req, user_id)
+    if resumed is not None:
+        return resumed
+    existing_study_id = normalize_optional_uuid(request.study_id, "study_id")
 
     if s3_storage is None:
         logger.error("S3 storage is None")
         raise HTTPException(status_code = 503, detail = "Tigris storage not configured")
 
+    s3_url = await resolve_health_data_url(user_id, request.s3_url)
     try:
-        file_obj = s3_storage.download_file_from_url(request.s3_url)
+        file_obj, etag = await download_health_data(s3_url)
 
         async def generate_stream():
-            session = SessionLocal()
             try:
-                save_summary, save_outcome, study_id = setup_study_id(user_id, "Study", session, summary_agent, outcome_agent, request.study_id)
+                save_summary, save_outcome, study_id = await setup_study_id(user_id, "Study", summary_agent, outcome_agent, existing_study_id)
                 yield f"data: {json.dumps({'study_id': study_id, 'done': False})}\n\n"
-                response = outcome_agent.generate_study_outcome(file_obj, request.text)
-                for event in process_streaming_response(response, save_outcome):
+                response = outcome_agent.generate_study_outcome(file_obj, request.text, user_id = user_id, content_key = etag)
+                async for event in process_streaming_response(response, save_outcome):
                     yield event
             except Exception as e:
                 logger.error(f"Outcome generation error: {e}")
                 yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
             finally:
-                session.close()
-        return create_streaming_response(generate_stream)
+                file_obj.close()
+
+        try:
+            return await resumable_streams.start(req, user_id, generate_stream())
+        except BaseException:
+            file_obj.close()  # The stream never started, so its finally will not run
+            raise
     except Exception as e:
         logger.error(f"Error in generate_outcome: {e}")
         raise HTTPException(status_code = 500, detail = str(e))
 
 @app.post("/generate-study-summary/")
 async def summarize_study(request: StudySummaryRequest, req: Request):
-    user = verify_clerk_jwt(req)
+    user = await verify_clerk_jwt(req)
     user_id = user['sub']
     logger.info(f"[DEBUG] summarize_study: Received request with user_id: {user_id}")
+    resumed = await resumable_streams.resume(req, user_id)
+    if resumed is not None:
+        return resumed
+    existing_study_id = normalize_optional_uuid(request.study_id, "study_id")
 
     try:
         async def generate_stream():
-            session = SessionLocal()
             try:
-                save_summary, save_outcome, study_id = setup_study_id(user_id, "Study", session, summary_agent, outcome_agent, request.study_id)
+                save_summary, save_outcome, study_id = await setup_study_id(user_id, "Study", summary_agent, outcome_agent, existing_study_id)
                 yield f"data: {json.dumps({'study_id': study_id, 'done': False})}\n\n"
                 response = summary_agent.generate_study_summary(request.text)
-                for event in process_streaming_response(response, save_summary):
+                async for event in process_streaming_response(response, save_summary):
                     yield event
             except Exception as e:
                 logger.error(f"Summary generation error: {e}")
                 yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
-            finally:
-                session.close()
-        return create_streaming_response(generate_stream)
+        return await resumable_streams.start(req, user_id, generate_stream())
     except Exception as e:
         logger.error(f"Error in summarize_study: {e}")
         raise HTTPException(status_code = 500, detail = str(e))
@@ -1,12 +1,20 @@
 import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
 import requests
+from collections import OrderedDict
 from dotenv import load_dotenv
 from fastapi import Request, HTTPException
 from jose import jwt, JWTError
-from typing import cast
+from typing import cast, Optional, Dict, Any
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 JWKS_URL = os.getenv("CLERK_JWKS_URL")
 if not JWKS_URL:
     raise RuntimeError("CLERK_JWKS_URL is not set in the environment.")
@@ -17,20 +25,125 @@ if not AUDIENCE:
 
 CLERK_ISSUER = JWKS_URL.split("/.well-known/")[0]  # Check the issuer
 
+JWKS_TTL_SECONDS = int(os.getenv("CLERK_JWKS_TTL_SECONDS", "3600"))
+JWKS_REFRESH_INTERVAL_SECONDS = int(os.getenv("CLERK_JWKS_REFRESH_INTERVAL_SECONDS", "900"))
+JWKS_MIN_REFETCH_INTERVAL_SECONDS = int(os.getenv("CLERK_JWKS_MIN_REFETCH_INTERVAL_SECONDS", "30"))
+JWKS_FETCH_TIMEOUT_SECONDS = float(os.getenv("CLERK_JWKS_FETCH_TIMEOUT_SECONDS", "5"))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("CLERK_VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+
 def get_jwks():
-    response = requests.get(cast(str, JWKS_URL))
+    response = requests.get(cast(str, JWKS_URL), timeout = JWKS_FETCH_TIMEOUT_SECONDS)
     response.raise_for_status()
     return response.json()["keys"]
 
-def get_public_key(token):
-    jwks = get_jwks()
-    unverified_header = jwt.get_unverified_header(token)
-    for key in jwks:
-        if key["kid"] == unverified_header["kid"]:
+# In-memory JWKS store: loaded in the background, refetched (rate-limited) on unknown kid or expiry.
+# Fetches run on threads and swap the key dict in whole; the event loop never waits on a fetch or a lock.
+class JWKSKeyStore:
+    def __init__(self, ttl_seconds: int = JWKS_TTL_SECONDS, refresh_interval_seconds: int = JWKS_REFRESH_INTERVAL_SECONDS,
+                 min_refetch_interval_seconds: int = JWKS_MIN_REFETCH_INTERVAL_SECONDS) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.min_refetch_interval_seconds = min_refetch_interval_seconds
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at = 0.0
+        self._last_fetch_attempt = 0.0
+        self._fetch_lock = threading.Lock()  # One fetch at a time; only taken on worker threads
+        self._refresher: Optional[threading.Thread] = None
+
+    # Callers hold _fetch_lock
+    def _fetch(self) -> bool:
+        self._last_fetch_attempt = time.monotonic()
+        try:
+            keys = get_jwks()
+        except Exception as e:
+            logger.warning(f"[AUTH] JWKS refresh failed, keeping {len(self._keys)} cached keys: {e}")
+            return False
+        self._keys = {key["kid"]: key for key in keys if "kid" in key}
+        self._loaded_at = time.monotonic()
+        logger.info(f"[AUTH] JWKS refreshed with {len(self._keys)} keys")
+        return True
+
+    def _refresh_loop(self) -> None:
+        while True:
+            with self._fetch_lock:
+                self._fetch()
+            time.sleep(self.refresh_interval_seconds)
+
+    def _start_background_refresh(self) -> None:
+        if self._refresher is None:
+            self._refresher = threading.Thread(target = self._refresh_loop, name = "jwks-refresh", daemon = True)
+            self._refresher.start()
+
+    def _refetch_allowed(self) -> bool:
+        return time.monotonic() - self._last_fetch_attempt >= self.min_refetch_interval_seconds
+
+    # On-demand refetch; callers that queued behind a fetch that just ran do not fetch again
+    def _refetch(self) -> None:
+        with self._fetch_lock:
+            if self._refetch_allowed():
+                self._fetch()
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        self._start_background_refresh()
+        key = self._keys.get(kid)
+        if key is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
             return key
+
+        # Unknown kid (e.g. key rotation) or expired store: refetch, but never more often than the rate limit,
+        # including while the store is still empty
+        if self._refetch_allowed():
+            await asyncio.to_thread(self._refetch)
+        if not self._keys:
+            raise HTTPException(status_code = 503, detail = "Signing keys are unavailable; try again shortly.")
+
+        # A stale key is still better than failing every request while Clerk is unreachable
+        return self._keys.get(kid)
+
+jwks_store = JWKSKeyStore()
+
+# Bounded LRU of verified token payloads, keyed by token hash and valid until the token's exp
+class VerifiedTokenCache:
+    def __init__(self, max_size: int = VERIFIED_TOKEN_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        token_hash = self._token_hash(token)
+        with self._lock:
+            payload = self._entries.get(token_hash)
+            if payload is None:
+                return None
+            if payload["exp"] <= time.time():
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return payload
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        if self.max_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return  # Tokens without exp are never cached
+        token_hash = self._token_hash(token)
+        with self._lock:
+            self._entries[token_hash] = payload
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last = False)
+
+verified_token_cache = VerifiedTokenCache()
+
+async def get_public_key(token):
+    unverified_header = jwt.get_unverified_header(token)
+    key = await jwks_store.get_key(unverified_header.get("kid"))
+    if key is not None:
+        return key
     raise HTTPException(status_code = 401, detail = "Public key not found.")
 
-def verify_clerk_jwt(request: Request):
+async def verify_clerk_jwt(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code = 401, detail = "Missing or invalid token.")
@@ -39,8 +152,12 @@ def verify_clerk_jwt(request: Request):
     if token.count(".") != 2:  # Require a real JWT (must have header, payload, and signature)
         raise HTTPException(status_code = 401, detail = "Token is not a valid JWT.")
 
+    cached_payload = verified_token_cache.get(token)
+    if cached_payload is not None:
+        return cached_payload
+
     try:
-        key = get_public_key(token)
+        key = await get_public_key(token)
         payload = jwt.decode(
             token,
             key,
@@ -49,8 +166,11 @@ def verify_clerk_jwt(request: Request):
             issuer = CLERK_ISSUER,
             options = {"verify_aud": False} if not AUDIENCE else {}
         )
+        verified_token_cache.put(token, payload)
         return payload  # Contains user info (sub, email, etc.)
+    except HTTPException:
+        raise
     except JWTError as e:
         raise HTTPException(status_code = 401, detail = f"Token verification failed: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code = 401, detail = f"Token verification error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code = 401, detail = f"Token verification error: {str(e)}")